@@ -0,0 +1,69 @@
+"""
+Benchmark of a full reprocess of the raw data.
+
+Writes raw files shaped like the downloaded ones (semicolon separated, dd/mm/yyyy dates, decimal commas, trading
+days only) for every stock, then times process_all_raw_files from scratch per file and in batch mode, end to end
+(reading the raw files, interpolating, writing the Parquet dataset and the CSV export), and checks both modes
+wrote the same CSV files.
+
+Usage:
+    python -m benchmarks.bench_batch_processing --stocks 88 --start 2008-01-01
+"""
+import argparse
+import logging
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+import numpy as np
+import pandas as pd
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from scripts import process_data
+
+
+def make_raw_files(raw_dir: Path, stocks: int, start: str):
+    rng = np.random.default_rng(0)
+    raw_dir.mkdir(parents=True)
+    for i in range(stocks):
+        dates = pd.bdate_range(pd.Timestamp(start) + pd.Timedelta(days=int(rng.integers(0, 365))), pd.Timestamp.today().normalize())
+        dates = dates[rng.random(len(dates)) > 0.05] # holidays and days without trades
+        close = np.abs(20 + rng.normal(0, 0.1, len(dates)).cumsum()).round(3)
+        raw = pd.DataFrame({'symbole': f"SYM{i}", 'date': dates.strftime('%d/%m/%Y')})
+        for col, offset in [('ouverture', 0.05), ('haut', 0.1), ('bas', -0.1), ('cloture', 0)]:
+            raw[col] = [f"{value:.3f}".replace('.', ',') for value in (close + offset).round(3)]
+        raw['volume'] = rng.integers(0, 100000, len(dates))
+        raw.to_csv(raw_dir / f"SYM{i}.csv", sep=';', index=False)
+
+
+def main(stocks: int, start: str, workers: int | None):
+    # the per file logs would be most of the output
+    logging.getLogger(process_data.__name__).setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_raw_files(root / 'data' / 'raw', stocks, start)
+        rows = sum(len(pd.read_csv(path, sep=';')) for path in (root / 'data' / 'raw').glob('*.csv'))
+        print(f"{stocks} stocks since {start}, {rows} raw rows")
+        print(f"{'mode':<12}{'wall time (s)':>16}")
+        outputs = {}
+        with mock.patch.object(process_data, "PROJECT_ROOT", root):
+            for mode in ["per file", "batch"]:
+                shutil.rmtree(root / 'data' / 'processed', ignore_errors=True)
+                start_time = time.perf_counter()
+                process_data.process_all_raw_files(batch=mode == "batch", workers=workers)
+                elapsed = time.perf_counter() - start_time
+                print(f"{mode:<12}{elapsed:>16.3f}")
+                outputs[mode] = {path.name: path.read_text() for path in (root / 'data' / 'processed').glob('*.csv')}
+    assert len(outputs["batch"]) == stocks and outputs["batch"] == outputs["per file"]
+    print("both modes wrote the same files")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark a full reprocess of the raw data.")
+    parser.add_argument("--stocks", type=int, default=88, help="Number of stocks")
+    parser.add_argument("--start", type=str, default="2008-01-01", help="First date of the history")
+    parser.add_argument("--workers", type=int, required=False, help="Number of processes of the batch mode")
+    args = parser.parse_args()
+    main(args.stocks, args.start, args.workers)
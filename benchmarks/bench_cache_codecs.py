@@ -0,0 +1,89 @@
+"""
+Benchmark of the backend cache codecs on a /stock payload.
+
+Builds the history of a stock with the given number of days, then for the row oriented JSON string the backend used
+to cache and for each codec of src/web/back/services/CacheCodec.py measures:
+    - the size of the cached payload (what goes through valkey),
+    - the time to encode it (paid once per miss),
+    - the time the backend spends on a hit before the response is sent,
+    - the time the frontend spends turning the body into a dataframe.
+The JSON string was parsed and re-encoded by FastAPI on every hit, the codecs' payloads are sent as they are stored.
+
+Usage:
+    python -m benchmarks.bench_cache_codecs --days 6000
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from src.web.back.services.CacheCodec import CACHE_CODECS, get_cache_codec
+
+
+def make_stock_df(days: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, days)))
+    return pd.DataFrame({
+        "date": pd.date_range("2008-01-01", periods=days, freq="D"),
+        "ouverture": close * (1 + rng.normal(0, 0.002, days)),
+        "haut": close * 1.01,
+        "bas": close * 0.99,
+        "cloture": close,
+        "volume": rng.integers(0, 100_000, days).astype(float),
+    })
+
+
+def best_time(func, repeat: int) -> float:
+    """best of repeat runs, in ms"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main(days: int, repeat: int):
+    df = make_stock_df(days)
+    print(f"{days} days")
+    print(f"{'codec':<16}{'size (KB)':>12}{'encode (ms)':>14}{'hit (ms)':>12}{'client (ms)':>14}")
+
+    # what get_stock used to cache: the records JSON string, parsed and re-encoded by FastAPI on every hit
+    records = df.assign(date=df["date"].dt.strftime("%Y-%m-%dT%H:%M:%S"))
+    encode = lambda: json.dumps({"columns": records.columns.tolist(), "data": records.to_dict(orient="records")})
+    cached = encode()
+    body = JSONResponse(jsonable_encoder(json.loads(cached))).body
+    print(f"{'records (before)':<16}{len(cached.encode()) / 1024:>12.1f}{best_time(encode, repeat):>14.2f}"
+          f"{best_time(lambda: JSONResponse(jsonable_encoder(json.loads(cached))), repeat):>12.2f}"
+          f"{best_time(lambda: pd.DataFrame(json.loads(body)['data']), repeat):>14.2f}")
+
+    for name in CACHE_CODECS:
+        codec = get_cache_codec(name)
+        payload = codec.encode(df)
+        headers = {"Content-Encoding": codec.content_encoding} if codec.content_encoding != None else None
+        if codec.media_type == "application/json":
+            # the http client undoes the content encoding before parsing the JSON
+            client = lambda: pd.DataFrame(json.loads(codec.decompress(payload))["data"])
+        else:
+            client = lambda: pa.ipc.open_stream(payload).read_pandas()
+        print(f"{name:<16}{len(payload) / 1024:>12.1f}{best_time(lambda: codec.encode(df), repeat):>14.2f}"
+              f"{best_time(lambda: Response(payload, media_type=codec.media_type, headers=headers), repeat):>12.3f}"
+              f"{best_time(client, repeat):>14.2f}")
+        decoded = codec.decode(payload)
+        assert np.array_equal(decoded["cloture"].to_numpy(dtype=float), df["cloture"].to_numpy())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the backend cache codecs on a /stock payload.")
+    parser.add_argument("--days", type=int, default=6000, help="Number of days of history")
+    parser.add_argument("--repeat", type=int, default=20, help="Number of runs, the best one is reported")
+    args = parser.parse_args()
+    main(args.days, args.repeat)
@@ -0,0 +1,93 @@
+"""
+Benchmark of the raw data download against the local fixture server.
+
+Generates a fixture with one recorded window per 83 days period since the start date for each symbol, serves it
+with a simulated round trip latency, then times the sequential downloader (scripts/download_data.main, one session
+and one request at a time) and the concurrent one (scripts/download_data_async) for several concurrency levels.
+Both write into a temporary directory, and their raw CSV files are compared.
+
+Usage:
+    python -m benchmarks.bench_download --symbols 88 --start 01-01-2020 --latency 0.05
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from utils import HEADERS, SYMBOLS
+from scripts import download_data
+from scripts.download_data import get_dates, update_dates
+from scripts.download_data_async import download_all
+from scripts.download_fixture_server import FixtureServer, get_window_path
+
+
+def make_fixture(fixture_dir: Path, symbols: list[str], start: str):
+    for symbol in symbols:
+        start_date, end_date = get_dates(start)
+        while start_date <= end_date.today():
+            rows = "".join(f"{symbol};{start_date};100;110;90;105;{i}\r\n" for i in range(60))
+            window_path = get_window_path(fixture_dir, symbol, start_date, end_date)
+            window_path.parent.mkdir(parents=True, exist_ok=True)
+            window_path.write_bytes(f"{HEADERS}\r\n{rows}".encode())
+            start_date, end_date = update_dates(end_date)
+
+
+def run_sequential(server: FixtureServer, symbols: list[str], start: str, work_dir: Path):
+    # download_data.main writes to data/raw relative to the working directory
+    os.chdir(work_dir)
+    with mock.patch.object(download_data, "RAW_DATA_DOWNLOAD_BASELINK", server.base_link), mock.patch.object(download_data, "SYMBOLS", symbols):
+        download_data.main(start)
+
+
+def run_concurrent(server: FixtureServer, symbols: list[str], start: str, work_dir: Path, concurrency: int):
+    raw_dir = work_dir / "data" / "raw"
+    results = asyncio.run(download_all(start, symbols, concurrency, server.base_link, raw_dir, raw_dir / ".download_checkpoint.json"))
+    failed = [symbol for symbol, result in results.items() if isinstance(result, Exception)]
+    if failed:
+        raise Exception(f"Failed to download {failed}")
+
+
+def main(symbols: int, start: str, latency: float, concurrency_levels: list[int]):
+    # httpx logs every request at the INFO level
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    symbols = (SYMBOLS * (symbols // len(SYMBOLS) + 1))[:symbols] if symbols <= len(SYMBOLS) else [f"SYM{i}" for i in range(symbols)]
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        make_fixture(tmp / "fixtures", symbols, start)
+        with FixtureServer(tmp / "fixtures", latency) as server:
+            print(f"{len(symbols)} symbols since {start}, {latency * 1000:.0f} ms simulated latency")
+            print(f"{'downloader':<22}{'requests':>10}{'wall time (s)':>16}")
+            runs = [("sequential", lambda work_dir: run_sequential(server, symbols, start, work_dir))]
+            runs += [(f"async concurrency={c}", lambda work_dir, c=c: run_concurrent(server, symbols, start, work_dir, c)) for c in concurrency_levels]
+            outputs = {}
+            try:
+                for name, run in runs:
+                    work_dir = tmp / name.replace(" ", "_").replace("=", "")
+                    work_dir.mkdir()
+                    server.request_count = 0
+                    start_time = time.perf_counter()
+                    run(work_dir)
+                    elapsed = time.perf_counter() - start_time
+                    print(f"{name:<22}{server.request_count:>10}{elapsed:>16.3f}")
+                    outputs[name] = {symbol: (work_dir / "data" / "raw" / f"{symbol}.csv").read_text() for symbol in symbols}
+            finally:
+                os.chdir(cwd)
+    assert all(output == outputs["sequential"] for output in outputs.values())
+    print("all the downloaders wrote the same raw files")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the raw data downloaders against the fixture server.")
+    parser.add_argument("--symbols", type=int, default=88, help="Number of symbols")
+    parser.add_argument("--start", type=str, default="01-01-2020", help="Start date in dd-mm-YYYY format")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated round trip latency in seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4, 8, 16], help="Concurrency levels of the async downloader")
+    args = parser.parse_args()
+    main(args.symbols, args.start, args.latency, args.concurrency)
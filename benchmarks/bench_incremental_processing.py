@@ -0,0 +1,70 @@
+"""
+Benchmark of the daily update of the processed data.
+
+Compares a full rebuild (fill_missing_dates_interpolation over the whole processed history concatenated with the
+new rows, what process_all_raw_files used to do) with the incremental mode (append_new_rows_interpolation, which
+only interpolates the gap after the last processed date) for every stock, and checks both give the same frame.
+
+Usage:
+    python -m benchmarks.bench_incremental_processing --stocks 88 --start 2008-01-01 --new-days 3
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from scripts.process_data import fill_missing_dates_interpolation, append_new_rows_interpolation
+
+
+def _make_stock(rng: np.random.Generator, dates: pd.DatetimeIndex) -> pd.DataFrame:
+    close = 100 + rng.standard_normal(len(dates)).cumsum()
+    return pd.DataFrame({
+        'date': dates,
+        'ouverture': close + rng.random(len(dates)),
+        'haut': close + 1,
+        'bas': close - 1,
+        'cloture': close,
+        'volume': rng.integers(100, 10000, len(dates)).astype(float)
+    })
+
+
+def main(stocks: int, start: str, new_days: int):
+    rng = np.random.default_rng(0)
+    end = pd.Timestamp.today().normalize()
+    # trading days only, the processed history is made daily by the interpolation
+    business_days = pd.bdate_range(start, end)
+    history_days, new_days_index = business_days[:-new_days], business_days[-new_days:]
+    updates = []
+    for _ in range(stocks):
+        raw = _make_stock(rng, business_days)
+        processed_df = fill_missing_dates_interpolation(raw[raw['date'].isin(history_days)])
+        updates.append((processed_df, raw[raw['date'].isin(new_days_index)].reset_index(drop=True)))
+
+    print(f"{stocks} stocks, history since {start} ({len(updates[0][0])} processed rows each), {new_days} new trading days")
+    print(f"{'mode':<14}{'wall time (s)':>16}{'per stock (ms)':>18}")
+    results = {}
+    for mode in ["full rebuild", "incremental"]:
+        start_time = time.perf_counter()
+        results[mode] = [
+            fill_missing_dates_interpolation(pd.concat([processed_df, new_rows], ignore_index=True)) if mode == "full rebuild"
+            else append_new_rows_interpolation(processed_df, new_rows)
+            for processed_df, new_rows in updates
+        ]
+        elapsed = time.perf_counter() - start_time
+        print(f"{mode:<14}{elapsed:>16.3f}{elapsed / stocks * 1000:>18.2f}")
+
+    for full, incremental in zip(results["full rebuild"], results["incremental"]):
+        pd.testing.assert_frame_equal(full, incremental, check_dtype=False)
+    print("incremental output matches the full rebuild")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the daily update of the processed data.")
+    parser.add_argument("--stocks", type=int, default=88, help="Number of stocks")
+    parser.add_argument("--start", type=str, default="2008-01-01", help="First date of the history")
+    parser.add_argument("--new-days", type=int, default=3, help="Number of new trading days in the update")
+    args = parser.parse_args()
+    main(args.stocks, args.start, args.new_days)
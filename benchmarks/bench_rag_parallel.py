@@ -0,0 +1,91 @@
+"""
+Benchmark of the latency of the RAG graph in its sequential and parallel modes.
+
+The LLM chains and the vector store are replaced by stubs answering after the given delays, so the benchmark measures
+how the graph schedules the calls and not the providers. For a relevant and an off topic question it reports the
+latency of create_agents_graph() (topic check, then classification, then retrieval) and of
+create_agents_graph(parallel=True) (the three concurrently, the topic's filter applied to the retrieved documents).
+
+Usage:
+    python -m benchmarks.bench_rag_parallel --llm-delay 0.6 --retrieval-delay 0.3
+"""
+import argparse
+import os
+import statistics
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from langchain_core.documents import Document
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# the RAG modules create their clients at import, they only need settings since the stubs answer every call
+for name, value in {"GOOGLE_API_KEY": "bench", "GOOGLE_API_KEY_1": "bench", "PINECONE_API_KEY": "bench", "INDEX_NAME": "bench",
+                    "GENERATIVE_MODEL": "bench", "SIMPLE_TASK_MODEL": "bench", "EMBEDDING_MODEL": "models/bench"}.items():
+    os.environ.setdefault(name, value)
+with patch("pinecone.Pinecone", MagicMock()):
+    from src.rag import rag_system
+
+
+class DelayedChain:
+    def __init__(self, result, delay: float):
+        self.result = result
+        self.delay = delay
+
+    def invoke(self, *args, **kwargs):
+        time.sleep(self.delay)
+        return self.result
+
+
+class DelayedVectorStore:
+    def __init__(self, documents: list[Document], delay: float):
+        self.documents = documents
+        self.delay = delay
+
+    def as_retriever(self, search_type, search_kwargs):
+        filter = search_kwargs.get("filter")
+        documents = [document for document in self.documents if filter == None or document.metadata["source"] == filter["source"]]
+        return DelayedChain(documents[:search_kwargs["k"]], self.delay)
+
+
+def run(agents, question: str, repeat: int) -> float:
+    """median latency of repeat questions, in ms"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        agents.invoke({"question": question})
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main(llm_delay: float, retrieval_delay: float, generation_delay: float, repeat: int):
+    documents = [Document(page_content=f"document {i}", metadata={"source": source})
+                 for i, source in enumerate(["news", "stocks"] * 20)]
+    generator = SimpleNamespace(get_decision_chain=lambda: DelayedChain("answer", generation_delay))
+    stubs = {
+        "input_classifer": DelayedChain(SimpleNamespace(topic="news"), llm_delay),
+        "answer_grader_agent": DelayedChain(SimpleNamespace(binary_score="yes"), llm_delay),
+        "off_topic_responder": DelayedChain("off topic", llm_delay),
+        "n_agent": generator, "s_agent": generator, "r_agent": generator,
+        "vector_store": DelayedVectorStore(documents, retrieval_delay),
+    }
+    print(f"llm {llm_delay * 1000:.0f}ms, retrieval {retrieval_delay * 1000:.0f}ms, generation {generation_delay * 1000:.0f}ms")
+    print(f"{'question':<12}{'sequential (ms)':>18}{'parallel (ms)':>16}{'speedup':>10}")
+    for question, datasource in (("relevant", "rag"), ("off topic", "off_topic")):
+        with patch.multiple(rag_system, topic_checker=DelayedChain(SimpleNamespace(datasource=datasource), llm_delay), **stubs):
+            sequential = run(rag_system.create_agents_graph(), question, repeat)
+            parallel = run(rag_system.create_agents_graph(parallel=True), question, repeat)
+        print(f"{question:<12}{sequential:>18.0f}{parallel:>16.0f}{sequential / parallel:>9.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the latency of the RAG graph's sequential and parallel modes.")
+    parser.add_argument("--llm-delay", type=float, default=0.6, help="Seconds each topic check, classification and grading takes")
+    parser.add_argument("--retrieval-delay", type=float, default=0.3, help="Seconds each vector store query takes")
+    parser.add_argument("--generation-delay", type=float, default=1.5, help="Seconds each answer generation takes")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of questions per mode, the median latency is reported")
+    args = parser.parse_args()
+    main(args.llm_delay, args.retrieval_delay, args.generation_delay, args.repeat)
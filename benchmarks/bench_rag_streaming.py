@@ -0,0 +1,118 @@
+"""
+Benchmark of the time to first token of the streamed RAG answers.
+
+The generator LLM is replaced by a stub chat model writing its answer a token at a time after the given delay, and the
+other chains and the vector store by stubs answering after fixed delays, so the benchmark measures when the answer
+reaches the client and not the providers. It reports the latency of agents.invoke (the /rag endpoint, the whole answer
+at once) next to the time to the first token and to the done event of stream_answer (the /rag/stream endpoint).
+
+Usage:
+    python -m benchmarks.bench_rag_streaming --tokens 200 --token-delay 0.02
+"""
+import argparse
+import os
+import statistics
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Iterator
+from unittest.mock import MagicMock, patch
+
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# the RAG modules create their clients at import, they only need settings since the stubs answer every call
+for name, value in {"GOOGLE_API_KEY": "bench", "GOOGLE_API_KEY_1": "bench", "PINECONE_API_KEY": "bench", "INDEX_NAME": "bench",
+                    "GENERATIVE_MODEL": "bench", "SIMPLE_TASK_MODEL": "bench", "EMBEDDING_MODEL": "models/bench"}.items():
+    os.environ.setdefault(name, value)
+with patch("pinecone.Pinecone", MagicMock()):
+    from src.rag import rag_system
+    from src.rag.agents.generator_agents.IGenerator import ANSWER_TAG
+
+from benchmarks.bench_rag_parallel import DelayedChain, DelayedVectorStore
+
+
+class DelayedStreamingChatModel(BaseChatModel):
+    """chat model writing the same answer of tokens words, one every delay seconds"""
+    tokens: int
+    delay: float
+
+    @property
+    def _llm_type(self) -> str:
+        return "delayed-streaming"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        text = "".join(chunk.message.content for chunk in self._stream(messages, stop, run_manager, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        for i in range(self.tokens):
+            time.sleep(self.delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=f"token{i} "))
+            if run_manager != None:
+                run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+            yield chunk
+
+
+def measure_invoke(agents, repeat: int) -> float:
+    """median latency of agents.invoke, in ms"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        agents.invoke({"question": "latest news?"})
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+def measure_stream(agents, repeat: int) -> tuple[float, float]:
+    """median time to the first token and to the done event of stream_answer, in ms"""
+    firstTokens, totals = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        firstToken = None
+        for event, _ in rag_system.stream_answer(agents, "latest news?"):
+            if event == "token" and firstToken == None:
+                firstToken = time.perf_counter() - start
+        firstTokens.append(firstToken)
+        totals.append(time.perf_counter() - start)
+    return statistics.median(firstTokens) * 1000, statistics.median(totals) * 1000
+
+
+def main(llm_delay: float, retrieval_delay: float, tokens: int, token_delay: float, repeat: int):
+    documents = [Document(page_content=f"document {i}", metadata={"source": source})
+                 for i, source in enumerate(["news", "stocks"] * 20)]
+    llm = DelayedStreamingChatModel(tokens=tokens, delay=token_delay).with_config(tags=[ANSWER_TAG])
+    chain = RunnableLambda(lambda input: input["question"]) | llm | StrOutputParser()
+    generator = SimpleNamespace(get_decision_chain=lambda: chain)
+    stubs = {
+        "topic_checker": DelayedChain(SimpleNamespace(datasource="rag"), llm_delay),
+        "input_classifer": DelayedChain(SimpleNamespace(topic="news"), llm_delay),
+        "answer_grader_agent": DelayedChain(SimpleNamespace(binary_score="yes"), llm_delay),
+        "n_agent": generator, "s_agent": generator, "r_agent": generator,
+        "vector_store": DelayedVectorStore(documents, retrieval_delay),
+    }
+    print(f"llm {llm_delay * 1000:.0f}ms, retrieval {retrieval_delay * 1000:.0f}ms, {tokens} tokens of {token_delay * 1000:.0f}ms")
+    print(f"{'graph':<12}{'invoke (ms)':>14}{'first token (ms)':>19}{'stream done (ms)':>19}")
+    with patch.multiple(rag_system, **stubs):
+        for name, parallel in (("sequential", False), ("parallel", True)):
+            agents = rag_system.create_agents_graph(parallel=parallel)
+            invoke = measure_invoke(agents, repeat)
+            firstToken, total = measure_stream(agents, repeat)
+            print(f"{name:<12}{invoke:>14.0f}{firstToken:>19.0f}{total:>19.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the time to first token of the streamed RAG answers.")
+    parser.add_argument("--llm-delay", type=float, default=0.6, help="Seconds each topic check, classification and grading takes")
+    parser.add_argument("--retrieval-delay", type=float, default=0.3, help="Seconds each vector store query takes")
+    parser.add_argument("--tokens", type=int, default=200, help="Number of tokens of the answer")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Seconds the generator LLM takes per token")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of questions per mode, the median latency is reported")
+    args = parser.parse_args()
+    main(args.llm_delay, args.retrieval_delay, args.tokens, args.token_delay, args.repeat)
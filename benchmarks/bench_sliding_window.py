@@ -0,0 +1,76 @@
+"""
+Benchmark of the feature builder used by the training pipeline.
+
+Compares the legacy loop based implementation of get_features_target_from_dataset (one slice per row copied
+through np.array) with the strided view based one, for wall time and peak RSS.
+Each measurement runs in its own process so the peak RSS of one run doesn't leak into the other.
+
+Usage:
+    python -m benchmarks.bench_sliding_window --stocks 88 --rows 6000 --window 60
+"""
+import argparse
+import multiprocessing
+import resource
+import time
+import numpy as np
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from utils.train_test_utils import get_features_target_from_dataset
+
+
+def legacy_get_features_target_from_dataset(dataset: np.ndarray, ShouldOnlyKeepCloseCol: bool, closeColIdx: int, window: int = 60) -> tuple[np.ndarray, np.ndarray]:
+    X = []
+    Y = []
+    for i in range(window, dataset.shape[0]):
+        X.append(dataset[i-window:i])
+        y_to_append = dataset[i]
+        if (ShouldOnlyKeepCloseCol):
+            y_to_append = y_to_append[closeColIdx]
+        Y.append(y_to_append)
+    return np.array(X), np.array(Y)
+
+
+def _run(implementation: str, stocks: int, rows: int, window: int, queue: multiprocessing.Queue):
+    rng = np.random.default_rng(0)
+    datasets = [rng.random((rows, 1)) for _ in range(stocks)]
+    # baseline RSS once the inputs exist, what we measure is what the feature builder adds on top of it
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    # like the training script, each stock's features stay alive while its model trains
+    kept = None
+    for dataset in datasets:
+        match implementation:
+            case "legacy":
+                kept = legacy_get_features_target_from_dataset(dataset, False, 0, window=window)
+            case "views":
+                kept = get_features_target_from_dataset(dataset, False, closeColIdx=0, isArimaContext=False, window=window)
+            case "views_float32":
+                kept = get_features_target_from_dataset(dataset, False, closeColIdx=0, isArimaContext=False, window=window, use_float32=True)
+        # touch the features the way model.fit would
+        float(kept[0][-1].sum())
+    elapsed = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, (rss_after - rss_before) / 1024)) # ru_maxrss is in KB on linux
+
+
+def main(stocks: int, rows: int, window: int):
+    print(f"{stocks} stocks x {rows} rows, window {window}")
+    print(f"{'implementation':<16}{'wall time (s)':>16}{'peak RSS delta (MB)':>22}")
+    for implementation in ["legacy", "views", "views_float32"]:
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_run, args=(implementation, stocks, rows, window, queue))
+        process.start()
+        elapsed, peak_rss = queue.get()
+        process.join()
+        print(f"{implementation:<16}{elapsed:>16.3f}{peak_rss:>22.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the sliding window feature builder.")
+    parser.add_argument("--stocks", type=int, default=88, help="Number of stocks")
+    parser.add_argument("--rows", type=int, default=6000, help="Number of daily rows per stock")
+    parser.add_argument("--window", type=int, default=60, help="Window size")
+    args = parser.parse_args()
+    main(args.stocks, args.rows, args.window)
@@ -0,0 +1,88 @@
+"""
+Benchmark of the backend's cold start: the time to import src.web.back.main in a new interpreter, and then to set up
+the RAG graph for its first question (the graph, its LLM chains and the vector store).
+
+Pinecone is replaced by a stub answering after --network-delay seconds, so the benchmark doesn't need the service and
+shows what the network costs the startup. With --offline every Pinecone call fails, like in a container without network
+access: the import must still succeed, only the RAG setup fails.
+
+Usage:
+    python -m benchmarks.bench_startup --repeat 5 --network-delay 0.5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+# run in the new interpreter: stubs Pinecone, then times the import and the RAG setup
+SCRIPT = """
+import json, time
+from unittest.mock import MagicMock
+import pinecone
+
+def list_indexes(self):
+    if {offline}:
+        raise ConnectionError("no network access")
+    time.sleep({delay})
+    return [{{"name": "{index}"}}]
+
+pinecone.Pinecone.list_indexes = list_indexes
+pinecone.Pinecone.Index = lambda self, name, **kwargs: MagicMock()
+
+start = time.perf_counter()
+import src.web.back.main as main
+imported = time.perf_counter() - start
+
+from src.rag import rag_system
+start = time.perf_counter()
+try:
+    main.agents.get()
+    for agent in (rag_system.topic_checker, rag_system.input_classifer, rag_system.answer_grader_agent, rag_system.vector_store):
+        agent.get()
+    for agent in (rag_system.n_agent, rag_system.s_agent, rag_system.r_agent):
+        agent.get_decision_chain()
+    setup = time.perf_counter() - start
+except Exception:
+    setup = None
+print(json.dumps({{"import": imported, "setup": setup}}))
+"""
+
+
+def measure(delay: float, offline: bool, env: dict) -> dict:
+    script = SCRIPT.format(delay=delay, offline=offline, index=env["INDEX_NAME"])
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"exit status {result.returncode}"
+        raise SystemExit(f"import src.web.back.main failed: {error}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(repeat: int, delay: float, offline: bool):
+    env = dict(os.environ)
+    # the backend reads its settings at import, they only need values since the services are stubbed
+    for name, value in {"GOOGLE_API_KEY": "bench", "GOOGLE_API_KEY_1": "bench", "PINECONE_API_KEY": "bench", "INDEX_NAME": "bench",
+                        "GENERATIVE_MODEL": "bench", "SIMPLE_TASK_MODEL": "bench", "EMBEDDING_MODEL": "models/bench",
+                        "KERAS_BACKEND": "torch", "WINDOW_SIZE": "5", "MODEL_NAME": "LSTM", "MODEL_LOCATION": "LOCAL"}.items():
+        env.setdefault(name, value)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")]))
+
+    runs = [measure(delay, offline, env) for _ in range(repeat)]
+    imports = [run["import"] for run in runs]
+    setups = [run["setup"] for run in runs if run["setup"] != None]
+    print(f"network {'offline' if offline else f'{delay * 1000:.0f}ms'}, {repeat} runs")
+    print(f"{'import src.web.back.main (ms)':<34}{statistics.median(imports) * 1000:>10.0f}")
+    print(f"{'RAG setup on first use (ms)':<34}{statistics.median(setups) * 1000 if setups else float('nan'):>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the backend's cold start.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of interpreters started, the median times are reported")
+    parser.add_argument("--network-delay", type=float, default=0.5, help="Seconds each Pinecone call takes")
+    parser.add_argument("--offline", action="store_true", help="Make every Pinecone call fail")
+    args = parser.parse_args()
+    main(args.repeat, args.network_delay, args.offline)
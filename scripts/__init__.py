@@ -1,2 +1,2 @@
 from .download_data import get_dates, update_dates, download
-from .process_data import process_all_raw_files, fill_missing_dates_interpolation 
\ No newline at end of file
+from .process_data import process_all_raw_files, fill_missing_dates_interpolation, append_new_rows_interpolation 
\ No newline at end of file
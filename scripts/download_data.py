@@ -45,6 +45,23 @@ def update_dates(date):
     end_date=start_date+relativedelta(days= 83)
     return start_date,end_date
 
+def append_csv_content(file_path, content):
+    """
+    Appends the rows of a downloaded csv to a raw data file in a single buffered write
+    input:
+        file_path: path of the raw data file, it's created with the headers if it doesn't exist
+        content: the downloaded csv, its first line is the headers
+    """
+    lines = [line for line in content.split('\r\n')[1:] if line != ''] ## We skip first line because it's the headers
+    dir_path = os.path.dirname(file_path)
+    if dir_path and not os.path.exists(dir_path):
+        os.makedirs(dir_path)
+    with open(file_path, 'a') as f:
+        if os.stat(file_path).st_size == 0:
+            print(f"{file_path} created successfully")
+            lines.insert(0, HEADERS)
+        f.write(''.join(f'{line}\n' for line in lines))
+
 def download(start_date, end_date ,cookies, token, session, link, fileName):
     # Extract cookies explicitly
     cookies = session.cookies.get_dict()
@@ -71,18 +88,9 @@ def download(start_date, end_date ,cookies, token, session, link, fileName):
 
     file_path = f"data/raw/{fileName}"
     if response_post.status_code == 200:
-        if not os.path.exists("data/raw"):
-            os.makedirs("data/raw")
-        response_post_content_to_array = response_post.content.decode().split('\r\n')
-        if response_post_content_to_array[0] == HEADERS: ## Ugly hack to check if the content is indeed a csv file (if there are no data the api call returns an html file)
-            with open(file_path, 'a') as f:
-                if os.stat(file_path).st_size == 0:
-                    print(f"{file_path} created successfully")
-                    f.write(f'{HEADERS}\n')
-                for i in range(1,len(response_post_content_to_array)): ## We skip first line because it's the headers
-                    line = response_post_content_to_array[i]
-                    if line != '':
-                        f.write(f'{response_post_content_to_array[i]}\n')
+        response_post_content = response_post.content.decode()
+        if response_post_content.split('\r\n')[0] == HEADERS: ## Ugly hack to check if the content is indeed a csv file (if there are no data the api call returns an html file)
+            append_csv_content(file_path, response_post_content)
     else:
         raise Exception(f"❌ Failed to download file. Status code: {response_post.status_code}")
             
@@ -0,0 +1,222 @@
+"""
+Asynchronous version of scripts/download_data.py.
+
+The symbols are downloaded concurrently through a single pooled HTTP client, with a bounded number of requests in
+flight per host. Each symbol still gets its own verification token and cookies, and its 83 days windows are fetched
+in order so that the raw CSV stays sorted. Failed requests are retried with an exponential backoff, and the last
+window downloaded for each symbol is saved to a checkpoint so that an interrupted run can be resumed without
+downloading (and appending) the same windows twice.
+
+Usage:
+    python -m scripts.download_data_async --date all --concurrency 8
+    python -m scripts.download_data_async --date all --record fixtures/ilboursa     # also save the responses
+    python -m scripts.download_data_async --date all --offline fixtures/ilboursa    # replay them from a local server
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+from datetime import datetime, date
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import httpx
+from bs4 import BeautifulSoup
+
+import sys
+sys.path.insert(0, str(Path(os.getcwd()) / '..'))
+from utils import RAW_DATA_DOWNLOAD_BASELINK, HEADERS, SYMBOLS
+from scripts.download_data import get_dates, update_dates, append_csv_content
+from scripts.download_fixture_server import FixtureServer, get_page_path, get_window_path
+
+logger = logging.getLogger(__name__)
+
+RAW_DATA_DIR = Path("data") / "raw"
+CHECKPOINT_PATH = RAW_DATA_DIR / ".download_checkpoint.json"
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+POST_HEADERS = {
+    "Content-Type": "application/x-www-form-urlencoded",
+    "Origin": "https://www.ilboursa.com",
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36",
+}
+
+
+class DownloadCheckpoint:
+    """
+    Last window end date downloaded for each symbol of a run, persisted after every window.
+    A checkpoint belongs to the start date of the run it was written by, it's ignored by a run with another start date.
+    """
+
+    def __init__(self, path: str | Path, start: str):
+        self.path = Path(path)
+        self.start = start
+        self.__dates = {}
+        if self.path.is_file():
+            with open(self.path) as f:
+                checkpoint = json.load(f)
+            if checkpoint.get("start") == start:
+                self.__dates = checkpoint.get("symbols", {})
+
+    def get(self, symbol: str) -> date | None:
+        last_date = self.__dates.get(symbol)
+        return datetime.strptime(last_date, "%Y-%m-%d").date() if last_date != None else None
+
+    def update(self, symbol: str, last_date: date):
+        self.__dates[symbol] = last_date.isoformat()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # written next to the checkpoint then renamed so that an interrupted run never leaves it half written
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"start": self.start, "symbols": self.__dates}, f)
+        os.replace(tmp_path, self.path)
+
+
+class HostLimiter:
+    """bounds the number of requests in flight to each host"""
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.__semaphores = {}
+
+    def get(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self.__semaphores:
+            self.__semaphores[host] = asyncio.Semaphore(self.concurrency)
+        return self.__semaphores[host]
+
+
+async def request_with_retry(client: httpx.AsyncClient, limiter: HostLimiter, method: str, url: str, retries: int = 3, backoff: float = 1.0, **kwargs) -> httpx.Response:
+    """sends a request, retrying transport errors and 429/5xx responses with an exponential backoff"""
+    for attempt in range(retries + 1):
+        try:
+            async with limiter.get(url):
+                response = await client.request(method, url, **kwargs)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == retries:
+                return response
+            logger.warning(f"{method} {url} returned {response.status_code}, retrying ({attempt + 1}/{retries})")
+        except httpx.TransportError as e:
+            if attempt == retries:
+                raise
+            logger.warning(f"{method} {url} failed with {e!r}, retrying ({attempt + 1}/{retries})")
+        # the sleep happens outside of the semaphore so that a backing off request doesn't hold a slot
+        await asyncio.sleep(backoff * 2 ** attempt * (1 + random.random()))
+
+
+async def download_symbol(client: httpx.AsyncClient, limiter: HostLimiter, symbol: str, start: str, checkpoint: DownloadCheckpoint,
+                          base_link: str = RAW_DATA_DOWNLOAD_BASELINK, raw_dir: str | Path = RAW_DATA_DIR, record_dir: str | Path = None,
+                          retries: int = 3, backoff: float = 1.0) -> int:
+    """
+    Downloads the windows of a symbol from the start date (or from its checkpoint) up to today and appends them to {raw_dir}/{symbol}.csv.
+
+    Returns:
+        int: the number of windows downloaded.
+    """
+    today = datetime.today().date()
+    start_date, end_date = get_dates(start)
+    last_date = checkpoint.get(symbol)
+    if last_date != None:
+        start_date, end_date = update_dates(last_date)
+    if today < start_date:
+        return 0
+
+    # First GET request to load page and retrieve token + cookies
+    link = f"{base_link}{symbol}"
+    response_get = await request_with_retry(client, limiter, "GET", link, retries, backoff)
+    soup = BeautifulSoup(response_get.text, "html.parser")
+    token_input = soup.find('input', {'name': '__RequestVerificationToken'})
+    if token_input is None:
+        raise Exception(f"Token not found on page for {symbol}. Maybe the page structure changed?")
+    token = token_input['value']
+    # the client doesn't keep cookies, each symbol sends the ones it was given like a session of its own
+    cookie_header = "; ".join(f"{name}={value}" for name, value in response_get.cookies.items())
+    if record_dir != None:
+        get_page_path(record_dir, symbol).parent.mkdir(parents=True, exist_ok=True)
+        get_page_path(record_dir, symbol).write_text(response_get.text)
+
+    file_path = Path(raw_dir) / f"{symbol}.csv"
+    headers = {**POST_HEADERS, "Referer": link}
+    if cookie_header:
+        headers["Cookie"] = cookie_header
+    windows = 0
+    while today >= start_date:
+        data = {
+            'dtFrom': str(start_date),
+            '__Invariant': 'dtTo',
+            'dtTo': str(end_date),
+            '__RequestVerificationToken': token
+        }
+        response_post = await request_with_retry(client, limiter, "POST", link, retries, backoff, data=data, headers=headers)
+        if response_post.status_code != 200:
+            raise Exception(f"❌ Failed to download {symbol} from {start_date} to {end_date}. Status code: {response_post.status_code}")
+        content = response_post.content.decode()
+        if content.split('\r\n')[0] == HEADERS: ## the api call returns an html file when there is no data
+            append_csv_content(file_path, content)
+            if record_dir != None:
+                get_window_path(record_dir, symbol, start_date, end_date).write_bytes(response_post.content)
+        checkpoint.update(symbol, min(end_date, today))
+        windows += 1
+        start_date, end_date = update_dates(end_date)
+    return windows
+
+
+async def download_all(start: str, symbols: list[str] = SYMBOLS, concurrency: int = 4, base_link: str = RAW_DATA_DOWNLOAD_BASELINK,
+                       raw_dir: str | Path = RAW_DATA_DIR, checkpoint_path: str | Path = CHECKPOINT_PATH, record_dir: str | Path = None,
+                       retries: int = 3, backoff: float = 1.0, timeout: float = 30) -> dict:
+    """
+    Downloads all the symbols concurrently.
+
+    Args:
+        start: start date in string format "dd-mm-yyyy".
+        symbols: the symbols to download.
+        concurrency: maximum number of requests in flight per host.
+        base_link: the download link the symbols are appended to.
+        raw_dir: the directory of the raw CSV files.
+        checkpoint_path: the checkpoint file, the symbols already downloaded by an interrupted run with the same start are resumed.
+        record_dir: if set, the responses are also saved there to be replayed by the fixture server.
+        retries: number of retries of a failed request.
+        backoff: base delay in seconds of the exponential backoff.
+        timeout: timeout in seconds of a request.
+
+    Returns:
+        dict: the number of windows downloaded per symbol, the exception for the symbols that failed.
+    """
+    checkpoint = DownloadCheckpoint(checkpoint_path, start)
+    limiter = HostLimiter(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    # a jar accepting no cookie, they are handled per symbol
+    cookies = CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+    async with httpx.AsyncClient(limits=limits, timeout=timeout, cookies=cookies) as client:
+        results = await asyncio.gather(*[
+            download_symbol(client, limiter, symbol, start, checkpoint, base_link, raw_dir, record_dir, retries, backoff)
+            for symbol in symbols
+        ], return_exceptions=True)
+    for symbol, result in zip(symbols, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error downloading {symbol}: {result}")
+    return dict(zip(symbols, results))
+
+
+def main(start: str, concurrency: int = 4, offline: str = None, record: str = None) -> dict:
+    if offline != None:
+        with FixtureServer(offline) as server:
+            return asyncio.run(download_all(start, concurrency=concurrency, base_link=server.base_link, record_dir=record))
+    return asyncio.run(download_all(start, concurrency=concurrency, record_dir=record))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Concurrent download automation for stock data.")
+    parser.add_argument("--date", required=True, help="Start date in dd-mm-YYYY format")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum number of requests in flight")
+    parser.add_argument("--offline", help="Replay the responses recorded in this directory instead of calling ilboursa")
+    parser.add_argument("--record", help="Save the responses in this directory")
+    args = parser.parse_args()
+    start_date_str = "01-01-2008" if args.date.lower() == "all" else args.date
+
+    results = main(start_date_str, args.concurrency, args.offline, args.record)
+    if any(isinstance(result, Exception) for result in results.values()):
+        sys.exit(1)
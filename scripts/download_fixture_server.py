@@ -0,0 +1,133 @@
+"""
+Local server replaying recorded ilboursa download responses, used to run the downloader offline (tests, benchmarks).
+
+A fixture directory holds one folder per symbol:
+    {fixture_dir}/{symbol}/page.html               the download page with the __RequestVerificationToken input (optional)
+    {fixture_dir}/{symbol}/{dtFrom}_{dtTo}.csv     the body returned for a POST of that date window
+Those are the files written by `python -m scripts.download_data_async --record {fixture_dir}`.
+A window without a recorded response gets the html page back, like the real endpoint does when there is no data.
+"""
+import argparse
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import parse_qs
+
+DOWNLOAD_PATH = "/marches/download/"
+DEFAULT_TOKEN = "fixture-token"
+DEFAULT_PAGE = f'<html><body><form><input name="__RequestVerificationToken" type="hidden" value="{DEFAULT_TOKEN}" /></form></body></html>'
+
+
+def get_page_path(fixture_dir: str | Path, symbol: str) -> Path:
+    return Path(fixture_dir) / symbol / "page.html"
+
+
+def get_window_path(fixture_dir: str | Path, symbol: str, start_date, end_date) -> Path:
+    return Path(fixture_dir) / symbol / f"{start_date}_{end_date}.csv"
+
+
+class FixtureServer:
+    """
+    Serves a fixture directory on 127.0.0.1 from a background thread.
+
+    Args:
+        fixture_dir: the directory of recorded responses.
+        latency: seconds slept before answering each request, to simulate the network round trip.
+        port: the port to listen on, a free one is picked if 0.
+    """
+
+    def __init__(self, fixture_dir: str | Path, latency: float = 0, port: int = 0):
+        self.fixture_dir = Path(fixture_dir)
+        self.latency = latency
+        self.request_count = 0
+        self.__lock = threading.Lock()
+        self.__server = ThreadingHTTPServer(("127.0.0.1", port), self.__make_handler())
+        self.__server.daemon_threads = True
+        self.__thread = None
+
+    @property
+    def base_link(self) -> str:
+        """the equivalent of RAW_DATA_DOWNLOAD_BASELINK pointing to this server"""
+        host, port = self.__server.server_address[:2]
+        return f"http://{host}:{port}{DOWNLOAD_PATH}"
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def __make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                symbol = server.count_request(self.path)
+                if symbol is None:
+                    return self.__send(404, b"")
+                self.__send(200, server.get_page(symbol).encode(), "text/html")
+
+            def do_POST(self):
+                symbol = server.count_request(self.path)
+                if symbol is None:
+                    return self.__send(404, b"")
+                form = parse_qs(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode())
+                page = server.get_page(symbol)
+                token = form.get("__RequestVerificationToken", [None])[0]
+                if token is None or f'value="{token}"' not in page:
+                    return self.__send(400, b"invalid token")
+                window_path = get_window_path(server.fixture_dir, symbol, form.get("dtFrom", [""])[0], form.get("dtTo", [""])[0])
+                if window_path.is_file():
+                    return self.__send(200, window_path.read_bytes(), "text/csv")
+                self.__send(200, page.encode(), "text/html")
+
+            def __send(self, status: int, body: bytes, content_type: str = "text/plain"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def count_request(self, path: str) -> str | None:
+        """counts a request and returns the symbol it targets, None if it's not a download link"""
+        with self.__lock:
+            self.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if not path.startswith(DOWNLOAD_PATH):
+            return None
+        return path[len(DOWNLOAD_PATH):].strip("/") or None
+
+    def get_page(self, symbol: str) -> str:
+        page_path = get_page_path(self.fixture_dir, symbol)
+        return page_path.read_text() if page_path.is_file() else DEFAULT_PAGE
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded ilboursa download responses.")
+    parser.add_argument("fixture_dir", help="Directory of recorded responses")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    parser.add_argument("--latency", type=float, default=0, help="Seconds slept before answering each request")
+    args = parser.parse_args()
+    server = FixtureServer(args.fixture_dir, args.latency, args.port)
+    print(f"Serving {args.fixture_dir} on {server.base_link}")
+    server.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
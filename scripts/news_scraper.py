@@ -11,7 +11,7 @@ from langchain_community.document_loaders import WebBaseLoader
 from pathlib import Path
 import sys
 sys.path.insert(0, str(Path(os.getcwd()) / '..'))
-from src import get_pinecone_vector_store
+from src import get_vector_store, publish_document_sources
 from utils import PAGE_URL, NEWS_BASE_URL
 
 
@@ -100,17 +100,19 @@ def process_urls(articles) -> list[Document]:
 
 def store_docs(docs):
     """
-    Store documents in Pinecone VectorStore.
+    Store documents in the vector store (Pinecone or the local one, see get_vector_store).
     
     Args:
         docs (list[Document]): List of documents to store.
         
     """
-    vector_store = get_pinecone_vector_store(index_name)
+    vector_store = get_vector_store(index_name)
     
     try:
         vector_store.add_documents(docs)
         print(f"Stored {len(docs)} documents in Pinecone.")
+        # the backend drops the RAG answers generated without these news
+        publish_document_sources(["news"])
     except Exception as e:
         print(f"Error storing documents in Pinecone: {e}")
 
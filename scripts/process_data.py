@@ -1,9 +1,16 @@
+import argparse
+import multiprocessing
+import numpy as np
 import pandas as pd
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import logging
 from datetime import datetime
 
+from utils.data_utils import read_stock_data, write_stock_data, has_stock_data
+from src.web.back.services.CacheVersions import publish_stock_versions, DATA_VERSION
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -12,6 +19,9 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 PROJECT_ROOT = Path(__file__).parent.parent
+OHLC_COLUMNS = ['ouverture', 'haut', 'bas', 'cloture', 'volume']
+# below this number of rows a batch is interpolated in the main process, the workers' start up would cost more than they save
+BATCH_PARALLEL_MIN_ROWS = 1_000_000
 
 def fill_missing_dates_interpolation(stock_df, date_col='date'):
     """
@@ -35,8 +45,7 @@ def fill_missing_dates_interpolation(stock_df, date_col='date'):
         is_new_row = ~df.index.isin(original_dates)
 
         # For OHLC columns, ensure numeric type before interpolation
-        ohlc_columns = ['ouverture', 'haut', 'bas', 'cloture', 'volume']
-        for col in ohlc_columns:
+        for col in OHLC_COLUMNS:
             if col in df.columns:
                 # Convert to numeric, handling European decimal commas if needed
                 df[col] = pd.to_numeric(df[col].astype(str).str.replace(',', '.'), errors='coerce')
@@ -50,10 +59,202 @@ def fill_missing_dates_interpolation(stock_df, date_col='date'):
     except Exception as e:
         raise ValueError(f"Error processing DataFrame: {str(e)}") from e
 
-def process_all_raw_files():
+def append_new_rows_interpolation(processed_df, new_rows, date_col='date'):
+    """
+    Append new rows to an already processed history, only interpolating the gap between the last processed date and the new rows.
+    The result matches fill_missing_dates_interpolation applied to the concatenation of both frames, without converting
+    and reindexing the whole history: the interpolation is anchored on the processed rows holding the last known value of each column.
+    """
+    try:
+        if date_col not in new_rows.columns:
+            raise ValueError(f"Required column '{date_col}' not found in DataFrame")
+
+        if not pd.api.types.is_datetime64_any_dtype(processed_df[date_col]):
+            processed_df = processed_df.assign(**{date_col: pd.to_datetime(processed_df[date_col])})
+        if not processed_df[date_col].is_monotonic_increasing:
+            processed_df = processed_df.sort_values(date_col)
+        processed_df = processed_df.reset_index(drop=True)
+        value_columns = [col for col in OHLC_COLUMNS if col in processed_df.columns]
+        last_valid_indexes = [processed_df[col].last_valid_index() for col in value_columns]
+        if processed_df.empty or None in last_valid_indexes:
+            # no left anchor for some column, the whole history is needed
+            return fill_missing_dates_interpolation(pd.concat([processed_df, new_rows], ignore_index=True), date_col)
+
+        # the oldest of the last known values, the rows before it can't change the interpolation of the gap
+        anchor = processed_df.iloc[min(last_valid_indexes, default=len(processed_df) - 1):]
+        tail = fill_missing_dates_interpolation(pd.concat([anchor, new_rows], ignore_index=True), date_col)
+        tail = tail[tail[date_col] > processed_df[date_col].max()]
+        return pd.concat([processed_df, tail], ignore_index=True)
+
+    except Exception as e:
+        raise ValueError(f"Error processing DataFrame: {str(e)}") from e
+
+def _parse_unique(column, parse):
+    """applies an element-wise parser to the distinct values of a column only, prices and dates repeat a lot across the stocks"""
+    codes, uniques = pd.factorize(column)
+    parsed = parse(pd.Series(uniques, dtype=column.dtype))
+    if (codes == -1).any():
+        # missing values are parsed too, like the other ones
+        missing = parse(pd.Series([column[codes == -1].iloc[0]], dtype=column.dtype))
+        parsed = pd.concat([parsed, missing], ignore_index=True)
+    return parsed.to_numpy()[codes]
+
+def _interpolate_matrix(values, is_new_row):
+    """
+    Linear interpolation of the new rows of each column of a (days, stocks) matrix, the same way pandas does it for a single stock:
+    with np.interp over the valid positions, the new rows after the last valid value take that value and the ones before the first stay NaN.
+    """
+    positions = np.arange(values.shape[0])[:, np.newaxis]
+    valid = ~np.isnan(values)
+    previous = np.maximum.accumulate(np.where(valid, positions, -1), axis=0)
+    following = np.minimum.accumulate(np.where(valid, positions, values.shape[0])[::-1], axis=0)[::-1]
+    columns = np.broadcast_to(np.arange(values.shape[1]), values.shape)
+
+    result = values.copy()
+    has_previous = is_new_row & (previous >= 0)
+    has_both = has_previous & (following < values.shape[0])
+    trailing = has_previous & ~has_both
+    result[trailing] = values[previous[trailing], columns[trailing]]
+
+    previous, following, columns, x = previous[has_both], following[has_both], columns[has_both], positions.repeat(values.shape[1], axis=1)[has_both]
+    previous_values = values[previous, columns]
+    # same operations as np.interp so that the values are identical
+    slope = (values[following, columns] - previous_values) / (following - previous)
+    result[has_both] = slope * (x - previous) + previous_values
+    return result
+
+def fill_missing_dates_interpolation_batch(stock_dfs, date_col='date'):
+    """
+    Batch version of fill_missing_dates_interpolation, giving the same frame for each stock.
+    All the stocks are aligned on a shared calendar as one (days, stocks) matrix per OHLC column, so the calendar filling
+    and the interpolation are a single vectorised pass instead of one reindex and interpolation per stock.
+
+    Input:
+        stock_dfs: dict of stock symbol to its history, the dates of a stock must be unique.
+    Returns:
+        dict of stock symbol to its filled history.
+    """
+    try:
+        if not stock_dfs:
+            return {}
+        for stock, df in stock_dfs.items():
+            if date_col not in df.columns:
+                raise ValueError(f"Required column '{date_col}' not found in DataFrame of {stock}")
+
+        stocks = list(stock_dfs)
+        long_df = pd.concat([df.assign(symbol=stock_idx) for stock_idx, df in enumerate(stock_dfs.values())], ignore_index=True)
+        dates = pd.Series(_parse_unique(long_df[date_col], lambda uniques: pd.to_datetime(uniques, format='%d/%m/%Y', dayfirst=True)))
+        if dates.isna().any():
+            raise ValueError("Missing dates")
+
+        # position of each row in the shared calendar
+        first_date = dates.min()
+        calendar = pd.date_range(start=first_date, end=dates.max(), freq='D')
+        day = ((dates - first_date) // pd.Timedelta(days=1)).to_numpy()
+        stock_idx = long_df['symbol'].to_numpy()
+        if pd.Series(day * len(stocks) + stock_idx).duplicated().any():
+            raise ValueError("cannot reindex on an axis with duplicate labels")
+
+        is_original = np.zeros((len(calendar), len(stocks)), dtype=bool)
+        is_original[day, stock_idx] = True
+        first_days = np.full(len(stocks), len(calendar))
+        last_days = np.full(len(stocks), -1)
+        np.minimum.at(first_days, stock_idx, day)
+        np.maximum.at(last_days, stock_idx, day)
+        positions = np.arange(len(calendar))[:, np.newaxis]
+        is_in_range = (positions >= first_days) & (positions <= last_days)
+        is_new_row = is_in_range & ~is_original
+
+        filled = {}
+        for col in OHLC_COLUMNS:
+            if col not in long_df.columns:
+                continue
+            # Convert to numeric, handling European decimal commas if needed
+            column = _parse_unique(long_df[col], lambda uniques: pd.to_numeric(uniques.astype(str).str.replace(',', '.'), errors='coerce'))
+            values = np.full((len(calendar), len(stocks)), np.nan)
+            values[day, stock_idx] = column.astype(np.float64)
+            filled[col] = _interpolate_matrix(values, is_new_row)
+
+        results = {}
+        for i, (stock, df) in enumerate(stock_dfs.items()):
+            rows = slice(first_days[i], last_days[i] + 1)
+            result = pd.DataFrame({date_col: calendar[rows]})
+            for col in df.columns:
+                if col == date_col:
+                    continue
+                if col in filled:
+                    result[col] = filled[col][rows, i]
+                else:
+                    # other columns are only reindexed
+                    result[col] = df[col].set_axis(dates[long_df['symbol'] == i]).sort_index().reindex(calendar[rows]).to_numpy()
+            results[stock] = result
+        return results
+
+    except Exception as e:
+        raise ValueError(f"Error processing DataFrame: {str(e)}") from e
+
+def _process_batch(stock_dfs, output_dir):
+    """
+    Interpolates a batch of stocks with fill_missing_dates_interpolation_batch and saves them.
+    Returns the stocks that were saved with the versions of their data.
+    """
+    try:
+        processed_dfs = fill_missing_dates_interpolation_batch(stock_dfs)
+    except ValueError as e:
+        # a stock with invalid dates fails the whole batch, the stocks are interpolated one by one to find it
+        logger.warning(f"{str(e)}, interpolating the batch one stock at a time")
+        processed_dfs = {}
+        for stock, df in stock_dfs.items():
+            try:
+                processed_dfs[stock] = fill_missing_dates_interpolation(df)
+            except Exception as e:
+                logger.error(f"Error processing {stock}: {str(e)}")
+
+    saved = {}
+    for stock, processed_df in processed_dfs.items():
+        try:
+            saved[stock] = write_stock_data(processed_df, stock, output_dir)
+        except Exception as e:
+            logger.error(f"Error saving {stock}: {str(e)}")
+    return saved
+
+def process_batch(stock_dfs, output_dir, workers=None):
+    """
+    Interpolates and saves stocks in batches, spread over several processes when there are enough rows for it to pay off.
+    Input:
+        stock_dfs: dict of stock symbol to its history to interpolate.
+        output_dir: the processed data directory.
+        workers: number of processes, read from the PROCESS_WORKERS env variable if not given, defaults to the number of cores.
+    Returns:
+        dict of the stocks that were saved to the versions of their data.
+    """
+    if workers is None:
+        workers = int(os.environ.get("PROCESS_WORKERS")) if os.environ.get("PROCESS_WORKERS") != None else os.cpu_count() or 1
+    rows = sum(len(df) for df in stock_dfs.values())
+    workers = min(workers, len(stock_dfs))
+    if workers <= 1 or rows < BATCH_PARALLEL_MIN_ROWS:
+        logger.info(f"Interpolating {len(stock_dfs)} stocks ({rows} rows) in a single batch")
+        return _process_batch(stock_dfs, output_dir)
+
+    logger.info(f"Interpolating {len(stock_dfs)} stocks ({rows} rows) in {workers} batches")
+    stocks = list(stock_dfs)
+    batches = [{stock: stock_dfs[stock] for stock in stocks[i::workers]} for i in range(workers)]
+    saved = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch_saved in executor.map(_process_batch, batches, [output_dir] * workers):
+            saved.update(batch_saved)
+    return saved
+
+def process_all_raw_files(incremental=True, batch=False, workers=None):
     """
     Process all CSV files in the raw data directory, applying the fill_missing_dates_interpolation function,
     and save processed files to the processed data directory. Only appends new data if needed.
+
+    With incremental set, only the gap between the last processed date and the new rows is interpolated,
+    otherwise the whole history is interpolated again.
+    With batch set, the stocks whose whole history is interpolated are interpolated together in one vectorised pass
+    (see process_batch for the workers).
+    The versions of the updated stocks' data are then published to invalidate the backend's cached payloads.
     """
     # Define paths relative to project root
     project_root = PROJECT_ROOT
@@ -73,11 +274,14 @@ def process_all_raw_files():
     logger.info(f"Found {len(raw_files)} CSV files to process")
     
     success_count = 0
+    batch_dfs = {}
+    data_versions = {}
     for file_name in raw_files:
         try:
             # Process each file
             input_path = input_dir / file_name
             output_path = output_dir / file_name
+            stock = file_name.replace('.csv', '')
             
             logger.info(f"Processing {file_name}...")
             
@@ -89,14 +293,13 @@ def process_all_raw_files():
                 raw_df = raw_df.drop(columns=['symbole'])
                 logger.debug(f"Dropped 'symbole' column from {file_name}")
             
-            # Convert date column to datetime for comparison
-            raw_df['date'] = pd.to_datetime(raw_df['date'], format='%d/%m/%Y', dayfirst=True)
-            
             # Check if processed file exists
-            if os.path.exists(output_path):
-                # Read existing processed file
-                processed_df = pd.read_csv(output_path, sep=';')
-                processed_df['date'] = pd.to_datetime(processed_df['date'], format='%Y-%m-%d', dayfirst=True)
+            if has_stock_data(stock, output_dir) or os.path.exists(output_path):
+                # Convert date column to datetime for comparison
+                raw_df['date'] = pd.to_datetime(raw_df['date'], format='%d/%m/%Y', dayfirst=True)
+
+                # Read existing processed data
+                processed_df = read_stock_data(stock, output_dir)
                 
                 # Get last dates from both files
                 last_processed_date = processed_df['date'].max()
@@ -113,29 +316,55 @@ def process_all_raw_files():
                 if not new_rows.empty:
                     logger.info(f"Found {len(new_rows)} new rows to append")
                     
-                    # Combine old processed data with new rows
-                    combined_df = pd.concat([processed_df, new_rows], ignore_index=True)
-                    
-                    # Apply interpolation on the combined dataframe
-                    processed_df = fill_missing_dates_interpolation(combined_df)
+                    if incremental:
+                        # Only interpolate the new tail and append it
+                        processed_df = append_new_rows_interpolation(processed_df, new_rows)
+                        full_df = None
+                    else:
+                        # Combine old processed data with new rows
+                        full_df = pd.concat([processed_df, new_rows], ignore_index=True)
                 else:
                     logger.info("No new rows found despite date difference, skipping update")
                     success_count += 1
                     continue
             else:
                 # No existing file, process entire raw file
-                processed_df = fill_missing_dates_interpolation(raw_df)
-            
-            # Save processed data
-            processed_df.to_csv(output_path, index=False, sep=';')
+                full_df = raw_df
+
+            if full_df is not None:
+                if batch:
+                    batch_dfs[stock] = full_df
+                    continue
+
+                # Apply interpolation on the whole history
+                processed_df = fill_missing_dates_interpolation(full_df)
+
+            # Save processed data to the Parquet dataset and the CSV export
+            data_versions[stock] = write_stock_data(processed_df, stock, output_dir)
             logger.info(f"Successfully processed and saved to {output_path}")
             success_count += 1
             
         except Exception as e:
             logger.error(f"Error processing {file_name}: {str(e)}")
+
+    if batch_dfs:
+        try:
+            saved = process_batch(batch_dfs, output_dir, workers)
+            success_count += len(saved)
+            data_versions.update(saved)
+        except Exception as e:
+            logger.error(f"Error processing the batch of {len(batch_dfs)} files: {str(e)}")
+
+    publish_stock_versions(DATA_VERSION, data_versions)
     
     logger.info(f"Processing complete! Successfully processed {success_count}/{len(raw_files)} files")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process the raw stock data.")
+    parser.add_argument("--full-rebuild", action="store_true", help="Interpolate the whole history again instead of only the new rows")
+    parser.add_argument("--batch", action="store_true", help="Interpolate the whole histories of all the stocks in one vectorised pass")
+    parser.add_argument("--workers", type=int, required=False, help="Number of processes of the batch mode (defaults to the PROCESS_WORKERS env variable or the number of cores)")
+    args = parser.parse_args()
+
     # Run the processing pipeline
-    process_all_raw_files()
\ No newline at end of file
+    process_all_raw_files(incremental=not args.full_rebuild, batch=args.batch, workers=args.workers)
\ No newline at end of file
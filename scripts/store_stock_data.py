@@ -5,6 +5,12 @@ from typing import List
 import subprocess
 from dotenv import load_dotenv
 import os
+import re
+import json
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from datetime import date
@@ -13,7 +19,8 @@ from dateutil.relativedelta import relativedelta
 import sys
 sys.path.insert(0, str(Path(os.getcwd()) / '..'))
 from utils import STOCK_DATA_URL
-from src import get_pinecone_vector_store
+from utils.data_utils import read_stock_data, has_stock_data
+from src import get_vector_store, LocalVectorStore, publish_document_sources
 
 
 
@@ -24,14 +31,39 @@ DATA_PATH = os.path.join(os.path.dirname(__file__), "../data/processed")
 DATA_PATH = os.path.abspath(DATA_PATH)
 
 
+def list_stock_ids(vector_store) -> List[str]:
+    """
+    List the ids of the stock documents in the vector store.
+    """
+    if isinstance(vector_store, LocalVectorStore):
+        return vector_store.list_ids(prefix="stock#")
+    # Pinecone lists the ids by pages
+    return [id for page in vector_store.index.list(prefix="stock#") for id in page]
+
+def get_stored_fingerprints(vector_store, ids: List[str]) -> dict:
+    """
+    Get the fingerprints of stored documents.
+
+    Returns:
+        fingerprints: dict of id to the fingerprint in its metadata, None for the documents stored without one.
+    """
+    if isinstance(vector_store, LocalVectorStore):
+        return {document.id: document.metadata.get("fingerprint") for document in vector_store.get_by_ids(ids)}
+    fingerprints = {}
+    for i in range(0, len(ids), 100):
+        response = vector_store.index.fetch(ids=ids[i:i + 100])
+        for id, vector in response.vectors.items():
+            fingerprints[id] = (vector.metadata or {}).get("fingerprint")
+    return fingerprints
+
 def delete_old_stock_data():
     """
-    Delete old stock data files from Pinecone vectorstore.
+    Delete old stock data files from the vector store.
     """
-    vector_store = get_pinecone_vector_store(index_name)
-    ids = vector_store.index.list(prefix="stock#")
+    vector_store = get_vector_store(index_name)
+    ids = list_stock_ids(vector_store)
     try:
-        vector_store.delete(ids=list(ids))
+        vector_store.delete(ids=ids)
         # Delete old stock data files from the local directory  
         print("Old stock data deleted successfully.")
     except Exception as e:
@@ -46,13 +78,15 @@ def fetch_stock_data():
     """
     df_list = []
     for dvc_file in os.listdir(DATA_PATH):
-        if dvc_file.endswith(".dvc"):
+        if dvc_file.endswith(".csv.dvc"):
             try:
+                stock_name=dvc_file.split('.')[0]
                 csv_file = os.path.join(DATA_PATH, dvc_file.replace(".dvc", ""))
-                if not os.path.exists(csv_file):
+                if not has_stock_data(stock_name, DATA_PATH) and not os.path.exists(csv_file):
                     subprocess.run(["dvc", "pull", os.path.join(DATA_PATH, dvc_file)], check=True, capture_output=True, text=True)
-                df = pd.read_csv(csv_file, sep=";")
-                stock_name=dvc_file.split('.')[0]
+                df = read_stock_data(stock_name, DATA_PATH, columns=["date", "ouverture", "cloture", "volume"])
+                # the documents show the dates the way they are written in the CSV export
+                df['date'] = df['date'].dt.strftime('%Y-%m-%d')
                 df['stock'] = stock_name
                 df_list.append(df)
             except subprocess.CalledProcessError as e:
@@ -72,7 +106,9 @@ def preprocess_stock_data(df_list:List [pd.DataFrame]) -> List[pd.DataFrame]:
     Returns:
         filtered_dfs: List of filtered dataframes.        
     """
-    two_years_ago = date.today() - relativedelta(years=2)
+    # the window starts on the first day of a month so that the first document of a stock stays the same for a month,
+    # its embedding is then found in the embedding cache by the next runs
+    two_years_ago = (date.today() - relativedelta(years=2)).replace(day=1)
     formatted_date = two_years_ago.strftime("%Y-%m-%d")
     filtered_dfs = []
     for df in df_list:
@@ -83,6 +119,26 @@ def preprocess_stock_data(df_list:List [pd.DataFrame]) -> List[pd.DataFrame]:
         filtered_dfs.append(filtered_df)
 
     return filtered_dfs
+
+def get_document_fingerprint(text: str, metadata: dict) -> str:
+    """
+    Hash the content and metadata of a document, it changes whenever what would be stored does.
+    """
+    content = text + json.dumps(metadata, sort_keys=True)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+def get_stock_texts(df: pd.DataFrame) -> List[str]:
+    """
+    Build the sentence of each day of a stock column by column instead of row by row.
+    """
+    # object arrays concatenate faster than pandas' string columns
+    column = lambda name, format=str: np.array([format(value) for value in df[name].tolist()], dtype=object)
+    texts = ("Stock " + column('stock') + " on date " + column('date')
+             + ", opening price " + column('ouverture', "{:.2f}".format)
+             + ", closing price " + column('cloture', "{:.2f}".format)
+             + ", volume " + column('volume', "{:,.2f}".format) + ".")
+    return texts.tolist()
+
 def process_stock_data(df_list:List [pd.DataFrame]) -> List[str]:
     """
     Transform stock data for knowledge base storage .
@@ -91,7 +147,8 @@ def process_stock_data(df_list:List [pd.DataFrame]) -> List[str]:
         df_list (List[pd.DataFrame]): list of dataframes  to process.
     
     Returns:
-        stock_data: List of Documents.
+        stock_data: List of Documents, with the fingerprint of their content in their metadata.
+        ids: List of their ids, stock#{stock}#{chunk}.
     """
     text_splitter = RecursiveCharacterTextSplitter(
             separators=[". "],
@@ -101,61 +158,96 @@ def process_stock_data(df_list:List [pd.DataFrame]) -> List[str]:
     documents = []
     ids =[]
     for df in df_list:
-        stock_data = []
         stock = df['stock'].iloc[0]
-        df = df.copy()    
-        df['text']= df.apply(lambda row: f"Stock {row['stock']} on date {row['date']}, opening price {row['ouverture']:.2f}, closing price {row['cloture']:.2f}, volume {row['volume']:,.2f}.", axis=1)
-        stock_data += df['text'].tolist()
-        stock_data = " ".join(stock_data)
+        stock_data = " ".join(get_stock_texts(df))
         if len(stock_data) > 40000: # pinecone limit is 40KB metadata size per document 
-            stock_data = text_splitter.split_text(stock_data)
-            document1 = Document(page_content=stock_data[0], metadata={"title":stock ,"date":df['date'].iloc[-1], "link": STOCK_DATA_URL,"source": "stocks"})
-            document2 = Document(page_content=stock_data[1], metadata={"title":stock ,"date":df['date'].iloc[-1], "link": STOCK_DATA_URL,"source": "stocks"})
-            id1 = "stock#"+stock+"#1"
-            id2 = "stock#"+stock+"#2"
-            documents.extend([document1, document2])
-            ids.extend([id1, id2])
+            chunks = text_splitter.split_text(stock_data)
         else:
-            document = Document(page_content=stock_data, metadata={"title":stock ,"date":df['date'].iloc[-1], "link": STOCK_DATA_URL,"source": "stocks"})
-            id = "stock#"+stock+"#1"
-            documents.append(document)
-            ids.append(id)
+            chunks = [stock_data]
+        for i, chunk in enumerate(chunks):
+            # the date of a chunk's last day, so that only the last chunk changes with a new day
+            dates = re.findall(r"on date (\S+),", chunk)
+            metadata = {"title":stock ,"date":dates[-1] if dates else df['date'].iloc[-1], "link": STOCK_DATA_URL,"source": "stocks"}
+            metadata["fingerprint"] = get_document_fingerprint(chunk, metadata)
+            documents.append(Document(page_content=chunk, metadata=metadata))
+            ids.append(f"stock#{stock}#{i + 1}")
         
     return documents, ids
 
 
 
-def store_stock_data(docs,ids, batch_size=559):
+def store_stock_data(docs,ids, batch_size=100, max_workers=4):
     """
-    Store stock data in Pinecone VectorStore.
+    Store stock data in the vector store (Pinecone or the local one, see get_vector_store), replacing the documents
+    with the same ids.
     
     Args:
-        stock_data_dir (str): Directory containing stock data CSV files.
-        
+        docs (List[Document]): Documents to store.
+        ids (List[str]): Their ids.
+        batch_size (int): Number of documents embedded and upserted together.
+        max_workers (int): Maximum number of batches upserted concurrently.
+
+    Returns:
+        tuple: Number of documents stored and number of documents whose batch failed.
     """
-    vector_store = get_pinecone_vector_store(index_name)
-    n_docs = len(docs)
-    for i in range(0, n_docs, batch_size):
-        if i + batch_size > i + n_docs: 
-            batch = docs[i:i + n_docs]
-            ids = ids[i:i + n_docs]
-        else:
-            batch = docs[i:i + batch_size]
-            ids = ids[i:i + batch_size]
+    vector_store = get_vector_store(index_name)
+
+    def store_batch(start):
+        batch = docs[start:start + batch_size]
         try:
-            vector_store.add_documents(batch, ids=ids)
+            vector_store.add_documents(batch, ids=ids[start:start + batch_size])
+            return len(batch), 0
         except Exception as e:
-            print(f"Error adding documents: {e}")  
+            print(f"Error adding documents: {e}")
+            return 0, len(batch)
 
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(store_batch, range(0, len(docs), batch_size)))
+    return sum(stored for stored, _ in results), sum(failed for _, failed in results)
 
+def sync_stock_data(docs, ids, batch_size=100, max_workers=4):
+    """
+    Incrementally sync stock data with the vector store: only the documents whose fingerprint changed are upserted, and
+    only the stored stock documents that are no longer built (e.g. a delisted stock) are deleted.
 
-def main():
-    delete_old_stock_data()
+    Returns:
+        tuple: Number of documents upserted, deleted and whose upsert failed.
+    """
+    vector_store = get_vector_store(index_name)
+    stored_ids = set(list_stock_ids(vector_store))
+    fingerprints = get_stored_fingerprints(vector_store, [id for id in ids if id in stored_ids])
+    changed = [i for i, id in enumerate(ids) if fingerprints.get(id) != docs[i].metadata["fingerprint"]]
+    orphans = sorted(stored_ids - set(ids))
+    if orphans:
+        vector_store.delete(ids=orphans)
+    upserted, failed = store_stock_data([docs[i] for i in changed], [ids[i] for i in changed], batch_size, max_workers)
+    return upserted, len(orphans), failed
+
+
+def main(full=False) -> int:
+    """stores the stock documents and returns the number of documents that failed to be stored"""
     df_list = fetch_stock_data()
     filtered_dfs = preprocess_stock_data(df_list)
     docs,ids = process_stock_data(filtered_dfs)
-    store_stock_data(docs,ids)
-    
+    if full:
+        delete_old_stock_data()
+        stored, failed = store_stock_data(docs,ids)
+        print(f"Stored {stored} stock documents, {failed} failed.")
+        updated = True
+    else:
+        upserted, deleted, failed = sync_stock_data(docs, ids)
+        print(f"Upserted {upserted} and deleted {deleted} stock documents, {failed} failed and {len(docs) - upserted - failed} were unchanged.")
+        updated = upserted + deleted > 0
+    if updated:
+        # the backend drops the RAG answers generated from the old stock documents
+        publish_document_sources(["stocks"])
+    return failed
+
 
 if __name__ == "__main__":
-    main()    
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Store the stock data documents in the vector store.")
+    parser.add_argument("--full", action="store_true", help="Delete all the stock documents and store them again instead of only the changed ones")
+    args = parser.parse_args()
+    # a partial sync fails the run, the failed documents are upserted again by the next one
+    if main(args.full) > 0:
+        sys.exit(1)    
\ No newline at end of file
@@ -3,13 +3,19 @@ import subprocess
 import pandas as pd
 from dotenv import load_dotenv
 import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(os.getcwd()) / '..'))
 from src.handlers.model_handler import get_or_create_model, save_model
 from src.handlers.scaler_handler import get_or_create_scaler, save_scaler
-from utils.train_test_utils import train_model, evaluate
+from src.handlers.forecast_handler import save_forecast
+from src.web.back.services.CacheVersions import publish_stock_versions, MODEL_VERSION
+from utils.train_test_utils import train_model, evaluate, forecast
+from utils.data_utils import read_stock_data, has_stock_data
 from enums import ValidationMetricEnum
 from utils import send_email
 
@@ -20,7 +26,131 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def train():
+THREAD_ENV_VARIABLES = ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS", "TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS"]
+
+def _init_worker(threads_per_worker: int):
+    """
+    Pins the number of threads used by a training worker so that the workers don't oversubscribe the cores. Only the
+    worker's environment is changed: the libraries it loads later read the env variables (values set explicitly are
+    kept), the BLAS/OpenMP pools numpy already started (the worker imported this module first) are resized with
+    threadpoolctl and torch needs to be told explicitly.
+    """
+    explicit = [env_variable for env_variable in THREAD_ENV_VARIABLES if env_variable in os.environ]
+    for env_variable in THREAD_ENV_VARIABLES:
+        os.environ.setdefault(env_variable, str(threads_per_worker))
+    if not explicit:
+        try:
+            from threadpoolctl import threadpool_limits
+            threadpool_limits(threads_per_worker)
+        except ImportError:
+            pass
+    try:
+        import torch
+        torch.set_num_threads(threads_per_worker)
+    except ImportError:
+        pass
+
+def _send_evaluation_alert(full_model_name: str, evaluation: float, last_trained_date, threshold: float):
+    logger.warning(
+        f"Model '{full_model_name}' (last trained on {last_trained_date}) exceeded the evaluation threshold for {ValidationMetricEnum.MAPE.name}: "
+        f"threshold={threshold}, result={evaluation}"
+    )
+    # Send email notification
+    recipient_email = os.environ.get("EMAIL_RECIPIENT")
+    if recipient_email:
+        subject = f"Model Evaluation Alert: {full_model_name} Exceeded Threshold"
+        body = (
+            f"Model Evaluation Alert:\n\n"
+            f"Model Name: {full_model_name}\n"
+            f"Evaluation Metric: {ValidationMetricEnum.MAPE.name}\n"
+            f"Threshold Value: {threshold}\n"
+            f"Actual Result: {evaluation}\n"
+            f"Last Trained Date: {last_trained_date}\n\n"
+            f"Please review the model's performance."
+        )
+        send_email(recipient_email, subject, body)
+        logger.info(f"Sent evaluation alert email to {recipient_email} for model {full_model_name}")
+    else:
+        logger.warning("EMAIL_RECIPIENT not set. Skipping alert email.")
+
+def materialize_forecast(stock: str, model, scaler, df: pd.DataFrame, window_size: int, model_location: str, last_trained_date):
+    """
+    Computes the forward forecast of a freshly trained model and writes it to the forecast store so the backend doesn't have to run the model.
+    This is best effort: if it fails the backend falls back to live inference.
+    """
+    try:
+        cloture_col = df["cloture"].values.reshape(-1,1)
+        predicted_data = forecast([model], [cloture_col], [scaler], window_size, window_size)[0]
+        save_forecast(predicted_data, model_location, stock, last_trained_date)
+        logger.info(f"Materialised the {window_size} days forecast of {stock}")
+    except Exception as e:
+        logger.warning(f"Couldn't materialise the forecast of {stock}, the backend will fall back to live inference: {e}")
+
+def train_stock(stock: str, data_dir: str, window_size: int, model_name: str, model_location: str) -> dict | None:
+    """
+    Evaluates, trains and saves the model of a single stock.
+
+    Returns:
+        dict: the stock, the model's old and new last trained dates and its evaluation (None if it was never trained before),
+        or None if there was nothing to train.
+    """
+    logger.info(f"training model: {model_name} for stock: {stock}")
+    if not has_stock_data(stock, data_dir):
+        dvc_file = os.path.join(data_dir, f"{stock}.csv.dvc")
+        csv_file = dvc_file.replace(".dvc", "")
+        if not os.path.exists(csv_file):
+            logger.info("pulling csv files")
+            subprocess.run(["dvc", "pull", dvc_file], check=True, capture_output=True, text=True)
+        if not os.path.exists(csv_file):
+            logger.warning(f"{stock}.csv not found")
+            return None
+    # the models are only trained on the cloture column
+    df = read_stock_data(stock, data_dir, columns=["date", "cloture"])
+    model = get_or_create_model(stock, model_name, model_location)
+    scaler = get_or_create_scaler(stock, model_location)
+    last_trained_date = model.get_last_trained_date()
+    logger.info(f"model's old last trained date: {last_trained_date if last_trained_date else 'Never trained before'}")
+    if last_trained_date:
+        num_train_rows = len(df[df['date'] > last_trained_date])
+    else:
+        num_train_rows = len(df["date"]) - window_size
+    if num_train_rows == 0:
+        logger.warning("No new rows to train ...")
+        return None
+    logger.info(f"Found {num_train_rows} rows to train the model with")
+    new_last_trained_date = max(df["date"])
+    logger.info(f"model's new last trained date: {new_last_trained_date}")
+    full_model_name = f"{stock}"
+    evaluation = None
+    if last_trained_date:
+        train_df = df.tail(window_size + num_train_rows).copy()
+        # if the model is already pre-trained on old data we evaluate the model predictions of the days post last trained date
+        # based on the newly added data
+        logger.info(f"evaluating {full_model_name} model on dates from {train_df.iloc[-num_train_rows]['date']} to {train_df.iloc[-1]['date']} using MAPE")
+        train_df = train_df["cloture"].values.reshape(-1,1)
+        model_evaluation = evaluate({full_model_name: (model, [], train_df)}, ValidationMetricEnum.MAPE, {full_model_name: scaler})
+        evaluation = model_evaluation[full_model_name]
+    else:
+        train_df = df.copy()
+        train_df = train_df["cloture"].values.reshape(-1,1)
+    scaler = train_model(model, full_model_name, train_df, scaler, window_size, new_last_trained_date)
+    logger.info(f"Training {stock} model done, saving model and scaler")
+    save_model(model, model_location, stock)
+    save_scaler(scaler, model_location, stock)
+    materialize_forecast(stock, model, scaler, df, window_size, model_location, new_last_trained_date)
+    return {"stock": full_model_name, "last_trained_date": last_trained_date, "new_last_trained_date": new_last_trained_date, "evaluation": evaluation}
+
+def train(workers: int = None):
+    """
+    Trains the models of all the stocks.
+
+    Args:
+        workers (int): number of training processes, read from the TRAIN_WORKERS env variable if not given.
+            With a single worker the stocks are trained one after another in the current process.
+
+    Returns:
+        dict: the evaluation of every model that was already trained before this run.
+    """
     DATA_DIR = os.path.join(os.path.dirname(__file__), "../data/processed")
     DATA_DIR = os.path.abspath(DATA_DIR)
 
@@ -30,83 +160,62 @@ def train():
     MODEL_NAME = os.environ.get("MODEL_NAME")
     MODEL_LOCATION = os.environ.get("MODEL_LOCATION")
     MODEL_EVAL_THRESHHOLD = float(os.environ.get("MODEL_EVAL_THRESHHOLD"))
+    if workers is None:
+        workers = int(os.environ.get("TRAIN_WORKERS")) if os.environ.get("TRAIN_WORKERS") != None else 1
 
     stocks_list = [f.replace(".csv.dvc", "") for f in os.listdir(DATA_DIR) if f.endswith(".csv.dvc")]
     all_models_evaluation = {}
+    model_versions = {}
+    failed_stocks = []
     logger.info(f"found {len(stocks_list)} stocks")
-    for stock in stocks_list:
-        logger.info(f"training model: {MODEL_NAME} for stock: {stock}")
-        dvc_file = os.path.join(DATA_DIR, f"{stock}.csv.dvc")
-        csv_file = dvc_file.replace(".dvc", "")
-        if not os.path.exists(csv_file):
-            logger.info("pulling csv files")
-            subprocess.run(["dvc", "pull", dvc_file], check=True, capture_output=True, text=True)
-        if not os.path.exists(csv_file):
-            logger.warning(f"{stock}.csv not found")
-            continue
-        df = pd.read_csv(csv_file, sep=";")
-        model = get_or_create_model(stock, MODEL_NAME, MODEL_LOCATION)
-        scaler = get_or_create_scaler(stock, MODEL_LOCATION)
-        last_trained_date = model.get_last_trained_date()
-        logger.info(f"model's old last trained date: {last_trained_date if last_trained_date else 'Never trained before'}")
-        df["date"] = pd.to_datetime(df["date"])
-        if last_trained_date:
-            num_train_rows = len(df[df['date'] > last_trained_date])
-        else:
-            num_train_rows = len(df["date"]) - WINDOW_SIZE
-        if num_train_rows == 0:
-            logger.warning("No new rows to train ...")
-            continue
-        logger.info(f"Found {num_train_rows} rows to train the model with")
-        new_last_trained_date = max(df["date"])
-        logger.info(f"model's new last trained date: {new_last_trained_date}")
-        full_model_name = f"{stock}"
-        if last_trained_date:
-            train_df = df.tail(WINDOW_SIZE + num_train_rows).copy()
-            # if the model is already pre-trained on old data we evaluate the model predictions of the days post last trained date
-            # based on the newly added data
-            logger.info(f"evaluating {full_model_name} model on dates from {train_df.iloc[-num_train_rows]['date']} to {train_df.iloc[-1]['date']} using MAPE")
-            train_df = train_df["cloture"].values.reshape(-1,1)
-            model_evaluation = evaluate({full_model_name: (model, [], train_df)}, ValidationMetricEnum.MAPE, {full_model_name: scaler})
-            if (model_evaluation[full_model_name] >= MODEL_EVAL_THRESHHOLD):
-                logger.warning(
-                    f"Model '{full_model_name}' (last trained on {last_trained_date}) exceeded the evaluation threshold for {ValidationMetricEnum.MAPE.name}: "
-                    f"threshold={MODEL_EVAL_THRESHHOLD}, result={model_evaluation[full_model_name]}"
-                )
-                # Send email notification
-                recipient_email = os.environ.get("EMAIL_RECIPIENT")
-                if recipient_email:
-                    subject = f"Model Evaluation Alert: {full_model_name} Exceeded Threshold"
-                    body = (
-                        f"Model Evaluation Alert:\n\n"
-                        f"Model Name: {full_model_name}\n"
-                        f"Evaluation Metric: {ValidationMetricEnum.MAPE.name}\n"
-                        f"Threshold Value: {MODEL_EVAL_THRESHHOLD}\n"
-                        f"Actual Result: {model_evaluation[full_model_name]}\n"
-                        f"Last Trained Date: {last_trained_date}\n\n"
-                        f"Please review the model's performance."
-                    )
-                    send_email(recipient_email, subject, body)
-                    logger.info(f"Sent evaluation alert email to {recipient_email} for model {full_model_name}")
-                else:
-                    logger.warning("EMAIL_RECIPIENT not set. Skipping alert email.")
-            else:
-                logger.info(
-                    f"Model '{full_model_name}' (last trained on {last_trained_date}) passed evaluation for {ValidationMetricEnum.MAPE.name}: "
-                    f"result={model_evaluation[full_model_name]}"
-                )
-            all_models_evaluation.update(model_evaluation)
+
+    def collect(result: dict | None):
+        if result is None:
+            return
+        model_versions[result["stock"]] = result["new_last_trained_date"]
+        if result["evaluation"] is None:
+            return
+        full_model_name = result["stock"]
+        if (result["evaluation"] >= MODEL_EVAL_THRESHHOLD):
+            _send_evaluation_alert(full_model_name, result["evaluation"], result["last_trained_date"], MODEL_EVAL_THRESHHOLD)
         else:
-            train_df = df.copy()
-            train_df = train_df["cloture"].values.reshape(-1,1)
-        scaler = train_model(model, full_model_name, train_df, scaler, WINDOW_SIZE, new_last_trained_date)
-        logger.info(f"Training {stock} model done, saving model and scaler")
-        save_model(model, MODEL_LOCATION, stock)
-        save_scaler(scaler, MODEL_LOCATION, stock)
-    
+            logger.info(
+                f"Model '{full_model_name}' (last trained on {result['last_trained_date']}) passed evaluation for {ValidationMetricEnum.MAPE.name}: "
+                f"result={result['evaluation']}"
+            )
+        all_models_evaluation[full_model_name] = result["evaluation"]
+
+    if workers <= 1:
+        for stock in stocks_list:
+            try:
+                collect(train_stock(stock, DATA_DIR, WINDOW_SIZE, MODEL_NAME, MODEL_LOCATION))
+            except Exception as e:
+                logger.error(f"Training {stock} model failed: {e}")
+                failed_stocks.append(stock)
+    else:
+        threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+        logger.info(f"training with {workers} workers, {threads_per_worker} threads each")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker, initargs=(threads_per_worker,)) as executor:
+            futures = {executor.submit(train_stock, stock, DATA_DIR, WINDOW_SIZE, MODEL_NAME, MODEL_LOCATION): stock for stock in stocks_list}
+            for future in as_completed(futures):
+                stock = futures[future]
+                try:
+                    collect(future.result())
+                except Exception as e:
+                    logger.error(f"Training {stock} model failed: {e}")
+                    failed_stocks.append(stock)
+
+    if failed_stocks:
+        logger.error(f"Training failed for {len(failed_stocks)} stocks: {', '.join(failed_stocks)}")
+    # the backend computes the payloads of the retrained models again instead of serving the cached ones
+    publish_stock_versions(MODEL_VERSION, model_versions)
     # TODO: Maybe send the evaluation results for all models to some sort of a dashboard that shows a graph of the models perfomance after each run of the script, idk
     logger.info("Training script completed successfully")
+    return all_models_evaluation
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Training automation for the stock models.")
+    parser.add_argument("--workers", type=int, required=False, help="Number of training processes (defaults to the TRAIN_WORKERS env variable or 1)")
+    args = parser.parse_args()
     # Run the processing pipeline
-    train()
\ No newline at end of file
+    train(args.workers)
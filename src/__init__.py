@@ -1,5 +1,9 @@
-from .web import CacheService
-from .prediction_model import IModel, ARIMAModel, LSTMModel, GRUModel
-from .rag import get_pinecone_vector_store
-from .factories import create_model
-from .handlers import get_or_create_scaler, get_or_create_model, save_scaler, save_model, get_model, get_scaler
\ No newline at end of file
+from .lazy_imports import lazy_exports
+
+lazy_exports(__name__, {
+    ".web": ["CacheService", "AsyncCacheService", "SingleFlight", "LocalCache", "CacheCodec", "JsonCodec", "GzipJsonCodec", "ArrowCodec", "get_cache_codec", "get_stock_version_keys", "publish_stock_versions", "publish_document_sources", "MODEL_VERSION", "DATA_VERSION", "DOCUMENTS_VERSION"],
+    ".prediction_model": ["IModel", "ARIMAModel", "LSTMModel", "GRUModel"],
+    ".rag": ["get_pinecone_vector_store", "get_vector_store", "LocalVectorStore"],
+    ".factories": ["create_model"],
+    ".handlers": ["get_or_create_scaler", "get_or_create_model", "save_scaler", "save_model", "get_model", "get_scaler", "get_forecast", "save_forecast", "ModelRegistry", "get_local_artifacts_version"],
+})
@@ -1,4 +1,6 @@
-from src.prediction_model.models import IModel, ARIMAModel, LSTMModel, GRUModel
+# the models are imported when created, only the one used is (Keras isn't imported for ARIMA, statsmodels for the others)
+from src.prediction_model import models
+from src.prediction_model.models import IModel
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,10 +10,10 @@ def create_model(stock: str, model_name: str) -> IModel:
         raise KeyError("The model name is not specified in the environment file!")
     match model_name:
         case "ARIMA":
-            return ARIMAModel(stock)
+            return models.ARIMAModel(stock)
         case "GRU":
-            return GRUModel(stock)
+            return models.GRUModel(stock)
         case "LSTM":
-            return LSTMModel(stock)
+            return models.LSTMModel(stock)
         case _:
             return NotImplementedError("The given model name is not implemented yet, please choose another one!")
\ No newline at end of file
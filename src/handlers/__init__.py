@@ -1,2 +1,8 @@
-from .model_handler import get_or_create_model, save_model, get_model
-from .scaler_handler import get_or_create_scaler, save_scaler, get_scaler
\ No newline at end of file
+from src.lazy_imports import lazy_exports
+
+lazy_exports(__name__, {
+    ".model_handler": ["get_or_create_model", "save_model", "get_model"],
+    ".scaler_handler": ["get_or_create_scaler", "save_scaler", "get_scaler"],
+    ".forecast_handler": ["get_forecast", "save_forecast"],
+    ".model_registry": ["ModelRegistry", "get_local_artifacts_version"],
+})
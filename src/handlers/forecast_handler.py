@@ -0,0 +1,157 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from azure.ai.ml import MLClient
+
+FILE_PATH = Path(os.path.dirname(__file__))
+FORECAST_LOCAL_PATH = FILE_PATH / ".." / ".." / "pkl" / "forecasts"
+
+# A forecast entry is a small .npz file per stock holding the forecast values and the last trained date of the model that produced them,
+# so a lookup is a single file read and an entry is stale as soon as the data moves past that date.
+# With models stored on Azure the same local store is used: an entry is downloaded once per registered version of the
+# forecast asset, so a lookup only reaches Azure when the local entry is stale.
+AZURE_RECHECK_SECONDS = 300
+# stock -> (last trained date, time) of the last Azure lookup that found no newer forecast
+_azureMisses = {}
+
+def _get_ml_client() -> "MLClient":
+    from azure.ai.ml import MLClient
+    from azure.identity import DefaultAzureCredential
+    return MLClient(
+        credential=DefaultAzureCredential(),
+        subscription_id=os.environ["AZURE_SUBSCRIPTION_ID"],
+        resource_group_name=os.environ["AZURE_RESOURCE_GROUP"],
+        workspace_name=os.environ["AZURE_ML_WORKSPACE"]
+    )
+
+def _write_forecast(forecast_path: str, forecast: np.ndarray, last_trained_date: datetime, version: str = ""):
+    # written next to the target then renamed so that a reader never sees a half written entry
+    tmp_path = f"{forecast_path}.tmp.npz"
+    np.savez(tmp_path, forecast=np.asarray(forecast, dtype=np.float64), last_trained_date=np.datetime64(pd.Timestamp(last_trained_date), "s"),
+             version=np.str_(version))
+    os.replace(tmp_path, forecast_path)
+
+def _read_version(forecast_path: str) -> str | None:
+    """returns the version of the Azure forecast asset a local entry was downloaded from, None if there is no entry"""
+    if not os.path.isfile(forecast_path):
+        return None
+    with np.load(forecast_path) as entry:
+        return str(entry["version"]) if "version" in entry.files else ""
+
+def _read_forecast(forecast_path: str, last_trained_date: datetime, num_days: int) -> np.ndarray | None:
+    with np.load(forecast_path) as entry:
+        if entry["last_trained_date"] != np.datetime64(pd.Timestamp(last_trained_date), "s"):
+            return None
+        forecast = entry["forecast"]
+    if len(forecast) < num_days:
+        return None
+    return forecast[:num_days]
+
+def get_forecast(stock: str, last_trained_date: datetime, num_days: int, model_location: str) -> np.ndarray | None:
+    """
+    Returns the materialised forecast of a stock, or None if it is missing or stale.
+
+    Args:
+        stock: the stock's symbol.
+        last_trained_date: the date of the most recent row of the stock's data, entries produced by a model trained up to another date are stale.
+        num_days: the number of forecasted days needed, entries with a shorter horizon are stale.
+        model_location: 'LOCAL' or 'AZURE'.
+    """
+    if model_location == "LOCAL":
+        forecast_path = FORECAST_LOCAL_PATH / f"{stock}.npz"
+        if not forecast_path.is_file():
+            return None
+        return _read_forecast(forecast_path, last_trained_date, num_days)
+
+    elif model_location == "AZURE":
+        forecast_path = FORECAST_LOCAL_PATH / f"{stock}.npz"
+        if forecast_path.is_file():
+            forecast = _read_forecast(forecast_path, last_trained_date, num_days)
+            if forecast is not None:
+                return forecast
+        # the local entry is missing or stale, Azure is only asked again for the same data after AZURE_RECHECK_SECONDS
+        miss = _azureMisses.get(stock)
+        if miss != None and miss[0] == pd.Timestamp(last_trained_date) and time.time() - miss[1] < AZURE_RECHECK_SECONDS:
+            return None
+        _azureMisses[stock] = (pd.Timestamp(last_trained_date), time.time())
+        if not _download_forecast(stock, forecast_path):
+            return None
+        forecast = _read_forecast(forecast_path, last_trained_date, num_days)
+        if forecast is not None:
+            _azureMisses.pop(stock, None)
+        return forecast
+
+    else:
+        raise NotImplementedError("MODEL_LOCATION must be 'LOCAL' or 'AZURE'.")
+
+def _download_forecast(stock: str, forecast_path: Path) -> bool:
+    """
+    downloads the latest version of a stock's forecast asset into the local store unless it's the version already
+    there, returns whether a new entry was stored
+    """
+    ml_client = _get_ml_client()
+    try:
+        # unlike the model and scaler a forecast is replaced on every training run, so we always want the latest version
+        forecast_asset = ml_client.models.get(name=f"{stock}-forecast", label="latest")
+        if _read_version(forecast_path) == str(forecast_asset.version):
+            return False
+
+        download_dir = os.path.join("outputs", stock, "forecast")
+        os.makedirs(download_dir, exist_ok=True)
+
+        ml_client.models.download(
+            name=f"{stock}-forecast",
+            version=forecast_asset.version,
+            download_path=download_dir
+        )
+
+        for dirpath, dirnames, filenames in os.walk(download_dir):
+            for fn in filenames:
+                if fn.lower() == "forecast.npz":
+                    with np.load(os.path.join(dirpath, fn)) as entry:
+                        os.makedirs(FORECAST_LOCAL_PATH, exist_ok=True)
+                        _write_forecast(forecast_path, entry["forecast"], entry["last_trained_date"][()], str(forecast_asset.version))
+                    return True
+
+        print(f"No forecast.npz found under {download_dir} (or its subfolders)")
+        return False
+
+    except Exception as e:
+        print(f"Error loading forecast from Azure: {e}")
+        return False
+
+def save_forecast(forecast: np.ndarray, model_location: str, stock: str, last_trained_date: datetime):
+    if model_location == "LOCAL":
+        os.makedirs(FORECAST_LOCAL_PATH, exist_ok=True)
+        _write_forecast(FORECAST_LOCAL_PATH / f"{stock}.npz", forecast, last_trained_date)
+
+    elif model_location == "AZURE":
+        # kept out of outputs/{stock} which is registered as the model bundle
+        outputs_dir = os.path.join("outputs", "forecasts", stock)
+        os.makedirs(outputs_dir, exist_ok=True)
+
+        # Save forecast under outputs/forecasts/{stock}/forecast.npz
+        _write_forecast(os.path.join(outputs_dir, "forecast.npz"), forecast, last_trained_date)
+
+        ml_client = _get_ml_client()
+        from azure.ai.ml.entities import Model as ForecastModel
+        from azure.ai.ml.constants import AssetTypes
+        forecast_asset = ForecastModel(
+            path=outputs_dir,
+            name=f"{stock}-forecast",
+            type=AssetTypes.CUSTOM_MODEL,
+            description=f"Materialised forecast for {stock}"
+        )
+        registered = ml_client.models.create_or_update(forecast_asset)
+        print(f"Registered forecast '{registered.name}' (version {registered.version})")
+        # a backend sharing this store serves it without downloading it
+        os.makedirs(FORECAST_LOCAL_PATH, exist_ok=True)
+        _write_forecast(FORECAST_LOCAL_PATH / f"{stock}.npz", forecast, last_trained_date, str(registered.version))
+    else:
+        raise NotImplementedError("MODEL_LOCATION must be 'LOCAL' or 'AZURE'.")
@@ -1,18 +1,21 @@
 import os
 import joblib
-from azure.ai.ml import MLClient
-from azure.identity import DefaultAzureCredential
-from azure.ai.ml.entities import Model
-from azure.ai.ml.constants import AssetTypes
 from src.prediction_model.models import IModel
 from src.factories.model_factory import create_model
 from pathlib import Path
 import pickle
+from typing import TYPE_CHECKING
+
+# the Azure ML SDK takes seconds to import, it's only imported when the artifacts are in Azure
+if TYPE_CHECKING:
+    from azure.ai.ml import MLClient
 
 FILE_PATH = Path(os.path.dirname(__file__))
 MODEL_LOCAL_PATH = FILE_PATH / ".." / ".." / "pkl" / "models"
 
-def _get_ml_client() -> MLClient:
+def _get_ml_client() -> "MLClient":
+    from azure.ai.ml import MLClient
+    from azure.identity import DefaultAzureCredential
     return MLClient(
         credential=DefaultAzureCredential(),
         subscription_id=os.environ["AZURE_SUBSCRIPTION_ID"],
@@ -100,6 +103,8 @@ def save_model(model: IModel, model_location: str, stock: str):
         joblib.dump(model, model_file)
 
         ml_client = _get_ml_client()
+        from azure.ai.ml.entities import Model
+        from azure.ai.ml.constants import AssetTypes
         model_asset = Model(
             path=outputs_dir,
             name=f"{stock}-model",
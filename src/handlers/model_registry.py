@@ -0,0 +1,200 @@
+import os
+import json
+import sys
+import threading
+from collections import OrderedDict, Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+from src.handlers.model_handler import MODEL_LOCAL_PATH
+from src.handlers.scaler_handler import SCALER_LOCAL_PATH
+from src.metrics import record_cache_lookup
+
+FILE_PATH = Path(os.path.dirname(__file__))
+REQUEST_COUNTS_PATH = FILE_PATH / ".." / ".." / "pkl" / "model_registry_requests.json"
+
+
+def get_local_artifacts_version(stock: str) -> tuple:
+    """returns the modification times of a stock's model and scaler files, they change whenever the training script saves new ones"""
+    versions = []
+    for path in [MODEL_LOCAL_PATH / f"{stock}.pkl", SCALER_LOCAL_PATH / f"{stock}.pkl"]:
+        try:
+            versions.append(os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            versions.append(None)
+    return tuple(versions)
+
+
+def _estimate_size(obj) -> int:
+    """
+    estimates the memory used by a deserialised object from the arrays it holds (its weights, the scaler's statistics,
+    the ARIMA's series), they're only measured, not copied or serialised
+    """
+    return _get_nbytes(obj, 0, set()) or sys.getsizeof(obj)
+
+def _get_nbytes(obj, depth: int, seen: set) -> int:
+    if id(obj) in seen or depth > 5:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if hasattr(obj, "get_weights") and isinstance(getattr(obj, "weights", None), list):
+        # a Keras model, its variables live in the backend's tensors
+        return sum(int(np.prod(weight.shape)) * np.dtype(weight.dtype).itemsize for weight in obj.weights)
+    if isinstance(obj, dict):
+        children = obj.values()
+    elif isinstance(obj, (list, tuple)):
+        children = obj
+    elif hasattr(obj, "__dict__"):
+        children = vars(obj).values()
+    else:
+        return 0
+    return sum(_get_nbytes(child, depth + 1, seen) for child in children)
+
+
+class _Entry:
+    def __init__(self, model, scaler, version: tuple | None, size: int):
+        self.model = model
+        self.scaler = scaler
+        self.version = version
+        self.size = size
+
+
+# The ModelRegistry is a singleton so that every request of the backend shares the same deserialised models
+class ModelRegistry:
+    """
+    Process wide LRU of deserialised (model, scaler) pairs bounded by a memory budget.
+
+    An entry is invalidated when its artifacts version changes (the mtimes of the pkl files for local models) or,
+    when there is no way to get the version (models stored on Azure), when the model's last trained date doesn't match the expected one.
+    Concurrent loads of the same stock are coalesced: only one request loads it, the others wait for it.
+    """
+
+    __shared_instance = None
+
+    @staticmethod
+    def getInstance(memoryBudget: int, load: Callable[[str], tuple], getVersion: Callable[[str], tuple] | None = None):
+        """Static Access Method"""
+        if ModelRegistry.__shared_instance == None:
+            ModelRegistry.__shared_instance = ModelRegistry(memoryBudget, load, getVersion)
+        return ModelRegistry.__shared_instance
+
+    def __init__(self, memoryBudget: int, load: Callable[[str], tuple], getVersion: Callable[[str], tuple] | None = None):
+        """
+        Args:
+            memoryBudget: maximum size in bytes of the cached pairs, estimated from the arrays they hold.
+            load: loads the (model, scaler) pair of a stock, either can be None if it's unavailable.
+            getVersion: returns a cheap to compute version of a stock's artifacts, None if there is no such thing.
+        """
+        self.__memoryBudget = memoryBudget
+        self.__load = load
+        self.__getVersion = getVersion
+        self.__entries = OrderedDict()
+        self.__size = 0
+        self.__lock = threading.Lock()
+        self.__stockLocks = {}
+        self.__requestCounts = Counter()
+
+    def get(self, stock: str, last_trained_date: datetime = None) -> tuple:
+        """returns the (model, scaler) pair of a stock, loading it if it isn't cached or if the cached one is outdated"""
+        version = self.__getVersion(stock) if self.__getVersion != None else None
+        with self.__lock:
+            self.__requestCounts[stock] += 1
+            stockLock = self.__stockLocks.setdefault(stock, threading.Lock())
+        entry = self.__lookup(stock, version, last_trained_date)
+        record_cache_lookup("model_registry", entry != None)
+        if entry != None:
+            return entry.model, entry.scaler
+        with stockLock:
+            # another request might have loaded it while we were waiting
+            entry = self.__lookup(stock, version, last_trained_date)
+            if entry != None:
+                return entry.model, entry.scaler
+            model, scaler = self.__load(stock)
+            if model != None and scaler != None:
+                self.__store(stock, _Entry(model, scaler, version, _estimate_size((model, scaler))))
+            return model, scaler
+
+    def invalidate(self, stock: str):
+        """removes a stock's pair from the registry"""
+        with self.__lock:
+            entry = self.__entries.pop(stock, None)
+            if entry != None:
+                self.__size -= entry.size
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.__size = 0
+
+    def contains(self, stock: str) -> bool:
+        with self.__lock:
+            return stock in self.__entries
+
+    def get_size(self) -> int:
+        """returns the estimated size in bytes of the cached pairs"""
+        return self.__size
+
+    def warm_up(self, stocks: list[str]):
+        """loads the pairs of the given stocks, ordered from the most to the least requested"""
+        # loaded in reverse so that if the budget is too small it's the least requested ones that get evicted
+        for stock in reversed(stocks):
+            self.get(stock)
+            with self.__lock:
+                # the request was not made by a user
+                self.__requestCounts[stock] -= 1
+
+    def save_request_counts(self, path: str | Path = REQUEST_COUNTS_PATH):
+        """adds the request counts of this process to the ones saved at the given path"""
+        counts = Counter(self.load_request_counts(path))
+        with self.__lock:
+            counts.update(self.__requestCounts)
+            self.__requestCounts.clear()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(dict(counts), f)
+
+    @staticmethod
+    def load_request_counts(path: str | Path = REQUEST_COUNTS_PATH) -> dict:
+        if not os.path.isfile(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    @staticmethod
+    def get_most_requested(n: int, path: str | Path = REQUEST_COUNTS_PATH) -> list[str]:
+        """returns the n most requested stocks according to the request counts saved at the given path"""
+        return [stock for stock, _ in Counter(ModelRegistry.load_request_counts(path)).most_common(n)]
+
+    def __lookup(self, stock: str, version: tuple | None, last_trained_date: datetime | None) -> _Entry | None:
+        with self.__lock:
+            entry = self.__entries.get(stock)
+            if entry == None:
+                return None
+            if version != None:
+                is_outdated = entry.version != version
+            else:
+                is_outdated = last_trained_date != None and entry.model.get_last_trained_date() != last_trained_date
+            if is_outdated:
+                del self.__entries[stock]
+                self.__size -= entry.size
+                return None
+            self.__entries.move_to_end(stock)
+            return entry
+
+    def __store(self, stock: str, entry: _Entry):
+        if entry.size > self.__memoryBudget:
+            return
+        with self.__lock:
+            old_entry = self.__entries.pop(stock, None)
+            if old_entry != None:
+                self.__size -= old_entry.size
+            self.__entries[stock] = entry
+            self.__size += entry.size
+            # evict the least recently used pairs
+            while self.__size > self.__memoryBudget:
+                _, evicted = self.__entries.popitem(last=False)
+                self.__size -= evicted.size
@@ -1,17 +1,19 @@
 import os
 import joblib
 from sklearn.preprocessing import MinMaxScaler
-from azure.ai.ml import MLClient
-from azure.identity import DefaultAzureCredential
-from azure.ai.ml.entities import Model as ScalerModel
-from azure.ai.ml.constants import AssetTypes
 from pathlib import Path
 import pickle
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from azure.ai.ml import MLClient
 
 FILE_PATH = Path(os.path.dirname(__file__))
 SCALER_LOCAL_PATH = FILE_PATH / ".." / ".." / "pkl" / "scalers"
 
-def _get_ml_client() -> MLClient:
+def _get_ml_client() -> "MLClient":
+    from azure.ai.ml import MLClient
+    from azure.identity import DefaultAzureCredential
     return MLClient(
         credential=DefaultAzureCredential(),
         subscription_id=os.environ["AZURE_SUBSCRIPTION_ID"],
@@ -96,6 +98,8 @@ def save_scaler(scaler: MinMaxScaler, model_location: str, stock: str):
         joblib.dump(scaler, scaler_file)
 
         ml_client = _get_ml_client()
+        from azure.ai.ml.entities import Model as ScalerModel
+        from azure.ai.ml.constants import AssetTypes
         scaler_asset = ScalerModel(
             path=outputs_dir,
             name=f"{stock}-scaler",
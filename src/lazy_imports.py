@@ -0,0 +1,43 @@
+import sys
+from importlib import import_module
+from types import ModuleType
+
+
+class LazyModule(ModuleType):
+    """
+    Package whose exports are imported from their submodules on first access, so that importing it (or one of its
+    light submodules) doesn't load the heavy libraries of the others, e.g. Keras for the LSTM model.
+    """
+
+    def __getattr__(self, name: str):
+        submodule = self.__dict__["_lazyExports"].get(name)
+        if submodule == None:
+            raise AttributeError(f"module {self.__name__!r} has no attribute {name!r}")
+        value = getattr(import_module(submodule, self.__name__), name)
+        ModuleType.__setattr__(self, name, value)
+        return value
+
+    def __setattr__(self, name: str, value):
+        # importing a submodule binds it to its package, it mustn't hide the export of the same name
+        # (e.g. the LSTMModel class of the LSTMModel module)
+        if isinstance(value, ModuleType) and value.__name__ == f"{self.__name__}.{name}" and name in self.__dict__["_lazyExports"]:
+            return
+        ModuleType.__setattr__(self, name, value)
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(self.__dict__["_lazyExports"]))
+
+
+def lazy_exports(name: str, exports: dict[str, list[str]]):
+    """
+    Makes the package name export lazily the names of its submodules, replacing its `from .submodule import names`.
+
+    Args:
+        name: the package's __name__.
+        exports: the exported names of each submodule, by relative module name (e.g. {".models": ["LSTMModel"]}).
+    """
+    module = sys.modules[name]
+    lazyExports = {attribute: submodule for submodule, attributes in exports.items() for attribute in attributes}
+    module.__dict__["_lazyExports"] = lazyExports
+    module.__dict__["__all__"] = list(lazyExports)
+    module.__class__ = LazyModule
@@ -0,0 +1 @@
+from .metrics import Counter, Histogram, MetricsRegistry, metricsRegistry, record_cache_lookup, MODEL_LOAD_SECONDS, INFERENCE_SECONDS, DATA_READ_SECONDS, CACHE_REQUESTS, RAG_NODE_SECONDS, RAG_ANSWER_PATHS, RAG_TIME_TO_FIRST_TOKEN_SECONDS, HTTP_REQUEST_SECONDS
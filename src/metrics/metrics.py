@@ -0,0 +1,176 @@
+import time
+import threading
+from bisect import bisect_left
+from functools import wraps
+
+# Latency buckets in seconds, from a cache hit to a LLM call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labelNames: tuple, labelValues: tuple, extra: dict = None) -> str:
+    labels = [f'{name}="{str(value)}"' for name, value in zip(labelNames, labelValues)]
+    if extra:
+        labels += [f'{name}="{value}"' for name, value in extra.items()]
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Counter:
+    """A monotonically increasing value per label set"""
+
+    def __init__(self, name: str, documentation: str, labelNames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelNames = tuple(labelNames)
+        self.__values = {}
+        self.__lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelNames)
+        with self.__lock:
+            self.__values[key] = self.__values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self.__values.get(tuple(labels.get(name, "") for name in self.labelNames), 0)
+
+    def clear(self):
+        with self.__lock:
+            self.__values.clear()
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self.__lock:
+            for key, value in sorted(self.__values.items()):
+                lines.append(f"{self.name}_total{_format_labels(self.labelNames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Counts of observations in cumulative buckets, with their sum, per label set"""
+
+    def __init__(self, name: str, documentation: str, labelNames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelNames = tuple(labelNames)
+        self.buckets = tuple(sorted(buckets))
+        self.__series = {}
+        self.__lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelNames)
+        # the observation goes into the first bucket it fits in, the counts are only made cumulative when rendered
+        bucket = bisect_left(self.buckets, value)
+        with self.__lock:
+            series = self.__series.get(key)
+            if series == None:
+                series = self.__series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][bucket] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def time(self, **labels):
+        """Times a block (with histogram.time(...):) or a function (@histogram.time(...)) and observes its duration"""
+        return _Timer(self, labels)
+
+    def get_count(self, **labels) -> int:
+        series = self.__series.get(tuple(labels.get(name, "") for name in self.labelNames))
+        return series["count"] if series != None else 0
+
+    def get_sum(self, **labels) -> float:
+        series = self.__series.get(tuple(labels.get(name, "") for name in self.labelNames))
+        return series["sum"] if series != None else 0.0
+
+    def clear(self):
+        with self.__lock:
+            self.__series.clear()
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.__lock:
+            for key, series in sorted(self.__series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), series["counts"]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelNames, key, {'le': le})} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelNames, key)} {series['sum']}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelNames, key)} {series['count']}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.__histogram = histogram
+        self.__labels = labels
+
+    def __enter__(self):
+        self.__start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.__histogram.observe(time.perf_counter() - self.__start, **self.__labels)
+
+    def __call__(self, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Timer(self.__histogram, self.__labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+# The MetricsRegistry is a singleton so that the metrics recorded anywhere in the process end up on the same /metrics page
+class MetricsRegistry:
+    """Holds the process' counters and histograms and renders them in the Prometheus text format"""
+
+    __shared_instance = None
+
+    @staticmethod
+    def getInstance():
+        """Static Access Method"""
+        if MetricsRegistry.__shared_instance == None:
+            MetricsRegistry.__shared_instance = MetricsRegistry()
+        return MetricsRegistry.__shared_instance
+
+    def __init__(self):
+        self.__metrics = {}
+        self.__lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelNames: tuple = ()) -> Counter:
+        """returns the counter with the given name, creating it if needed"""
+        return self.__register(name, lambda: Counter(name, documentation, labelNames))
+
+    def histogram(self, name: str, documentation: str, labelNames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        """returns the histogram with the given name, creating it if needed"""
+        return self.__register(name, lambda: Histogram(name, documentation, labelNames, buckets))
+
+    def clear(self):
+        """resets the values of all the metrics"""
+        for metric in list(self.__metrics.values()):
+            metric.clear()
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self.__metrics.values()):
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+    def __register(self, name: str, create):
+        with self.__lock:
+            if name not in self.__metrics:
+                self.__metrics[name] = create()
+            return self.__metrics[name]
+
+
+metricsRegistry = MetricsRegistry.getInstance()
+
+MODEL_LOAD_SECONDS = metricsRegistry.histogram("model_load_seconds", "Time spent loading a stock's model and scaler", ("location",))
+INFERENCE_SECONDS = metricsRegistry.histogram("inference_seconds", "Time spent forecasting with a model, per model type", ("model",))
+DATA_READ_SECONDS = metricsRegistry.histogram("data_read_seconds", "Time spent reading a stock's processed data", ("format",))
+CACHE_REQUESTS = metricsRegistry.counter("cache_requests", "Cache lookups, per cache and result (hit or miss)", ("cache", "result"))
+RAG_NODE_SECONDS = metricsRegistry.histogram("rag_node_seconds", "Time spent in each node of the RAG graph", ("node",))
+RAG_ANSWER_PATHS = metricsRegistry.counter("rag_answer_paths", "Answers of the RAG graph, per path out of the grading (accepted, skipped, rewritten, max_rewrites or deadline)", ("path",))
+RAG_TIME_TO_FIRST_TOKEN_SECONDS = metricsRegistry.histogram("rag_time_to_first_token_seconds", "Time from a streamed RAG query to the first token of its answer, per source (graph or cache)", ("source",))
+HTTP_REQUEST_SECONDS = metricsRegistry.histogram("http_request_seconds", "Time spent handling a request of the backend", ("method", "route", "status"))
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
@@ -1 +1,5 @@
-from .models import IModel, ARIMAModel, GRUModel, LSTMModel
\ No newline at end of file
+from src.lazy_imports import lazy_exports
+
+lazy_exports(__name__, {
+    ".models": ["IModel", "ARIMAModel", "GRUModel", "LSTMModel"],
+})
@@ -1,7 +1,10 @@
+import logging
 from statsmodels.tsa.arima.model import ARIMA
 
 from .IModel import IModel
 
+logger = logging.getLogger(__name__)
+
 class ARIMAModel(IModel):
     def __init__(self, stock_name: str = None):
         super().__init__(stock_name)
@@ -10,7 +13,7 @@ class ARIMAModel(IModel):
     def train(self, features, targets, last_trained_date):
         # for ARIMA model there isn't a separation between features and targets so we pass all the data in the features param
         features = features.flatten()
-        print(f"features shape: {features.shape}")
+        logger.debug(f"features shape: {features.shape}")
         model = ARIMA(features, order=(2,1,5)) # the order was found when running auto_arima method which generated the best orders
         model_fit = model.fit()
         self.model = model_fit
@@ -18,8 +21,11 @@ class ARIMAModel(IModel):
     
     def predict(self, input_data):
         numberOfDays = len(input_data)
-        print(f"number of days to predict: {numberOfDays}")
+        logger.debug(f"number of days to predict: {numberOfDays}")
         res = self.model.forecast(steps=numberOfDays)
-        print(f"prediction result shape: {res.shape}")
+        logger.debug(f"prediction result shape: {res.shape}")
         return res
 
+    def forecast(self, num_days: int):
+        # the whole horizon in one call, ARIMA doesn't need the rolling window
+        return self.model.forecast(steps=num_days)
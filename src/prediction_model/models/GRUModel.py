@@ -1,6 +1,11 @@
+import logging
 from .IModel import IModel
+from keras.src import ops
 from keras.src.models import Sequential
 from keras.src.layers import GRU, Dense, Dropout
+
+logger = logging.getLogger(__name__)
+
 class GRUModel(IModel):
     def __init__(self, stock_name: str = None):
         super().__init__(stock_name)
@@ -13,14 +18,18 @@ class GRUModel(IModel):
         self.model = model
 
     def train(self, features, targets, last_trained_date):
-        print(f"features shape: {features.shape}")
-        print(f"targets shape: {targets.shape}")
+        logger.debug(f"features shape: {features.shape}")
+        logger.debug(f"targets shape: {targets.shape}")
         self.model.fit(x=features, y=targets, batch_size=32, epochs=40, verbose=1)
         self.last_trained_date = max(last_trained_date, self.last_trained_date) if self.last_trained_date != None else last_trained_date
     
     def predict(self, input_data):
-        print(f"input shape: {input_data.shape}")
+        logger.debug(f"input shape: {input_data.shape}")
         res = self.model.predict(input_data)
-        print(f"prediction result shape: {res.shape}")
+        logger.debug(f"prediction result shape: {res.shape}")
         return res.squeeze()
 
+    def predict_step(self, windows):
+        # calling the model directly skips the data adapter and callbacks that predict sets up on every call
+        res = self.model(windows, training=False)
+        return ops.convert_to_numpy(res).reshape(-1)
@@ -1,8 +1,11 @@
+import logging
 from abc import ABC, abstractmethod
 import numpy as np
 from enums import ValidationMetricEnum
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 class IModel(ABC):
     """
     Abstract base class for a prediction model.
@@ -37,6 +40,19 @@ class IModel(ABC):
         """
         pass
 
+    def predict_step(self, windows: np.ndarray) -> np.ndarray:
+        """
+        Predict the next value of a batch of windows, used by the forecasting loop.
+        Models with a cheaper inference path than predict should override it.
+
+        Parameters:
+            windows: the windows, shape (batch, window, features).
+
+        Returns:
+            The next value of each window, shape (batch,).
+        """
+        return np.asarray(self.predict(windows)).reshape(-1)
+
     def evaluate(self, x_test: np.ndarray, y_test: np.ndarray, metric: ValidationMetricEnum, scale: float) -> float:
         """
         Evaluate the trained model.
@@ -51,8 +67,8 @@ class IModel(ABC):
             The evaluation result.
         """
         y_predict = self.predict(x_test)
-        print(f"test y dim before flattening:{y_test.shape}")
-        print(f"predict y dim before flattening:{y_predict.shape}")
+        logger.debug(f"test y dim before flattening:{y_test.shape}")
+        logger.debug(f"predict y dim before flattening:{y_predict.shape}")
         if (y_predict.ndim > 1):
             y_predict = y_predict.flatten()
         if (y_test.ndim > 1):
@@ -60,8 +76,8 @@ class IModel(ABC):
         y_test = y_test
         y_predict = y_predict * scale
         y_test = y_test * scale
-        print(f"test y dim after flattening:{y_test.shape}")
-        print(f"predict y dim after flattening:{y_predict.shape}")
+        logger.debug(f"test y dim after flattening:{y_test.shape}")
+        logger.debug(f"predict y dim after flattening:{y_predict.shape}")
         match metric:
             case ValidationMetricEnum.RMSE:
                 rmse = np.sqrt(np.mean((y_predict - y_test)**2))
@@ -1,4 +1,8 @@
-from .IModel import IModel
-from .LSTMModel import LSTMModel
-from .GRUModel import GRUModel
-from .ARIMAModel import ARIMAModel
\ No newline at end of file
+from src.lazy_imports import lazy_exports
+
+lazy_exports(__name__, {
+    ".IModel": ["IModel"],
+    ".LSTMModel": ["LSTMModel"],
+    ".GRUModel": ["GRUModel"],
+    ".ARIMAModel": ["ARIMAModel"],
+})
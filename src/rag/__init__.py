@@ -1,2 +1,11 @@
-from .rag_system import create_agents_graph
-from .pinecone_vector_store import get_pinecone_vector_store
+from src.lazy_imports import lazy_exports
+
+lazy_exports(__name__, {
+    ".rag_system": ["create_agents_graph", "get_agents_graph", "embed_question", "stream_answer"],
+    ".lazy": ["Lazy", "get_llm"],
+    ".pinecone_vector_store": ["get_pinecone_vector_store"],
+    ".local_vector_store": ["LocalVectorStore"],
+    ".embedding_cache": ["EmbeddingCache", "CachedEmbeddings"],
+    ".vector_stores": ["get_vector_store", "get_embeddings"],
+    ".semantic_cache": ["SemanticCache", "extract_entities"],
+})
@@ -1,11 +1,12 @@
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
 from pydantic import BaseModel, Field
 
 from typing import Literal
 from dotenv import load_dotenv
 import os
 
+from ..lazy import Lazy, get_llm
+
 
 load_dotenv()
 model_name = os.getenv('SIMPLE_TASK_MODEL')
@@ -19,10 +20,6 @@ class GradeAnswer(BaseModel):
     )
 
 
-# LLM with function call
-llm = ChatGoogleGenerativeAI(model=model_name, temperature=0, google_api_key=api_key)
-structured_llm_grader = llm.with_structured_output(GradeAnswer)
-
 # Prompt
 system = """You are tasked with grading whether a given answer adequately addresses and resolves the associated question.
 
@@ -46,4 +43,9 @@ answer_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-answer_grader_agent = answer_prompt | structured_llm_grader
\ No newline at end of file
+def create_answer_grader():
+    # LLM with function call
+    structured_llm_grader = get_llm(model_name, 0, api_key).with_structured_output(GradeAnswer)
+    return answer_prompt | structured_llm_grader
+
+answer_grader_agent = Lazy(create_answer_grader)
\ No newline at end of file
@@ -1,11 +1,14 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.output_parsers import StrOutputParser
 import dotenv
 import os
 from abc import ABC, abstractmethod
 
+from ...lazy import Lazy, get_llm
+
 dotenv.load_dotenv()
 model_name = os.environ.get("GENERATIVE_MODEL")
+# tag of the LLMs writing the answer, their tokens are the ones streamed to the user (see rag_system.stream_answer)
+ANSWER_TAG = "answer"
 
 class IGenerator(ABC):
     """
@@ -14,9 +17,13 @@ class IGenerator(ABC):
 
     def __init__(self,prompt, temperature: float = 0):
         self.prompt = prompt
-        self.decision_chain = None
-        self.generative_llm = ChatGoogleGenerativeAI(model=model_name, temperature=temperature)
-        self.__create_decision_chain()
+        self.temperature = temperature
+        # created with the first answer, the generators of the same temperature share their LLM
+        self.decision_chain = Lazy(self.__create_decision_chain)
+
+    @property
+    def generative_llm(self):
+        return get_llm(model_name, self.temperature)
 
     @abstractmethod
     def create_prompt(self) -> str:
@@ -42,7 +49,7 @@ class IGenerator(ABC):
         Returns:
             str: decision chain.
         """
-        self.decision_chain =  self.prompt | self.generative_llm | StrOutputParser()
+        return self.prompt | self.generative_llm.with_config(tags=[ANSWER_TAG]) | StrOutputParser()
 
 
     def get_decision_chain(self) -> str:
@@ -52,6 +59,4 @@ class IGenerator(ABC):
         Returns:
             str: decision chain.
         """
-        if self.decision_chain is None:
-            raise ValueError("Decision chain has not been created yet.")
-        return self.decision_chain
\ No newline at end of file
+        return self.decision_chain.get()
\ No newline at end of file
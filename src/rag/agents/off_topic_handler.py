@@ -1,15 +1,15 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_google_genai import ChatGoogleGenerativeAI
 from dotenv import load_dotenv
 import os
 
+from .generator_agents.IGenerator import ANSWER_TAG
+from ..lazy import Lazy, get_llm
+
 
 load_dotenv()
 model_name = os.getenv("SIMPLE_TASK_MODEL")
 
-llm = ChatGoogleGenerativeAI(model=model_name, temperature=0)
-
 system = """You are an assistant that responds to users' prompts.
 
 - If the user greeting is recognized (e.g., "hello", "hi", "good morning", "hey"), reply with a warm greeting and then ask how you can assist them.
@@ -47,4 +47,4 @@ prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-off_topic_responder = prompt | llm | StrOutputParser()
\ No newline at end of file
+off_topic_responder = Lazy(lambda: prompt | get_llm(model_name, 0).with_config(tags=[ANSWER_TAG]) | StrOutputParser())
\ No newline at end of file
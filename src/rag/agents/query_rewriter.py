@@ -1,15 +1,14 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_google_genai import ChatGoogleGenerativeAI
 from dotenv import load_dotenv
 import os
 
+from ..lazy import Lazy, get_llm
+
 
 load_dotenv()
 model_name = os.getenv("SIMPLE_TASK_MODEL")
 
-llm = ChatGoogleGenerativeAI(model=model_name, temperature=0)
-
 system = """Re-write the input question to improve it for vectorstore retrieval. 
             Analyze the question carefully to understand its true semantic intent, then generate a clearer, more precise version optimized for searching vector databases. 
             Output only the re-written question with no extra text or explanation."""
@@ -23,4 +22,4 @@ prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-question_rewriter = prompt | llm | StrOutputParser()
\ No newline at end of file
+question_rewriter = Lazy(lambda: prompt | get_llm(model_name, 0) | StrOutputParser())
\ No newline at end of file
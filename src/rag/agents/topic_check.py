@@ -1,11 +1,12 @@
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI 
 from pydantic import BaseModel, Field
 
 from typing import Literal
 from dotenv import load_dotenv
 import os
 
+from ..lazy import Lazy, get_llm
+
 load_dotenv()
 model_name = os.getenv('SIMPLE_TASK_MODEL')
 
@@ -19,10 +20,6 @@ class TopicCheck(BaseModel):
     )
 
 
-# LLM with function call
-llm = ChatGoogleGenerativeAI(model=model_name, temperature=0)
-structured_llm_router = llm.with_structured_output(TopicCheck)
-
 # Prompt
 system = """
 You are an expert at routing a user question to RAG or decide if it is not relevent.
@@ -37,4 +34,9 @@ route_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-topic_checker = route_prompt | structured_llm_router
\ No newline at end of file
+def create_topic_checker():
+    # LLM with function call
+    structured_llm_router = get_llm(model_name, 0).with_structured_output(TopicCheck)
+    return route_prompt | structured_llm_router
+
+topic_checker = Lazy(create_topic_checker)
\ No newline at end of file
@@ -1,11 +1,12 @@
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI 
 from pydantic import BaseModel, Field
 
 from typing import Literal
 from dotenv import load_dotenv
 import os
 
+from ..lazy import Lazy, get_llm
+
 load_dotenv()
 model_name = os.getenv('SIMPLE_TASK_MODEL')
 api_key= os.getenv("GOOGLE_API_KEY_1")
@@ -18,12 +19,14 @@ class ClassifyInput(BaseModel):
         ...,
         description="Given a user input choose the topic of the question. The topics are: news, stocks, recommendation."
     )
+    confidence: float = Field(
+        default=0.0,
+        ge=0.0,
+        le=1.0,
+        description="How sure you are that the input belongs to this topic, from 0 (unsure) to 1 (certain)."
+    )
 
 
-# LLM with function call
-llm = ChatGoogleGenerativeAI(model=model_name, temperature=0, google_api_key= api_key)
-structured_llm_router = llm.with_structured_output(ClassifyInput)
-
 # Prompt
 system = """
 
@@ -31,7 +34,7 @@ Classify the following user input into one of the following topics:
 - stocks
 - news
 - recommendation
-Respond only with the topic name.
+Respond with the topic name and your confidence in it, from 0 to 1.
 """
 classify_user_input = ChatPromptTemplate.from_messages(
     [
@@ -40,4 +43,9 @@ classify_user_input = ChatPromptTemplate.from_messages(
     ]
 )
 
-input_classifer = classify_user_input | structured_llm_router
\ No newline at end of file
+def create_input_classifier():
+    # LLM with function call
+    structured_llm_router = get_llm(model_name, 0, api_key).with_structured_output(ClassifyInput)
+    return classify_user_input | structured_llm_router
+
+input_classifer = Lazy(create_input_classifier)
\ No newline at end of file
@@ -0,0 +1,162 @@
+import hashlib
+import threading
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+VECTORS_FILE = "vectors.npy"
+KEYS_FILE = "keys.npy"
+LAST_USED_FILE = "last_used.npy"
+
+
+class EmbeddingCache:
+    """
+    On-disk LRU of embeddings keyed by a hash of (model, task type, text).
+
+    It's kept in 3 memory-mapped arrays of maxEntries rows in path: the vectors, their keys (sha256 hex digests, empty for
+    a free row) and when they were last used. A lookup only reads the rows it needs, and the least recently used row is
+    overwritten once the cache is full. The arrays are flushed after each put so another run finds the embeddings,
+    a directory is meant to be written by one process at a time.
+    """
+
+    def __init__(self, path: str | Path, maxEntries: int):
+        self.__path = Path(path)
+        self.__maxEntries = maxEntries
+        self.__lock = threading.Lock()
+        self.__vectors = None
+        self.__keys = None
+        self.__lastUsed = None
+        self.__slots = {}
+        self.__free = []
+        self.__clock = 0
+        if (self.__path / VECTORS_FILE).is_file():
+            self.__open()
+
+    @staticmethod
+    def get_key(model: str, taskType: str | None, text: str) -> bytes:
+        # hex since numpy strips the trailing null bytes of the fixed size strings
+        return hashlib.sha256(f"{model}\0{taskType or ''}\0{text}".encode("utf-8")).hexdigest().encode("ascii")
+
+    def get_many(self, keys: List[bytes]) -> List[np.ndarray | None]:
+        """returns the cached embedding of each key, None for the missing ones"""
+        with self.__lock:
+            vectors = []
+            for key in keys:
+                slot = self.__slots.get(key)
+                if slot != None and bytes(self.__keys[slot]) != key:
+                    # the row was overwritten since the index was built (e.g. by another process), it's a miss
+                    del self.__slots[key]
+                    slot = None
+                if slot == None:
+                    vectors.append(None)
+                    continue
+                self.__clock += 1
+                self.__lastUsed[slot] = self.__clock
+                vectors.append(np.array(self.__vectors[slot]))
+            return vectors
+
+    def put_many(self, keys: List[bytes], vectors: List[List[float]]):
+        if self.__maxEntries <= 0 or not keys:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self.__lock:
+            if self.__vectors is None or self.__vectors.shape[1] != vectors.shape[1]:
+                # first embeddings, or a model with another dimension: the cache starts over
+                self.__create(vectors.shape[1])
+            for key, vector in zip(keys, vectors):
+                slot = self.__slots.get(key)
+                if slot == None:
+                    slot = self.__free.pop() if self.__free else self.__evict()
+                    self.__keys[slot] = key
+                    self.__slots[key] = slot
+                self.__vectors[slot] = vector
+                self.__clock += 1
+                self.__lastUsed[slot] = self.__clock
+            for array in (self.__vectors, self.__keys, self.__lastUsed):
+                array.flush()
+
+    def __len__(self) -> int:
+        return len(self.__slots)
+
+    def __evict(self) -> int:
+        """frees the least recently used row and returns it"""
+        slot = int(np.argmin(self.__lastUsed))
+        self.__slots.pop(bytes(self.__keys[slot]), None)
+        return slot
+
+    def __create(self, dimension: int):
+        self.__path.mkdir(parents=True, exist_ok=True)
+        self.__vectors = np.lib.format.open_memmap(self.__path / VECTORS_FILE, mode="w+", dtype=np.float32, shape=(self.__maxEntries, dimension))
+        self.__keys = np.lib.format.open_memmap(self.__path / KEYS_FILE, mode="w+", dtype="S64", shape=(self.__maxEntries,))
+        self.__lastUsed = np.lib.format.open_memmap(self.__path / LAST_USED_FILE, mode="w+", dtype=np.int64, shape=(self.__maxEntries,))
+        self.__slots = {}
+        self.__free = list(range(self.__maxEntries - 1, -1, -1))
+        self.__clock = 0
+
+    def __open(self):
+        vectors = np.load(self.__path / VECTORS_FILE, mmap_mode="r+")
+        if vectors.shape[0] != self.__maxEntries:
+            # resized, the cache starts over with the first put
+            return
+        self.__vectors = vectors
+        self.__keys = np.load(self.__path / KEYS_FILE, mmap_mode="r+")
+        self.__lastUsed = np.load(self.__path / LAST_USED_FILE, mmap_mode="r+")
+        used = np.flatnonzero(self.__keys != b"")
+        self.__slots = {bytes(self.__keys[slot]): int(slot) for slot in used}
+        self.__free = [int(slot) for slot in np.flatnonzero(self.__keys == b"")[::-1]]
+        self.__clock = int(self.__lastUsed.max()) if self.__maxEntries > 0 else 0
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings served from EmbeddingCaches when the same model and task type already embedded the same text,
+    e.g. the stocks whose documents didn't change since the last run of store_stock_data.py, or a question embedded
+    for the semantic answer cache and then again by the retriever.
+
+    The documents and the queries are kept in separate caches since they're embedded by different processes (the
+    scripts and the backend) and with different task types.
+    """
+
+    def __init__(self, embeddings: Embeddings, path: str | Path, maxEntries: int):
+        """
+        Args:
+            embeddings: the model computing the missing embeddings.
+            path: directory of the caches, in its documents and queries subdirectories.
+            maxEntries: maximum number of embeddings of each cache.
+        """
+        self.__embeddings = embeddings
+        self.__path = Path(path)
+        self.__maxEntries = maxEntries
+        self.__caches = {}
+        self.__model = getattr(embeddings, "model", type(embeddings).__name__)
+        self.__taskType = getattr(embeddings, "task_type", None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        cache = self.__get_cache("documents")
+        keys = [EmbeddingCache.get_key(self.__model, self.__taskType or "RETRIEVAL_DOCUMENT", text) for text in texts]
+        vectors = cache.get_many(keys)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            embedded = self.__embeddings.embed_documents([texts[i] for i in missing])
+            cache.put_many([keys[i] for i in missing], embedded)
+            for i, vector in zip(missing, embedded):
+                vectors[i] = vector
+        return [list(map(float, vector)) for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        cache = self.__get_cache("queries")
+        key = EmbeddingCache.get_key(self.__model, self.__taskType or "RETRIEVAL_QUERY", text)
+        vector = cache.get_many([key])[0]
+        if vector is None:
+            vector = self.__embeddings.embed_query(text)
+            cache.put_many([key], [vector])
+        return list(map(float, vector))
+
+    def __get_cache(self, name: str) -> EmbeddingCache:
+        """opens a cache with its first use, so that a process only creates the files it writes"""
+        cache = self.__caches.get(name)
+        if cache == None:
+            cache = self.__caches.setdefault(name, EmbeddingCache(self.__path / name, self.__maxEntries))
+        return cache
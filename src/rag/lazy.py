@@ -0,0 +1,46 @@
+import threading
+from functools import cache
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+
+class Lazy:
+    """
+    Stands for the object returned by a factory, which is only called on the first use of one of the object's
+    attributes, e.g. an LLM chain or a vector store whose creation needs the network. The object is then kept, the
+    concurrent first uses wait for a single call of the factory.
+    """
+
+    def __init__(self, factory):
+        self.__factory = factory
+        self.__lock = threading.Lock()
+        self.__value = None
+        self.__created = False
+
+    @property
+    def created(self) -> bool:
+        return self.__created
+
+    def get(self):
+        """returns the object, creating it on the first call"""
+        if not self.__created:
+            with self.__lock:
+                if not self.__created:
+                    self.__value = self.__factory()
+                    self.__created = True
+        return self.__value
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+@cache
+def get_llm(model: str, temperature: float = 0, api_key: str | None = None) -> ChatGoogleGenerativeAI:
+    """
+    Returns the chat model of the given settings, created once per process so that the agents using the same model
+    share its client and its HTTP connections.
+    """
+    if api_key == None:
+        # the key of the environment, GOOGLE_API_KEY
+        return ChatGoogleGenerativeAI(model=model, temperature=temperature)
+    return ChatGoogleGenerativeAI(model=model, temperature=temperature, google_api_key=api_key)
@@ -0,0 +1,202 @@
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Iterable, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+EMBEDDINGS_FILE = "embeddings.npy"
+DOCUMENTS_FILE = "documents.json"
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector store, the alternative to Pinecone for single node deployments and offline tests.
+
+    It's a flat index: the normalized embeddings are a float32 matrix searched by brute force (cosine similarity),
+    which takes about a millisecond for 5000 documents of 768 dimensions. The matrix is persisted in
+    {path}/embeddings.npy, memory-mapped when loaded, and the texts, ids and metadata in {path}/documents.json.
+    Every add or delete is written to disk, and a store reading the same directory loads the new files on its next search
+    (e.g. the backend after store_stock_data.py ran).
+
+    The filters are dicts of metadata values the documents must equal, e.g. {'source': 'news'}.
+    """
+
+    def __init__(self, path: str | Path, embedding: Embeddings):
+        """
+        Args:
+            path: directory of the index, created with the first documents.
+            embedding: the model embedding the documents and the queries.
+        """
+        self.__path = Path(path)
+        self.__embedding = embedding
+        self.__lock = threading.Lock()
+        self.__loadedVersion = None
+        self.__vectors = None
+        self.__ids = []
+        self.__texts = []
+        self.__metadatas = []
+        self.__sources = np.array([], dtype=object)
+        self.__load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.__embedding
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, *, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """embeds and stores texts, replacing the documents with the same ids"""
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas if metadatas != None else [{} for _ in texts]
+        ids = [id if id else str(uuid.uuid4()) for id in ids] if ids != None else [str(uuid.uuid4()) for _ in texts]
+        vectors = self.__normalize(np.asarray(self.__embedding.embed_documents(texts), dtype=np.float32))
+
+        with self.__lock:
+            self.__reload_if_changed()
+            replaced = set(ids)
+            keep = [i for i, id in enumerate(self.__ids) if id not in replaced]
+            old = self.__vectors[keep] if self.__vectors is not None else np.empty((0, vectors.shape[1]), dtype=np.float32)
+            self.__set(np.concatenate([old, vectors]),
+                       [self.__ids[i] for i in keep] + ids,
+                       [self.__texts[i] for i in keep] + texts,
+                       [self.__metadatas[i] for i in keep] + [dict(metadata) for metadata in metadatas])
+            self.__save()
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """deletes the documents with the given ids, all of them if ids is None"""
+        with self.__lock:
+            self.__reload_if_changed()
+            deleted = set(ids) if ids != None else set(self.__ids)
+            keep = [i for i, id in enumerate(self.__ids) if id not in deleted]
+            if len(keep) == len(self.__ids):
+                return True
+            self.__set(self.__vectors[keep],
+                       [self.__ids[i] for i in keep],
+                       [self.__texts[i] for i in keep],
+                       [self.__metadatas[i] for i in keep])
+            self.__save()
+        return True
+
+    def list_ids(self, prefix: str = "") -> List[str]:
+        """returns the ids of the documents starting with prefix, like Pinecone's index.list"""
+        with self.__lock:
+            self.__reload_if_changed()
+            return [id for id in self.__ids if id.startswith(prefix)]
+
+    def get_by_ids(self, ids, /) -> List[Document]:
+        with self.__lock:
+            self.__reload_if_changed()
+            positions = {id: i for i, id in enumerate(self.__ids)}
+            return [self.__document(positions[id]) for id in ids if id in positions]
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_with_score(query, k, filter, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.__embedding.embed_query(query), k, filter)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None) -> List[tuple[Document, float]]:
+        """returns the k documents matching filter most similar to the embedding, with their cosine similarity"""
+        query = self.__normalize(np.asarray(embedding, dtype=np.float32))
+        with self.__lock:
+            self.__reload_if_changed()
+            if self.__vectors is None or len(self.__ids) == 0 or k <= 0:
+                return []
+            scores = self.__vectors @ query
+            mask = self.__match(filter)
+            if mask is not None:
+                scores = np.where(mask, scores, -np.inf)
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [(self.__document(i), float(scores[i])) for i in top if scores[i] != -np.inf]
+
+    def _select_relevance_score_fn(self):
+        # cosine similarity in [-1, 1] to a relevance in [0, 1]
+        return lambda score: (score + 1) / 2
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, *, ids: Optional[List[str]] = None,
+                   path: str | Path = None, **kwargs: Any) -> "LocalVectorStore":
+        store = cls(path, embedding)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+    def __len__(self) -> int:
+        return len(self.__ids)
+
+    def __match(self, filter: Optional[dict]) -> Optional[np.ndarray]:
+        """returns the mask of the documents matching filter, None if they all do"""
+        if not filter:
+            return None
+        mask = np.ones(len(self.__ids), dtype=bool)
+        for key, value in filter.items():
+            if key == "source":
+                # the most used filter is vectorized
+                mask &= self.__sources == value
+            else:
+                mask &= np.array([metadata.get(key) == value for metadata in self.__metadatas], dtype=bool)
+        return mask
+
+    def __document(self, i: int) -> Document:
+        return Document(id=self.__ids[i], page_content=self.__texts[i], metadata=dict(self.__metadatas[i]))
+
+    def __set(self, vectors: np.ndarray, ids: list, texts: list, metadatas: list):
+        self.__vectors = vectors
+        self.__ids = ids
+        self.__texts = texts
+        self.__metadatas = metadatas
+        self.__sources = np.array([metadata.get("source") for metadata in metadatas], dtype=object)
+
+    def __version(self):
+        """returns the modification time of the persisted documents, None if there are none"""
+        try:
+            return os.stat(self.__path / DOCUMENTS_FILE).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def __reload_if_changed(self):
+        if self.__version() != self.__loadedVersion:
+            self.__load()
+
+    def __load(self):
+        version = self.__version()
+        if version == None:
+            self.__set(None, [], [], [])
+        else:
+            with open(self.__path / DOCUMENTS_FILE, "r", encoding="utf-8") as file:
+                documents = json.load(file)
+            vectors = np.load(self.__path / EMBEDDINGS_FILE, mmap_mode="r")
+            if vectors.shape[0] != len(documents["ids"]):
+                # another process is between the two writes of __save, loaded again on the next call
+                return
+            self.__set(vectors, documents["ids"], documents["texts"], documents["metadatas"])
+        self.__loadedVersion = version
+
+    def __save(self):
+        """writes the index, the documents file last since it's the one whose modification time is checked"""
+        self.__path.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.__path / f"{EMBEDDINGS_FILE}.tmp"
+        with open(tmp_path, "wb") as file:
+            np.save(file, np.ascontiguousarray(self.__vectors, dtype=np.float32))
+        os.replace(tmp_path, self.__path / EMBEDDINGS_FILE)
+        tmp_path = self.__path / f"{DOCUMENTS_FILE}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"ids": self.__ids, "texts": self.__texts, "metadatas": self.__metadatas}, file)
+        os.replace(tmp_path, self.__path / DOCUMENTS_FILE)
+        self.__loadedVersion = self.__version()
+
+    @staticmethod
+    def __normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1)
@@ -12,7 +12,7 @@ pinecone_api_key = os.environ.get("PINECONE_API_KEY")
 embedding_model = os.environ.get("EMBEDDING_MODEL")
 
 
-def get_pinecone_vector_store(index_name):
+def get_pinecone_vector_store(index_name, embedding=None):
     pc = Pinecone(api_key=pinecone_api_key)
     
     existing_indexes = [index_info["name"] for index_info in pc.list_indexes()]
@@ -28,6 +28,6 @@ def get_pinecone_vector_store(index_name):
             time.sleep(1)
 
     index = pc.Index(index_name)
-    doc_embeddings = GoogleGenerativeAIEmbeddings(model=embedding_model, task_type="RETRIEVAL_DOCUMENT")
+    doc_embeddings = embedding if embedding != None else GoogleGenerativeAIEmbeddings(model=embedding_model, task_type="RETRIEVAL_DOCUMENT")
     vectore_store = PineconeVectorStore(index=index, embedding=doc_embeddings)
     return vectore_store
@@ -3,21 +3,45 @@ from langgraph.graph import StateGraph, END,  START
 from langchain_core.documents import Document
 import time
 import os
+import logging
+from functools import wraps, cache
 from dotenv import load_dotenv
+from langchain_core.runnables.config import ContextThreadPoolExecutor
 
 from .agents import *
-from .pinecone_vector_store import get_pinecone_vector_store
+from .agents.generator_agents.IGenerator import ANSWER_TAG
+from .vector_stores import get_vector_store
+from .lazy import Lazy
+from src.metrics import RAG_NODE_SECONDS, RAG_ANSWER_PATHS
 
 
 
+logger = logging.getLogger(__name__)
+
 load_dotenv()
 index_name = os.getenv("INDEX_NAME")
+# number of documents the generators get
+RETRIEVAL_K = 7
+# the parallel mode's retrieval isn't filtered by topic, it fetches more documents so that enough of them are left once
+# the topic's filter is applied
+SPECULATIVE_RETRIEVAL_K = int(os.getenv("RAG_SPECULATIVE_RETRIEVAL_K")) if os.getenv("RAG_SPECULATIVE_RETRIEVAL_K") != None else 3 * RETRIEVAL_K
+# budget of a question: the answers graded as not useful are regenerated for a rewritten question at most MAX_REWRITES
+# times, and no rewrite is started if it's expected to end after DEADLINE_SECONDS, the last answer is returned instead
+MAX_REWRITES = int(os.getenv("RAG_MAX_REWRITES")) if os.getenv("RAG_MAX_REWRITES") != None else 2
+DEADLINE_SECONDS = float(os.getenv("RAG_DEADLINE_SECONDS")) if os.getenv("RAG_DEADLINE_SECONDS") != None else 30
+# the answers to questions classified with at least this confidence aren't graded, above 1 they always are. It's opt-in:
+# the confidence is the classifier's own estimate, which is high for almost every question
+GRADER_SKIP_CONFIDENCE = float(os.getenv("RAG_GRADER_SKIP_CONFIDENCE")) if os.getenv("RAG_GRADER_SKIP_CONFIDENCE") != None else float("inf")
 
 
 n_agent = NewsAgent()
 s_agent = StockAgent()
 r_agent = RecommenderAgent()
-vector_store = get_pinecone_vector_store(index_name)
+# created with the first question, Pinecone's is looked up (and the index created if needed) over the network
+vector_store = Lazy(lambda: get_vector_store(index_name))
+# runs the 3 tasks of analyze_question, shared by the concurrent questions. It keeps the context of the caller's
+# thread so that the LLM calls stay traced under the graph's run.
+analysis_executor = ContextThreadPoolExecutor(max_workers=24, thread_name_prefix="rag-analysis")
 
 
 class State(TypedDict):
@@ -29,27 +53,51 @@ class State(TypedDict):
         generation: LLM generation
         topic: topic of the question('news', 'stocks', 'recommendation')
         documents: list of documents
+        relevance: 'rag' or 'off_topic', only set by the parallel mode's analyze_question
+        confidence: confidence of the classifier in the topic, between 0 and 1
+        grade: grade of the generation ('yes', 'no' or 'skipped' when it isn't graded)
+        rewrites: number of times the question was rewritten
+        started_at: time.monotonic() when the graph started, the start of the question's deadline
     """
     question: str
     documents: List[Document]= []
     topic: str = ""
+    relevance: str = ""
+    confidence: float = 0.0
     generation :str =""
+    grade: str = ""
+    rewrites: int = 0
+    started_at: float = 0.0
 
 
 
 def log_execution_time(func):
     """
-    Decorator to log the execution time of a function.
+    Decorator recording the execution time of a node of the graph in the rag_node_seconds histogram (and in the debug logs).
     """
+    @wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = time.time()  # Record the start time
+        start_time = time.perf_counter()  # Record the start time
         result = func(*args, **kwargs)
-        end_time = time.time()  # Record the end time
-        execution_time = end_time - start_time
-        print(f"Execution time for {func.__name__}: {execution_time:.4f} seconds")
+        execution_time = time.perf_counter() - start_time
+        RAG_NODE_SECONDS.observe(execution_time, node=func.__name__)
+        logger.debug(f"Execution time for {func.__name__}: {execution_time:.4f} seconds")
         return result
     return wrapper
 
+@log_execution_time
+def embed_question(question:str) -> List[float]:
+    """
+    Embed a question with the vector store's embedding model, the key of the semantic answer cache.
+    """
+    return vector_store.embeddings.embed_query(question)
+
+def start_budget(state:State):
+    """
+    Starts the rewrite budget of the question, the first node of the graph.
+    """
+    return {"rewrites": 0, "started_at": time.monotonic()}
+
 @log_execution_time
 def check_topic_relevency(state:State):
     """
@@ -80,7 +128,7 @@ def classify_question(state:State):
     """
     question = state["question"]
     topic = input_classifer.invoke({"user_input": question})
-    return {"topic": topic.topic}
+    return {"topic": topic.topic, "confidence": getattr(topic, "confidence", 0.0)}
 
 
 @log_execution_time
@@ -95,24 +143,93 @@ def retrieve(state:State):
         state(dict): The state of the graph with the retrieved documents in a new key.    
     """
     topic = state["topic"]
-    filter = {'source' : topic} if topic != "recommendation" else None
+    filter = get_topic_filter(topic)
     retriever =vector_store.as_retriever(
     search_type="similarity",
     search_kwargs={
-        "k": 7, 
+        "k": RETRIEVAL_K, 
         "filter": filter  
     },
 )
     documents = retriever.invoke(input=state["question"])
     return {"documents": documents }
 
+def get_topic_filter(topic:str):
+    """
+    returns the metadata filter of the documents of a topic, None for recommendations which use all of them
+    """
+    return {'source' : topic} if topic != "recommendation" else None
+
+def filter_documents(documents:List[Document], topic:str):
+    """
+    Applies the topic's filter to documents retrieved without it.
+
+    Returns:
+        List[Document]: the RETRIEVAL_K most similar documents matching the filter.
+    """
+    filter = get_topic_filter(topic)
+    if filter != None:
+        documents = [document for document in documents if all(document.metadata.get(key) == value for key, value in filter.items())]
+    return documents[:RETRIEVAL_K]
+
+@log_execution_time
+def speculative_retrieve(state:State):
+    """
+    Retrieve documents before the topic of the question is known, without the topic's filter.
+
+    Returns:
+        List[Document]: the SPECULATIVE_RETRIEVAL_K most similar documents.
+    """
+    retriever = vector_store.as_retriever(
+        search_type="similarity",
+        search_kwargs={"k": SPECULATIVE_RETRIEVAL_K},
+    )
+    return retriever.invoke(input=state["question"])
+
+@log_execution_time
+def analyze_question(state:State):
+    """
+    Check the topic relevancy, classify the question and retrieve its documents concurrently, the parallel mode's
+    replacement of check_topic_relevency, classify_question and the first retrieve.
+
+    The retrieval starts before the topic is known so the topic's filter is applied to its documents afterwards, they're
+    retrieved again with the filter if too few of them match it. An off topic question returns as soon as the topic
+    check does, dropping the classification and the retrieval.
+
+    Args:
+        state (State): The state of the graph.
+
+    Returns:
+        state (dict): The state of the graph with the relevance and, if the question is relevant, its topic and documents.
+    """
+    relevance = analysis_executor.submit(check_topic_relevency, state)
+    classification = analysis_executor.submit(classify_question, state)
+    speculation = analysis_executor.submit(speculative_retrieve, state)
+
+    if relevance.result() == "off_topic":
+        # the tasks that haven't started are cancelled, the running ones finish in the background and are ignored
+        classification.cancel()
+        speculation.cancel()
+        return {"relevance": "off_topic"}
+
+    classified = classification.result()
+    topic = classified["topic"]
+    try:
+        documents = filter_documents(speculation.result(), topic)
+    except Exception as e:
+        logger.warning(f"Speculative retrieval failed, retrieving with the topic's filter: {e}")
+        documents = []
+    if len(documents) < RETRIEVAL_K:
+        documents = retrieve({"question": state["question"], "topic": topic})["documents"]
+    return {"relevance": "rag", "topic": topic, "confidence": classified["confidence"], "documents": documents}
+
 @log_execution_time
 def transform_query(state:State):
     """
     Rewrite the question for better understanding or relevance.
     """
     better_question = question_rewriter.invoke({"question": state["question"]})
-    return {"question": better_question}
+    return {"question": better_question, "rewrites": state["rewrites"] + 1}
 
 @log_execution_time
 def off_topic(state:State):
@@ -176,16 +293,39 @@ def generate_recommendation(state:State):
 @log_execution_time
 def grade_answer(state:State):
     """
-    Grade the generated answer.
+    Grade the generated answer, unless the topic of the question was classified with enough confidence or the
+    question's deadline passed (it couldn't be rewritten anyway).
 
     Args:
         state (State): The state of the graph.
 
     Returns:
-        state (dict): The state of the graph with the graded answer in a new key.
+        state (dict): The state of the graph with the grade of the answer in a new key.
     """
+    if state["confidence"] >= GRADER_SKIP_CONFIDENCE or time.monotonic() >= state["started_at"] + DEADLINE_SECONDS:
+        return {"grade": "skipped"}
     grade = answer_grader_agent.invoke({"question": state["question"], "answer": state["generation"]})
-    return grade.binary_score
+    return {"grade": grade.binary_score}
+
+def route_grade(state:State):
+    """
+    Decides whether an answer is returned or regenerated for a rewritten question, within the question's budget. The
+    answer that was last generated is returned when the budget runs out, it's the best one so far since the grades
+    don't rank the answers.
+
+    The duration of a rewrite is estimated as the average time of the answers so far (overestimated by the classification
+    included in the first one), no rewrite is started if it would end after the deadline.
+    """
+    if state["grade"] != "no":
+        path = "skipped" if state["grade"] == "skipped" else "accepted"
+    elif state["rewrites"] >= MAX_REWRITES:
+        path = "max_rewrites"
+    else:
+        now = time.monotonic()
+        elapsed = now - state["started_at"]
+        path = "rewritten" if now + elapsed / (state["rewrites"] + 1) < state["started_at"] + DEADLINE_SECONDS else "deadline"
+    RAG_ANSWER_PATHS.inc(path=path)
+    return "rewrite" if path == "rewritten" else "end"
 
 @log_execution_time
 def route_query(state:State):
@@ -194,30 +334,60 @@ def route_query(state:State):
     """
     return state["topic"]
 
+def route_analysis(state:State):
+    """
+    passes the relevance of the question or its topic to the next node, the parallel mode's routing after analyze_question.
+    """
+    return "off_topic" if state["relevance"] == "off_topic" else state["topic"]
+
 
-def create_agents_graph():
-    print('Creating agents graph...')
+def create_agents_graph(parallel: bool = False):
+    """
+    Creates the RAG graph.
+
+    Args:
+        parallel (bool): check the topic relevancy, classify the question and retrieve its documents concurrently
+            (analyze_question) instead of one after the other. It saves an LLM round trip on every question at the cost
+            of a wasted retrieval on the off topic ones.
+    """
+    logger.info('Creating agents graph...')
 
     workflow = StateGraph(State)
 
     workflow.add_node("off_topic", off_topic) 
-    workflow.add_node("classify_question", classify_question)
     workflow.add_node("retrieve", retrieve)
     workflow.add_node("generate_news", generate_news)
     workflow.add_node("generate_stocks", generate_stocks)
     workflow.add_node("generate_recommendation", generate_recommendation)
     workflow.add_node("transform_query", transform_query)
-
-    workflow.add_conditional_edges(
-        START,
-        check_topic_relevency,
+    workflow.add_node("start_budget", start_budget)
+    workflow.add_node("grade_answer", grade_answer)
+    workflow.add_edge(START, "start_budget")
+
+    if parallel:
+        workflow.add_node("analyze_question", analyze_question)
+        workflow.add_edge("start_budget", "analyze_question")
+        workflow.add_conditional_edges(
+            "analyze_question",
+            route_analysis,
             {
                 "off_topic": "off_topic",
-                "rag": "classify_question",
-            }   
-        )    
+                "news": "generate_news",
+                "stocks": "generate_stocks",
+                "recommendation": "generate_recommendation"
+            })
+    else:
+        workflow.add_node("classify_question", classify_question)
+        workflow.add_conditional_edges(
+            "start_budget",
+            check_topic_relevency,
+                {
+                    "off_topic": "off_topic",
+                    "rag": "classify_question",
+                }   
+            )    
+        workflow.add_edge("classify_question","retrieve")
     workflow.add_edge("off_topic", END)
-    workflow.add_edge("classify_question","retrieve")
     workflow.add_conditional_edges(
         "retrieve",
         route_query,
@@ -226,28 +396,14 @@ def create_agents_graph():
             "stocks": "generate_stocks",
             "recommendation": "generate_recommendation"
         })
+    for generator in ("generate_news", "generate_stocks", "generate_recommendation"):
+        workflow.add_edge(generator, "grade_answer")
     workflow.add_conditional_edges(
-        "generate_news",
-        grade_answer,
-        {
-            "yes":END,
-            "no": "transform_query"
-        }
-    )
-    workflow.add_conditional_edges(
-        "generate_stocks",
-        grade_answer,
-        {
-            "yes":END,
-            "no": "transform_query"
-        }
-    )
-    workflow.add_conditional_edges(
-        "generate_recommendation",
-        grade_answer,
+        "grade_answer",
+        route_grade,
         {
-            "yes":END,
-            "no": "transform_query"
+            "end": END,
+            "rewrite": "transform_query"
         }
     )
     workflow.add_edge("transform_query", "retrieve")
@@ -257,4 +413,34 @@ def create_agents_graph():
     return app
 
 
+@cache
+def get_agents_graph(parallel: bool = False):
+    """
+    Returns the RAG graph, compiled once per process and mode (see create_agents_graph). Its LLMs and vector store are
+    only created when it answers its first question.
+    """
+    return create_agents_graph(parallel)
 
+
+def stream_answer(agents, question:str):
+    """
+    Runs the graph on a question and yields its progress as (event, data) tuples:
+        ("node", {"node": name}) when a node finished,
+        ("token", {"text": text}) for each token of the answer, as the generator LLM writes it,
+        ("reset", {}) when the answer was graded as not useful, a new one is generated for the rewritten question,
+        ("done", state) with the final state of the graph, the response of agents.invoke.
+    """
+    state = {"question": question}
+    for mode, chunk in agents.stream(state, stream_mode=["messages", "updates"]):
+        if mode == "messages":
+            message, metadata = chunk
+            # the tokens of the graders and classifiers are also streamed, only the answer's are sent
+            if ANSWER_TAG in metadata.get("tags", ()) and message.text:
+                yield "token", {"text": message.text}
+            continue
+        for node, update in chunk.items():
+            state.update(update or {})
+            if node == "transform_query":
+                yield "reset", {}
+            yield "node", {"node": node}
+    yield "done", state
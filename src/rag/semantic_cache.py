@@ -0,0 +1,155 @@
+import re
+import threading
+import time
+import numpy as np
+
+from src.metrics import record_cache_lookup
+
+# sources of the documents the answers of each topic are generated from, off topic answers depend on none
+TOPIC_SOURCES = {
+    "news": ("news",),
+    "stocks": ("stocks",),
+    "recommendation": ("news", "stocks"),
+}
+
+# words of relative dates, two questions differing by one of them ("this week", "last month") don't share an answer
+DATE_WORDS = frozenset({
+    "today", "yesterday", "tomorrow", "day", "days", "week", "weeks", "month", "months", "quarter", "year", "years",
+    "last", "next", "previous", "ytd", "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+    "january", "february", "march", "april", "may", "june", "july", "august", "september", "october", "november", "december",
+})
+WORD_PATTERN = re.compile(r"\w+(?:[/.:-]\w+)*")
+
+
+def extract_entities(question: str, symbols: set[str] = frozenset()) -> frozenset[str]:
+    """
+    Returns the entities an answer is specific to: the stock symbols (the known ones in any case, any other word
+    written in capitals), the numbers and dates, and the words of relative dates. It's a regular expression rather than
+    an LLM call since it runs on every lookup, before the graph; an extra word only costs a cache miss.
+
+    Args:
+        question: the user's question.
+        symbols: the known stock symbols, in capitals.
+    """
+    entities = set()
+    for word in WORD_PATTERN.findall(question):
+        if word.upper() in symbols or (word.isupper() and len(word) > 1):
+            entities.add(word.upper())
+        elif any(character.isdigit() for character in word):
+            entities.add(word)
+        elif word.lower() in DATE_WORDS:
+            entities.add(word.lower())
+    return frozenset(entities)
+
+
+class _Entry:
+    def __init__(self, value, sources: tuple, entities: frozenset):
+        self.value = value
+        self.sources = sources
+        self.entities = entities
+
+
+class SemanticCache:
+    """
+    In-process cache of the RAG graph's answers, looked up by the similarity of the questions' embeddings so that the
+    rephrasings of an answered question ("how did BIAT do this week", "How has BIAT done this week?") skip the graph.
+    A hit also needs the same entities (see extract_entities): "BIAT price this week" and "BNA price this week" are
+    similar enough but must not share an answer.
+
+    The embeddings are kept in a local numpy index searched by brute force (cosine similarity), a few thousand of them
+    take well under a millisecond and need no external service. An answer is stored with the sources of its topic and
+    is dropped when new documents of one of them are ingested (invalidate) or after the TTL, which bounds how long a
+    relative question ("this week") is answered the same way. Its lookups are counted under the cache label "rag".
+    """
+
+    def __init__(self, maxEntries: int, ttl: float, threshold: float):
+        """
+        Args:
+            maxEntries: maximum number of answers, the oldest one is replaced beyond it. 0 disables the cache.
+            ttl: seconds after which an answer expires.
+            threshold: minimum cosine similarity between two questions for the answer of one to be used for the other.
+        """
+        self.__maxEntries = maxEntries
+        self.__ttl = ttl
+        self.__threshold = threshold
+        self.__embeddings = None # normalized embeddings, one row per slot, allocated with the first answer
+        self.__expiresAt = np.full(max(maxEntries, 0), -np.inf)
+        self.__scopes = np.zeros(max(maxEntries, 0), dtype=np.int64) # hash of the entities of each slot
+        self.__entries = [None] * max(maxEntries, 0)
+        self.__next = 0 # slot of the next answer, the slots are reused in insertion order
+        self.__generation = 0
+        self.__lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.__maxEntries > 0
+
+    def get_version(self) -> int:
+        """returns the current version of the cache, to be passed to set with an answer computed after reading it"""
+        return self.__generation
+
+    def get(self, embedding: list[float], entities: frozenset[str] = frozenset()):
+        """
+        returns the answer of the most similar question about the same entities if it's similar enough, None otherwise
+        """
+        value = None
+        query = self.__normalize(embedding)
+        with self.__lock:
+            if self.__embeddings is not None and self.__embeddings.shape[1] == len(query):
+                candidates = (self.__expiresAt > time.monotonic()) & (self.__scopes == hash(entities))
+                similarities = np.where(candidates, self.__embeddings @ query, -np.inf)
+                best = int(np.argmax(similarities))
+                # the hashes of different entities may collide
+                if similarities[best] >= self.__threshold and self.__entries[best].entities == entities:
+                    value = self.__entries[best].value
+        record_cache_lookup("rag", value != None)
+        return value
+
+    def set(self, embedding: list[float], value, topic: str | None, version: int, entities: frozenset[str] = frozenset()):
+        """
+        Stores the answer of a question of the given topic (None if it's off topic) about the given entities. It's
+        skipped if the cache was invalidated since version was read, the answer may have been generated from the
+        documents it replaced.
+        """
+        if self.__maxEntries <= 0:
+            return
+        query = self.__normalize(embedding)
+        with self.__lock:
+            if version != self.__generation:
+                return
+            if self.__embeddings is None or self.__embeddings.shape[1] != len(query):
+                self.__embeddings = np.zeros((self.__maxEntries, len(query)), dtype=np.float32)
+                self.__expiresAt[:] = -np.inf
+            slot = self.__next
+            self.__embeddings[slot] = query
+            self.__expiresAt[slot] = time.monotonic() + self.__ttl
+            self.__scopes[slot] = hash(entities)
+            self.__entries[slot] = _Entry(value, TOPIC_SOURCES.get(topic, ()), entities)
+            self.__next = (slot + 1) % self.__maxEntries
+
+    def invalidate(self, sources: list[str]):
+        """drops the answers generated from documents of the given sources"""
+        with self.__lock:
+            self.__generation += 1
+            for slot, entry in enumerate(self.__entries):
+                if entry != None and any(source in entry.sources for source in sources):
+                    self.__drop(slot)
+
+    def clear(self):
+        with self.__lock:
+            self.__generation += 1
+            for slot in range(len(self.__entries)):
+                self.__drop(slot)
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.__expiresAt > time.monotonic()))
+
+    def __drop(self, slot: int):
+        self.__entries[slot] = None
+        self.__expiresAt[slot] = -np.inf
+
+    @staticmethod
+    def __normalize(embedding: list[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
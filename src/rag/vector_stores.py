@@ -0,0 +1,41 @@
+from functools import cache
+from pathlib import Path
+import os
+from dotenv import load_dotenv
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+from .embedding_cache import CachedEmbeddings
+from .local_vector_store import LocalVectorStore
+from .pinecone_vector_store import get_pinecone_vector_store
+
+
+load_dotenv()
+embedding_model = os.environ.get("EMBEDDING_MODEL")
+DATA_DIR = Path(__file__).parent / ".." / ".." / "data"
+
+
+def get_embeddings():
+    """
+    Returns the embedding model of the documents and the queries, behind the persistent embedding cache kept in
+    EMBEDDING_CACHE_DIR (data/embedding_cache by default) unless EMBEDDING_CACHE_SIZE is 0.
+    """
+    doc_embeddings = GoogleGenerativeAIEmbeddings(model=embedding_model, task_type="RETRIEVAL_DOCUMENT")
+    cache_size = int(os.environ.get("EMBEDDING_CACHE_SIZE")) if os.environ.get("EMBEDDING_CACHE_SIZE") != None else 20000
+    if cache_size <= 0:
+        return doc_embeddings
+    cache_dir = os.environ.get("EMBEDDING_CACHE_DIR") or DATA_DIR / "embedding_cache"
+    return CachedEmbeddings(doc_embeddings, Path(cache_dir).resolve(), cache_size)
+
+
+@cache
+def get_vector_store(index_name):
+    """
+    Returns the vector store of an index, created once per process.
+
+    The backend is chosen with VECTOR_STORE: 'pinecone' (the default) or 'local', a LocalVectorStore kept in
+    LOCAL_VECTOR_STORE_DIR/{index_name} (data/vector_store by default) which needs no external service.
+    """
+    if os.environ.get("VECTOR_STORE", "pinecone").lower() == "local":
+        store_dir = os.environ.get("LOCAL_VECTOR_STORE_DIR") or DATA_DIR / "vector_store"
+        return LocalVectorStore(Path(store_dir).resolve() / index_name, get_embeddings())
+    return get_pinecone_vector_store(index_name, get_embeddings())
@@ -1 +1,5 @@
-from .back import CacheService
\ No newline at end of file
+from src.lazy_imports import lazy_exports
+
+lazy_exports(__name__, {
+    ".back": ["CacheService", "AsyncCacheService", "SingleFlight", "LocalCache", "CacheCodec", "JsonCodec", "GzipJsonCodec", "ArrowCodec", "get_cache_codec", "get_stock_version_keys", "publish_stock_versions", "publish_document_sources", "MODEL_VERSION", "DATA_VERSION", "DOCUMENTS_VERSION"],
+})
@@ -1 +1,5 @@
-from .services import CacheService
\ No newline at end of file
+from src.lazy_imports import lazy_exports
+
+lazy_exports(__name__, {
+    ".services": ["CacheService", "AsyncCacheService", "SingleFlight", "LocalCache", "CacheCodec", "JsonCodec", "GzipJsonCodec", "ArrowCodec", "get_cache_codec", "get_stock_version_keys", "publish_stock_versions", "publish_document_sources", "MODEL_VERSION", "DATA_VERSION", "DOCUMENTS_VERSION"],
+})
@@ -1,18 +1,31 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.params import Body
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 import os, sys
 from pathlib import Path
 import subprocess
+import numpy as np
 import pandas as pd
+from datetime import date
+from pydantic import BaseModel
 sys.path.insert(0, str(Path(os.path.dirname(__file__)) / '..' / '..' / '..'))
-from utils import predict
-from src import get_model, get_scaler, CacheService
+from utils import forecast
+from utils.data_utils import read_stock_data, has_stock_data, get_partition_path
+from src import get_model, get_scaler, get_forecast, AsyncCacheService, SingleFlight, LocalCache, JsonCodec, get_cache_codec, get_stock_version_keys, DOCUMENTS_VERSION, ModelRegistry, get_local_artifacts_version
+from src.metrics import metricsRegistry, record_cache_lookup, MODEL_LOAD_SECONDS, HTTP_REQUEST_SECONDS, RAG_TIME_TO_FIRST_TOKEN_SECONDS
 sys.path.insert(0, str(Path(os.path.dirname(__file__)) / '..' / '..'))
-from rag import create_agents_graph
+from rag import get_agents_graph, embed_question, stream_answer, Lazy, SemanticCache, extract_entities
 from dotenv import load_dotenv
 from dateutil.relativedelta import relativedelta
 import json
+import asyncio
+import threading
+import logging
+import time
+from contextlib import asynccontextmanager
 
 
 load_dotenv()
@@ -20,16 +33,111 @@ load_dotenv()
 MODEL_LOCATION = os.environ.get("MODEL_LOCATION") 
 DISABLE_BACKEND_CACHE = os.environ.get("DISABLE_BACKEND_CACHE").lower() == "true" if os.environ.get("DISABLE_BACKEND_CACHE") != None else True
 BACKEND_CACHE_CONNECTION_STRING = os.environ.get("BACKEND_CACHE_CONNECTION_STRING") if os.environ.get("BACKEND_CACHE_CONNECTION_STRING") != None else ""
-BACKEND_CACHE_EXPIRATION_TIME = int(os.environ.get("BACKEND_CACHE_EXPIRATION_TIME")) if os.environ.get("BACKEND_CACHE_EXPIRATION_TIME") != None else 0
+# the cached values are removed after the hard TTL (BACKEND_CACHE_EXPIRATION_TIME is its former name), a /stock payload older
+# than the soft TTL is still served while it's recomputed in the background. An empty value counts as unset (e.g. an image's
+# placeholder) so that the former name is still read
+BACKEND_CACHE_EXPIRATION_TIME = int(os.environ.get("BACKEND_CACHE_EXPIRATION_TIME")) if os.environ.get("BACKEND_CACHE_EXPIRATION_TIME") else 0
+BACKEND_CACHE_HARD_TTL = int(os.environ.get("BACKEND_CACHE_HARD_TTL")) if os.environ.get("BACKEND_CACHE_HARD_TTL") else BACKEND_CACHE_EXPIRATION_TIME
+BACKEND_CACHE_SOFT_TTL = int(os.environ.get("BACKEND_CACHE_SOFT_TTL")) if os.environ.get("BACKEND_CACHE_SOFT_TTL") else BACKEND_CACHE_HARD_TTL
+BACKEND_CACHE_LOCK_TIMEOUT = float(os.environ.get("BACKEND_CACHE_LOCK_TIMEOUT")) if os.environ.get("BACKEND_CACHE_LOCK_TIMEOUT") != None else 30
+BACKEND_CACHE_MAX_CONNECTIONS = int(os.environ.get("BACKEND_CACHE_MAX_CONNECTIONS")) if os.environ.get("BACKEND_CACHE_MAX_CONNECTIONS") != None else 10
+BACKEND_CACHE_SOCKET_TIMEOUT = float(os.environ.get("BACKEND_CACHE_SOCKET_TIMEOUT")) if os.environ.get("BACKEND_CACHE_SOCKET_TIMEOUT") != None else 0.5
+# format of the cached /stock payloads, which is also the format of the response: json, json-gzip, arrow-zstd or arrow-lz4
+BACKEND_CACHE_CODEC = os.environ.get("BACKEND_CACHE_CODEC") if os.environ.get("BACKEND_CACHE_CODEC") != None else "json-gzip"
+# the in-process cache in front of valkey, it's the only cache when DISABLE_BACKEND_CACHE is true
+BACKEND_L1_CACHE_SIZE = int(os.environ.get("BACKEND_L1_CACHE_SIZE")) if os.environ.get("BACKEND_L1_CACHE_SIZE") != None else 128
+BACKEND_L1_CACHE_TTL = float(os.environ.get("BACKEND_L1_CACHE_TTL")) if os.environ.get("BACKEND_L1_CACHE_TTL") != None else 60
+MODEL_REGISTRY_MEMORY_BUDGET_MB = int(os.environ.get("MODEL_REGISTRY_MEMORY_BUDGET_MB")) if os.environ.get("MODEL_REGISTRY_MEMORY_BUDGET_MB") != None else 512
+MODEL_REGISTRY_WARMUP_SIZE = int(os.environ.get("MODEL_REGISTRY_WARMUP_SIZE")) if os.environ.get("MODEL_REGISTRY_WARMUP_SIZE") != None else 0
+# check the topic, classify the question and retrieve its documents concurrently in the RAG graph
+RAG_PARALLEL_ANALYSIS = os.environ.get("RAG_PARALLEL_ANALYSIS").lower() == "true" if os.environ.get("RAG_PARALLEL_ANALYSIS") != None else False
+# the /rag answers are cached by the similarity of the questions' embeddings, RAG_CACHE_SIZE=0 disables it
+RAG_CACHE_SIZE = int(os.environ.get("RAG_CACHE_SIZE")) if os.environ.get("RAG_CACHE_SIZE") != None else 1024
+RAG_CACHE_TTL = float(os.environ.get("RAG_CACHE_TTL")) if os.environ.get("RAG_CACHE_TTL") != None else 3600
+RAG_CACHE_SIMILARITY_THRESHOLD = float(os.environ.get("RAG_CACHE_SIMILARITY_THRESHOLD")) if os.environ.get("RAG_CACHE_SIMILARITY_THRESHOLD") != None else 0.95
+# limits of a /stocks/forecast request
+BATCH_FORECAST_MAX_SYMBOLS = int(os.environ.get("BATCH_FORECAST_MAX_SYMBOLS")) if os.environ.get("BATCH_FORECAST_MAX_SYMBOLS") != None else 100
+BATCH_FORECAST_MAX_HORIZON = int(os.environ.get("BATCH_FORECAST_MAX_HORIZON")) if os.environ.get("BATCH_FORECAST_MAX_HORIZON") != None else 60
+# DEBUG also logs the shapes of every inference and the time of every node of the RAG graph
+LOG_LEVEL = os.environ.get("LOG_LEVEL").upper() if os.environ.get("LOG_LEVEL") != None else "INFO"
 
-cacheService = CacheService.getInstance(BACKEND_CACHE_CONNECTION_STRING, DISABLE_BACKEND_CACHE, BACKEND_CACHE_EXPIRATION_TIME)
-agents = create_agents_graph()
+logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
+def load_model_and_scaler(stock: str) -> tuple:
+    with MODEL_LOAD_SECONDS.time(location=MODEL_LOCATION):
+        return get_model(stock, MODEL_LOCATION), get_scaler(stock, MODEL_LOCATION)
+
+cacheCodec = get_cache_codec(BACKEND_CACHE_CODEC)
+cacheService = AsyncCacheService.getInstance(BACKEND_CACHE_CONNECTION_STRING, DISABLE_BACKEND_CACHE, BACKEND_CACHE_HARD_TTL, BACKEND_CACHE_MAX_CONNECTIONS, BACKEND_CACHE_SOCKET_TIMEOUT,
+                                            codec=cacheCodec, softExpirationTime=BACKEND_CACHE_SOFT_TTL, lockTimeout=BACKEND_CACHE_LOCK_TIMEOUT)
+# coalesces the concurrent computations of a stock when there is no cache to do it
+stockSingleFlight = SingleFlight()
+localCache = LocalCache(BACKEND_L1_CACHE_SIZE, BACKEND_L1_CACHE_TTL)
+# with models stored on Azure there is no cheap version to check, the registry relies on the last trained date instead
+modelRegistry = ModelRegistry.getInstance(MODEL_REGISTRY_MEMORY_BUDGET_MB * 1024 * 1024, load_model_and_scaler, get_local_artifacts_version if MODEL_LOCATION == "LOCAL" else None)
+# compiled with the first RAG query, the backend starts without reaching the LLMs or the vector store
+agents = Lazy(lambda: get_agents_graph(RAG_PARALLEL_ANALYSIS))
+ragCache = SemanticCache(RAG_CACHE_SIZE, RAG_CACHE_TTL, RAG_CACHE_SIMILARITY_THRESHOLD)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if MODEL_REGISTRY_WARMUP_SIZE > 0:
+        # warmed up in the background so it doesn't delay the startup
+        threading.Thread(target=modelRegistry.warm_up, args=(ModelRegistry.get_most_requested(MODEL_REGISTRY_WARMUP_SIZE),), daemon=True).start()
+    invalidationListener = None
+    if cacheService != None:
+        # the stocks whose model or data the scripts updated are dropped from the L1 cache, the answers generated
+        # from replaced documents from the RAG cache
+        invalidationListener = asyncio.create_task(cacheService.listen_invalidations(handle_invalidation))
+    yield
+    if invalidationListener != None:
+        invalidationListener.cancel()
+    if MODEL_REGISTRY_WARMUP_SIZE > 0:
+        # the request counts decide which stocks are warmed up on the next startup
+        modelRegistry.save_request_counts()
+    if cacheService != None:
+        await cacheService.close()
+
+app = FastAPI(lifespan=lifespan)
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "../../../data/processed")
 DATA_DIR = os.path.abspath(DATA_DIR)
 
+def invalidate_local_stocks(stocks: list[str] | None):
+    """removes the stocks' payloads from the L1 cache, all of them if stocks is None"""
+    if stocks == None:
+        localCache.clear()
+        return
+    for stock in stocks:
+        localCache.invalidate_prefix(f"stock/{stock}/")
+
+def handle_invalidation(message: dict | None):
+    """drops what an update of the scripts invalidated from the in-process caches, everything if message is None"""
+    if message == None:
+        localCache.clear()
+        ragCache.clear()
+    elif message["part"] == DOCUMENTS_VERSION:
+        ragCache.invalidate(message.get("sources", []))
+    else:
+        invalidate_local_stocks(message.get("stocks", []))
+
+def get_local_stock_version(company: str) -> tuple | None:
+    """
+    returns the modification times of the local files a stock's payload is computed from, None with models stored on Azure
+    (the L1 cache then relies on the invalidation channel and its TTL)
+    """
+    if MODEL_LOCATION != "LOCAL":
+        return None
+    data_path = get_partition_path(company, DATA_DIR)
+    if not data_path.is_file():
+        data_path = Path(DATA_DIR) / f"{company}.csv"
+    try:
+        data_version = os.stat(data_path).st_mtime_ns
+    except FileNotFoundError:
+        data_version = None
+    return get_local_artifacts_version(company), data_version
+
 # CORS config for frontend access
 app.add_middleware(
     CORSMiddleware,
@@ -38,46 +146,101 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_time(request: Request, call_next):
+    start_time = time.perf_counter()
+    response = await call_next(request)
+    # the route's template (e.g. /stock/{company}) rather than the path, so there is one series per endpoint
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start_time, method=request.method, route=route.path if route != None else "unmatched", status=response.status_code)
+    return response
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Endpoint exposing the latencies and counters of the backend in the Prometheus text format.
+    """
+    return PlainTextResponse(metricsRegistry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/companies")
-def list_companies():
+async def list_companies():
     key = "companies"
-    if (DISABLE_BACKEND_CACHE == False and cacheService != None and cacheService.exist(key) == True):
-        return json.loads(cacheService.get(key))
+    res = localCache.get(key)
+    if res != None:
+        return res
+    if (DISABLE_BACKEND_CACHE == False and cacheService != None):
+        cached = await cacheService.get_or_none(key)
+        if cached != None:
+            res = json.loads(cached)
+            localCache.set(key, res)
+            return res
     try:
         res = [f.replace(".csv.dvc", "") for f in os.listdir(DATA_DIR) if f.endswith(".csv.dvc")]
+        localCache.set(key, res)
         if (DISABLE_BACKEND_CACHE == False and cacheService != None):
-            cacheService.set(key, json.dumps(res))
+            await cacheService.set(key, json.dumps(res))
         return res
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/stock/{company}")
-def get_stock(company: str):
+async def get_stock(company: str, request: Request):
+    # the codec is part of the key so that changing it doesn't serve payloads in the previous format
+    key = f"stock/{company}/{cacheCodec.name}"
+
+    async def compute_payload() -> bytes:
+        # reading the data, forecasting and encoding are blocking, they are run in a thread so they don't stall the event loop
+        return await run_in_threadpool(lambda: cacheCodec.encode(compute_stock(company)))
+
+    version = get_local_stock_version(company)
+    payload = localCache.get(key, version)
+    if payload != None:
+        return encoded_response(payload, request)
+
+    # concurrent requests for the same stock share a single computation, which is done again when the scripts publish
+    # a new version of the stock's model or data
+    if (DISABLE_BACKEND_CACHE == False and cacheService != None):
+        payload = await cacheService.get_or_compute(key, compute_payload, get_stock_version_keys(company))
+    else:
+        payload = await stockSingleFlight.run(key, compute_payload)
+    localCache.set(key, payload, version)
+    return encoded_response(payload, request)
+
+def encoded_response(payload: bytes, request: Request) -> Response:
+    """sends a payload encoded by the cache codec as is, unless the client doesn't accept its format"""
+    accept = request.headers.get("accept", "*/*")
+    if cacheCodec.media_type not in accept and "*/*" not in accept:
+        # e.g. a client only accepting JSON while the payloads are Arrow streams
+        return Response(JsonCodec().encode(cacheCodec.decode(payload)), media_type=JsonCodec.media_type)
+    if cacheCodec.content_encoding != None:
+        if cacheCodec.content_encoding in request.headers.get("accept-encoding", ""):
+            return Response(payload, media_type=cacheCodec.media_type, headers={"Content-Encoding": cacheCodec.content_encoding, "Vary": "Accept-Encoding"})
+        payload = cacheCodec.decompress(payload)
+    return Response(payload, media_type=cacheCodec.media_type)
+
+def compute_stock(company: str) -> pd.DataFrame:
+    """returns the history of a company followed by its forecast"""
     WINDOW_SIZE = int(os.environ.get("WINDOW_SIZE")) 
-    key = f"stock/{company}"
-    if (DISABLE_BACKEND_CACHE == False and cacheService != None and cacheService.exist(key) == True):
-        return json.loads(cacheService.get(key))
-    
     dvc_file = os.path.join(DATA_DIR, f"{company}.csv.dvc")
     if not os.path.exists(dvc_file):
         raise HTTPException(status_code=404, detail="Company not found")
 
     try:
-        csv_file = dvc_file.replace(".dvc", "")
-        if not os.path.exists(csv_file):
-            subprocess.run(["dvc", "pull", dvc_file], check=True, capture_output=True, text=True)
-        df = pd.read_csv(csv_file, sep=";")
-        model = get_model(company, MODEL_LOCATION)
-        scaler = get_scaler(company, MODEL_LOCATION)
-
-        if (model == None or scaler == None):
-            raise HTTPException(status_code=403, detail="Model unavailable, Try later")
-        df["date"] = pd.to_datetime(df["date"], format='%Y-%m-%d', dayfirst=True)
+        pull_stock_data(company)
+        df = read_stock_data(company, DATA_DIR)
         most_recent_date = max(df["date"])
-        if (model.get_last_trained_date() < most_recent_date or model.get_last_trained_date() > most_recent_date):
-            raise HTTPException(status_code=403, detail="Model unavailable, Try later")
-        cloture_col = df["cloture"].values.reshape(-1,1)
-        predicted_data = predict(model, cloture_col, scaler, WINDOW_SIZE, WINDOW_SIZE)
+        # the forecast materialised at training time is used as long as the model was trained up to the latest data
+        predicted_data = get_forecast(company, most_recent_date, WINDOW_SIZE, MODEL_LOCATION)
+        record_cache_lookup("forecast_store", predicted_data is not None)
+        if predicted_data is None:
+            model, scaler = modelRegistry.get(company, most_recent_date)
+
+            if (model == None or scaler == None):
+                raise HTTPException(status_code=403, detail="Model unavailable, Try later")
+            if (model.get_last_trained_date() < most_recent_date or model.get_last_trained_date() > most_recent_date):
+                raise HTTPException(status_code=403, detail="Model unavailable, Try later")
+            cloture_col = df["cloture"].values.reshape(-1,1)
+            predicted_data = forecast([model], [cloture_col], [scaler], WINDOW_SIZE, WINDOW_SIZE)[0]
 
         ## Add the predicted data
         new_date = most_recent_date
@@ -85,17 +248,172 @@ def get_stock(company: str):
             new_date = new_date + relativedelta(days = 1)
             df.loc[len(df)] = [new_date, val, val, val, val, 0] # date;ouverture;haut;bas;cloture;volume
             
-        res = {"columns": df.columns.tolist(), "data": df.to_dict(orient="records")}
-        if (DISABLE_BACKEND_CACHE == False and cacheService != None):
-            cacheService.set(key, json.dumps(res))
-        return res
+        return df
     except subprocess.CalledProcessError as e:
-        error_message = f"Failed to pull data with DVC. stdout: {e.stdout.strip() if e.stdout else ''}, stderr: {e.stderr.strip() if e.stderr else ''}"
-        raise HTTPException(status_code=500, detail=error_message)
+        raise HTTPException(status_code=500, detail=get_dvc_error_message(e))
     except Exception as e:
-        print(str(e))
+        logger.exception(str(e))
         raise HTTPException(status_code=500, detail=str(e))
-    
+
+def pull_stock_data(company: str):
+    """pulls a known company's data with DVC unless it is already on disk"""
+    dvc_file = os.path.join(DATA_DIR, f"{company}.csv.dvc")
+    csv_file = dvc_file.replace(".dvc", "")
+    if not has_stock_data(company, DATA_DIR) and not os.path.exists(csv_file):
+        subprocess.run(["dvc", "pull", dvc_file], check=True, capture_output=True, text=True)
+
+def get_dvc_error_message(e: subprocess.CalledProcessError) -> str:
+    return f"Failed to pull data with DVC. stdout: {e.stdout.strip() if e.stdout else ''}, stderr: {e.stderr.strip() if e.stderr else ''}"
+
+class BatchForecastRequest(BaseModel):
+    symbols: list[str]
+    # the closing prices between these dates are sent with the forecasts, none if both are missing
+    start_date: date | None = None
+    end_date: date | None = None
+    # the number of forecasted days, WINDOW_SIZE if missing
+    horizon: int | None = None
+
+@app.post("/stocks/forecast")
+async def get_stocks_forecast(request: BatchForecastRequest):
+    """
+    Endpoint returning the forecasts of several stocks, and their closing prices between start_date and end_date if
+    either is given, in one compact response: {"horizon": ..., "stocks": {symbol: {"last_date", "forecast", "history"}}}.
+    A stock that can't be forecasted gets {"status", "error"} (the status /stock/{company} would answer with) instead
+    of failing the whole request.
+    """
+    horizon = request.horizon if request.horizon != None else int(os.environ.get("WINDOW_SIZE"))
+    symbols = list(dict.fromkeys(request.symbols))
+    if len(symbols) == 0 or len(symbols) > BATCH_FORECAST_MAX_SYMBOLS:
+        raise HTTPException(status_code=422, detail=f"Between 1 and {BATCH_FORECAST_MAX_SYMBOLS} symbols are expected")
+    if horizon < 1 or horizon > BATCH_FORECAST_MAX_HORIZON:
+        raise HTTPException(status_code=422, detail=f"The horizon must be between 1 and {BATCH_FORECAST_MAX_HORIZON} days")
+    if request.start_date != None and request.end_date != None and request.start_date > request.end_date:
+        raise HTTPException(status_code=422, detail="start_date is after end_date")
+
+    stocks = {}
+    for symbol in symbols:
+        if not os.path.exists(os.path.join(DATA_DIR, f"{symbol}.csv.dvc")):
+            stocks[symbol] = {"status": 404, "error": "Company not found"}
+    companies = [symbol for symbol in symbols if symbol not in stocks]
+    # under the stock's prefix so that its invalidation drops it from the L1 cache
+    keys = {company: f"stock/{company}/forecast/{horizon}" for company in companies}
+    localVersions = {company: get_local_stock_version(company) for company in companies}
+
+    missing = []
+    for company in companies:
+        entry = localCache.get(keys[company], localVersions[company])
+        if entry != None:
+            stocks[company] = entry
+        else:
+            missing.append(company)
+
+    # a single round trip to valkey for all the L1 misses and the versions they depend on
+    versions = {}
+    if missing and DISABLE_BACKEND_CACHE == False and cacheService != None:
+        cached = await cacheService.mget_entries([keys[company] for company in missing], [get_stock_version_keys(company) for company in missing])
+        for company, (payload, version) in zip(list(missing), cached):
+            versions[company] = version
+            if payload != None:
+                stocks[company] = json.loads(payload)
+                localCache.set(keys[company], stocks[company], localVersions[company])
+                missing.remove(company)
+
+    if missing:
+        computed = await run_in_threadpool(forecast_stocks, missing, horizon)
+        payloads = {}
+        for company, entry in computed.items():
+            stocks[company] = entry
+            if "error" in entry:
+                continue
+            localCache.set(keys[company], entry, localVersions[company])
+            if company in versions:
+                payloads[keys[company]] = (json.dumps(entry).encode('utf-8'), versions[company])
+        if payloads:
+            await cacheService.mset_entries(payloads)
+
+    if request.start_date != None or request.end_date != None:
+        forecasted = [company for company in companies if "error" not in stocks[company]]
+        histories = await run_in_threadpool(read_histories, forecasted, request.start_date, request.end_date)
+        for company, history in histories.items():
+            stocks[company] = history if "error" in history else {**stocks[company], **history}
+
+    return {"horizon": horizon, "stocks": {symbol: stocks[symbol] for symbol in symbols}}
+
+def forecast_stocks(companies: list[str], horizon: int) -> dict[str, dict]:
+    """
+    returns the forecast entry of each company ({"last_date", "forecast"}, or {"status", "error"}), from the materialised
+    forecast when possible. Each stock has its own model, so the others are forecasted one model at a time, as in
+    compute_stock; what the batch saves is the cache round trips and the thread hops of one request per stock.
+    """
+    WINDOW_SIZE = int(os.environ.get("WINDOW_SIZE"))
+    entries = {}
+    for company in companies:
+        try:
+            pull_stock_data(company)
+            df = read_stock_data(company, DATA_DIR, columns=["cloture"])
+            most_recent_date = max(df["date"])
+            predicted_data = get_forecast(company, most_recent_date, horizon, MODEL_LOCATION)
+            record_cache_lookup("forecast_store", predicted_data is not None)
+            if predicted_data is None:
+                model, scaler = modelRegistry.get(company, most_recent_date)
+                if (model == None or scaler == None or model.get_last_trained_date() != most_recent_date):
+                    raise HTTPException(status_code=403, detail="Model unavailable, Try later")
+                predicted_data = forecast([model], [df["cloture"].values.reshape(-1,1)], [scaler], horizon, WINDOW_SIZE)[0]
+            entries[company] = get_forecast_entry(most_recent_date, predicted_data)
+        except Exception as e:
+            entries[company] = get_error_entry(e)
+    return entries
+
+def read_histories(companies: list[str], start_date: date | None, end_date: date | None) -> dict[str, dict]:
+    """returns the closing prices of each company between the dates, as columns"""
+    histories = {}
+    for company in companies:
+        try:
+            pull_stock_data(company)
+            df = read_stock_data(company, DATA_DIR, columns=["cloture"], start_date=start_date, end_date=end_date)
+            histories[company] = {"history": {"date": df["date"].dt.strftime("%Y-%m-%d").tolist(), "cloture": df["cloture"].tolist()}}
+        except Exception as e:
+            histories[company] = get_error_entry(e)
+    return histories
+
+def get_forecast_entry(most_recent_date, predicted_data) -> dict:
+    return {"last_date": pd.Timestamp(most_recent_date).strftime("%Y-%m-%d"), "forecast": np.ravel(predicted_data).astype(float).tolist()}
+
+def get_error_entry(e: Exception) -> dict:
+    if isinstance(e, HTTPException):
+        return {"status": e.status_code, "error": e.detail}
+    if isinstance(e, subprocess.CalledProcessError):
+        return {"status": 500, "error": get_dvc_error_message(e)}
+    logger.exception(str(e))
+    return {"status": 500, "error": str(e)}
+
+
+def get_company_symbols() -> set[str]:
+    return {f.replace(".csv.dvc", "") for f in os.listdir(DATA_DIR) if f.endswith(".csv.dvc")}
+
+def lookup_rag_cache(query: str) -> tuple:
+    """
+    returns the key of the question in the RAG cache (its embedding and entities), its cached response (None on a miss)
+    and the cache version to store a new response with, the key is None if the cache is disabled or the question
+    couldn't be embedded
+    """
+    embedding = None
+    if ragCache.enabled:
+        try:
+            embedding = embed_question(query)
+        except Exception as e:
+            logger.warning(f"Failed to embed the question, skipping the RAG cache: {e}")
+    if embedding == None:
+        return None, None, None
+    # an answer is only shared by the questions about the same stocks and dates
+    entities = extract_entities(query, get_company_symbols())
+    return (embedding, entities), ragCache.get(embedding, entities), ragCache.get_version()
+
+def store_rag_response(key, response: dict, version):
+    if key != None:
+        embedding, entities = key
+        # off topic answers have no topic, they don't depend on the documents
+        ragCache.set(embedding, response, response.get("topic"), version, entities)
 
 @app.post("/rag")
 def rag_query(query: str = Body(...)):
@@ -103,8 +421,48 @@ def rag_query(query: str = Body(...)):
     Endpoint to handle RAG queries.
     """
     try:
+        key, response, version = lookup_rag_cache(query)
+        if response != None:
+            return {"response": response}
         input = {"question": query}
         response = agents.invoke(input, stream_mode="values")
+        store_rag_response(key, response, version)
         return {"response": response}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))    
+        raise HTTPException(status_code=500, detail=str(e))
+
+def format_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+def rag_events(query: str):
+    """yields the server-sent events of a streamed RAG query, see stream_answer"""
+    start = time.perf_counter()
+    try:
+        key, response, version = lookup_rag_cache(query)
+        if response != None:
+            RAG_TIME_TO_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start, source="cache")
+            yield format_event("token", {"text": response.get("generation", "")})
+            yield format_event("done", {"response": response})
+            return
+        firstToken = True
+        for event, data in stream_answer(agents, query):
+            if event == "token" and firstToken:
+                RAG_TIME_TO_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start, source="graph")
+                firstToken = False
+            if event == "done":
+                store_rag_response(key, data, version)
+                data = {"response": data}
+            yield format_event(event, data)
+    except Exception as e:
+        # the status was already sent, the error is the last event
+        logger.exception(str(e))
+        yield format_event("error", {"detail": str(e)})
+
+@app.post("/rag/stream")
+def rag_stream(query: str = Body(...)):
+    """
+    Endpoint streaming the answer to a RAG query as server-sent events: the progress of the graph's nodes, the tokens
+    of the answer as they're generated and the final state (the /rag response) in the done event.
+    """
+    # no buffering by the proxies, the events must reach the client as they're sent
+    return StreamingResponse(rag_events(query), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,338 @@
+import asyncio
+import json
+import logging
+import struct
+import time
+import uuid
+from typing import Awaitable, Callable
+import valkey.asyncio
+import valkey.exceptions
+
+from src.metrics import record_cache_lookup
+from .CacheCodec import CacheCodec, JsonCodec
+from .SingleFlight import SingleFlight
+from .CacheVersions import get_version, CACHE_INVALIDATION_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+# entries written by get_or_compute start with the time (epoch seconds) until which they are fresh and the length of the
+# version they were computed for, followed by the version and the payload
+ENTRY_HEADER = struct.Struct(">dH")
+# deletes the lock only if it's still the one that was taken, not one taken by another instance after it expired
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+LOCK_POLL_INTERVAL = 0.05
+
+
+class _Entry:
+    def __init__(self, freshUntil: float, version: str, payload: bytes):
+        self.freshUntil = freshUntil
+        self.version = version
+        self.payload = payload
+
+    @staticmethod
+    def parse(data: bytes | None):
+        if data == None:
+            return None
+        freshUntil, versionLength = ENTRY_HEADER.unpack_from(data)
+        version = data[ENTRY_HEADER.size:ENTRY_HEADER.size + versionLength].decode('utf-8')
+        return _Entry(freshUntil, version, data[ENTRY_HEADER.size + versionLength:])
+
+    def dump(self) -> bytes:
+        version = self.version.encode('utf-8')
+        return ENTRY_HEADER.pack(self.freshUntil, len(version)) + version + self.payload
+
+
+# Like the CacheService, the AsyncCacheService is a singleton so that every request shares the same connection pool
+class AsyncCacheService:
+    """
+    asyncio version of the CacheService backed by a bounded pool of connections.
+
+    A hit costs a single round trip (get_or_none) and the batch operations (mget, mset) are a single round trip too.
+    The cache is optional: when valkey can't be reached, lookups are misses and writes are dropped, and after a failure
+    the cache isn't called again before retryDelay seconds so that a dead cache doesn't cost a timeout per request.
+
+    get_or_compute protects expensive values from stampedes: a missing value is computed once per process (single-flight)
+    and once across the instances sharing valkey (a short lock), and a value older than its soft TTL is still served
+    while a single background task recomputes it (stale-while-revalidate), until its hard TTL removes it.
+    """
+
+    __shared_instance = None
+
+    @staticmethod
+    def getInstance(connectionString: str, isCacheDisabled: bool, expirationTime: int, maxConnections: int = 10, socketTimeout: float = 0.5, retryDelay: float = 30, codec: CacheCodec = None,
+                    softExpirationTime: int = None, lockTimeout: float = 30):
+        """Static Access Method"""
+        if isCacheDisabled:
+            return None
+        if AsyncCacheService.__shared_instance == None:
+            AsyncCacheService.__shared_instance = AsyncCacheService(connectionString, expirationTime, maxConnections, socketTimeout, retryDelay, codec, softExpirationTime, lockTimeout)
+        return AsyncCacheService.__shared_instance
+
+    def __init__(self, connectionString: str, expirationTime: int, maxConnections: int = 10, socketTimeout: float = 0.5, retryDelay: float = 30, codec: CacheCodec = None,
+                 softExpirationTime: int = None, lockTimeout: float = 30, client=None):
+        """
+        Args:
+            connectionString: the valkey url.
+            expirationTime: time to live in seconds of the keys that are set, the hard TTL of get_or_compute.
+            maxConnections: size of the connection pool, requests wait for a free connection when it's exhausted.
+            socketTimeout: timeout in seconds to connect and of each command.
+            retryDelay: seconds during which the cache is skipped after a failure.
+            codec: the codec the cached dataframes are encoded with, JSON by default.
+            softExpirationTime: seconds after which get_or_compute recomputes a value in the background while serving
+                the previous one, expirationTime (no stale-while-revalidate) by default.
+            lockTimeout: seconds after which the lock of a computation expires, it's also how long an instance waits
+                for the value another instance is computing before computing it itself.
+            client: a client to use instead of connecting to connectionString (e.g. an in-memory fake).
+        """
+        if client == None:
+            pool = valkey.asyncio.BlockingConnectionPool.from_url(
+                connectionString,
+                max_connections=maxConnections,
+                timeout=socketTimeout,
+                socket_timeout=socketTimeout,
+                socket_connect_timeout=socketTimeout
+            )
+            client = valkey.asyncio.Valkey(connection_pool=pool)
+        self.__client = client
+        self.codec = codec if codec != None else JsonCodec()
+        self.__expirationTime = expirationTime
+        self.__softExpirationTime = softExpirationTime if softExpirationTime != None else expirationTime
+        self.__lockTimeout = lockTimeout
+        self.__singleFlight = SingleFlight()
+        self.__refreshTasks = set()
+        self.__retryDelay = retryDelay
+        self.__unavailableUntil = 0
+
+    def isAvailable(self) -> bool:
+        """false while the cache is skipped after a failure"""
+        return time.monotonic() >= self.__unavailableUntil
+
+    async def ping(self) -> bool:
+        """checks if valkey can be reached"""
+        return await self.__call(lambda: self.__client.ping(), False) == True
+
+    async def get_or_none(self, key: str) -> str | None:
+        """gets a key's value in a single round trip, None if the key doesn't exist or the cache is unavailable"""
+        val = await self.__call(lambda: self.__client.get(key), None)
+        record_cache_lookup("backend", val != None)
+        return val.decode('utf-8') if val != None else None
+
+    async def set(self, key: str, val: str):
+        """set a key-val pair with an expiration date"""
+        await self.__call(lambda: self.__client.setex(key, self.__expirationTime, val), None)
+
+    async def get_payload(self, key: str) -> bytes | None:
+        """gets a payload encoded by the codec as is (no decoding), None if the key doesn't exist or the cache is unavailable"""
+        val = await self.__call(lambda: self.__client.get(key), None)
+        record_cache_lookup("backend", val != None)
+        return val
+
+    async def set_payload(self, key: str, data: bytes):
+        """set a key-payload pair with an expiration date, data being the output of codec.encode"""
+        await self.__call(lambda: self.__client.setex(key, self.__expirationTime, data), None)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[bytes]], versionKeys: list[str] = None) -> bytes:
+        """
+        Gets the payload of a key, computing and setting it with compute if it's missing or outdated.
+
+        Args:
+            key: the key of the payload.
+            compute: computes the payload.
+            versionKeys: keys holding the versions of what the payload is computed from (see CacheVersions), they are read
+                with the payload in the same round trip and a payload computed for other versions is computed again.
+
+        The entries set by get_or_compute hold their freshness and version, they must only be read by get_or_compute.
+        The exceptions of compute are raised to every caller waiting for it.
+        """
+        versionKeys = versionKeys if versionKeys != None else []
+        values = await self.__call(lambda: self.__client.mget([key] + versionKeys), None)
+        if values == None:
+            values = [None] * (1 + len(versionKeys))
+        version = get_version(values[1:])
+        entry = _Entry.parse(values[0])
+        upToDate = entry != None and entry.version == version
+        record_cache_lookup("backend", upToDate)
+        if upToDate:
+            if time.time() >= entry.freshUntil and not self.__singleFlight.is_running(f"{key}@{version}"):
+                self.__refresh(key, compute, version)
+            return entry.payload
+        return await self.__singleFlight.run(f"{key}@{version}", lambda: self.__compute_with_lock(key, compute, version, True))
+
+    async def mget_entries(self, keys: list[str], versionKeys: list[list[str]]) -> list[tuple[bytes | None, str]]:
+        """
+        Batch lookup of payloads set by get_or_compute or mset_entries: the payloads of all the keys and the versions
+        they depend on are read in a single round trip.
+
+        Args:
+            keys: the keys of the payloads.
+            versionKeys: the version keys of each payload (see get_or_compute).
+
+        Returns:
+            list[tuple]: for each key, its payload (None if it's missing, outdated or past its soft TTL, there is no
+            background refresh) and the current version to set a new payload with.
+        """
+        if not keys:
+            return []
+        flatKeys = keys + [versionKey for keysOfPayload in versionKeys for versionKey in keysOfPayload]
+        values = await self.__call(lambda: self.__client.mget(flatKeys), None)
+        if values == None:
+            values = [None] * len(flatKeys)
+        results = []
+        offset = len(keys)
+        for i, keysOfPayload in enumerate(versionKeys):
+            version = get_version(values[offset:offset + len(keysOfPayload)])
+            offset += len(keysOfPayload)
+            entry = _Entry.parse(values[i])
+            upToDate = entry != None and entry.version == version and time.time() < entry.freshUntil
+            record_cache_lookup("backend", upToDate)
+            results.append((entry.payload if upToDate else None, version))
+        return results
+
+    async def mset_entries(self, entries: dict[str, tuple[bytes, str]]):
+        """sets the payloads of several keys with the versions they were computed for in a single pipelined round trip"""
+        if not entries:
+            return
+        freshUntil = time.time() + self.__softExpirationTime
+
+        async def pipelined_setex():
+            async with self.__client.pipeline(transaction=False) as pipe:
+                for key, (payload, version) in entries.items():
+                    pipe.setex(key, self.__expirationTime, _Entry(freshUntil, version, payload).dump())
+                return await pipe.execute()
+
+        await self.__call(pipelined_setex, None)
+
+    async def mget(self, keys: list[str]) -> list[str | None]:
+        """gets the values of several keys in a single round trip, None for the missing ones"""
+        if not keys:
+            return []
+        vals = await self.__call(lambda: self.__client.mget(keys), None)
+        if vals == None:
+            vals = [None] * len(keys)
+        for val in vals:
+            record_cache_lookup("backend", val != None)
+        return [val.decode('utf-8') if val != None else None for val in vals]
+
+    async def mset(self, mapping: dict[str, str]):
+        """sets several key-val pairs with an expiration date in a single pipelined round trip"""
+        if not mapping:
+            return
+
+        async def pipelined_setex():
+            async with self.__client.pipeline(transaction=False) as pipe:
+                for key, val in mapping.items():
+                    pipe.setex(key, self.__expirationTime, val)
+                return await pipe.execute()
+
+        await self.__call(pipelined_setex, None)
+
+    async def listen_invalidations(self, callback: Callable[[dict | None], None]):
+        """
+        Listens to the invalidation channel the scripts publish to until it's cancelled, calling callback with each
+        message, a dict with the updated part and its stocks or sources (see CacheVersions). The channel is subscribed
+        again after a failure, and callback is called with None when it's (re)subscribed since the messages published
+        in between are lost. It holds a connection of the pool.
+        """
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.__client.pubsub()
+                await pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+                callback(None)
+                while True:
+                    # polled with a timeout because the connections' socket timeout is too short to block on
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message == None:
+                        continue
+                    try:
+                        invalidation = json.loads(message["data"])
+                    except ValueError:
+                        invalidation = None
+                    if not isinstance(invalidation, dict) or "part" not in invalidation:
+                        logger.warning(f"Ignoring an invalid cache invalidation message: {message['data']}")
+                        continue
+                    callback(invalidation)
+            except (valkey.exceptions.ConnectionError, valkey.exceptions.TimeoutError, asyncio.TimeoutError, OSError) as e:
+                logger.warning(f"Lost the cache invalidation channel, subscribing again in {self.__retryDelay} s: {e}")
+            finally:
+                if pubsub != None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+            await asyncio.sleep(self.__retryDelay)
+
+    async def close(self):
+        """closes the connections of the pool, they are opened again by the next command"""
+        try:
+            await self.__client.aclose()
+        except Exception as e:
+            logger.warning(f"Failed to close the cache connections: {e}")
+
+    def __refresh(self, key: str, compute: Callable[[], Awaitable[bytes]], version: str):
+        """recomputes a stale value in the background, the task is kept referenced until it's done"""
+        task = asyncio.ensure_future(self.__singleFlight.run(f"{key}@{version}", lambda: self.__compute_with_lock(key, compute, version, False)))
+        self.__refreshTasks.add(task)
+
+        def done(task):
+            self.__refreshTasks.discard(task)
+            if not task.cancelled() and task.exception() != None:
+                logger.error(f"Failed to refresh {key}: {task.exception()}")
+
+        task.add_done_callback(done)
+
+    async def __compute_with_lock(self, key: str, compute: Callable[[], Awaitable[bytes]], version: str, wait: bool) -> bytes | None:
+        """
+        computes and sets a value while holding its lock, if another instance holds it the value it sets is awaited
+        (returns None without waiting if wait is false)
+        """
+        lockKey = f"lock:{key}"
+        token = uuid.uuid4().hex
+        # SET NX returns None when the lock is already taken, the default False means the cache is unavailable
+        locked = await self.__call(lambda: self.__client.set(lockKey, token, nx=True, px=int(self.__lockTimeout * 1000)), False)
+        if locked == None:
+            if not wait:
+                return None
+            payload = await self.__wait_for(key, version)
+            if payload != None:
+                return payload
+            logger.warning(f"{key} wasn't computed by the instance holding its lock within {self.__lockTimeout} s, computing it")
+        try:
+            payload = await compute()
+            entry = _Entry(time.time() + self.__softExpirationTime, version, payload)
+            await self.__call(lambda: self.__client.setex(key, self.__expirationTime, entry.dump()), None)
+            return payload
+        finally:
+            if locked == True:
+                await self.__call(lambda: self.__client.eval(RELEASE_LOCK_SCRIPT, 1, lockKey, token), None)
+
+    async def __wait_for(self, key: str, version: str) -> bytes | None:
+        """polls a key until it's set for the given version or the lock timeout elapses"""
+        deadline = time.monotonic() + self.__lockTimeout
+        while time.monotonic() < deadline and self.isAvailable():
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+            entry = _Entry.parse(await self.__call(lambda: self.__client.get(key), None))
+            if entry != None and entry.version == version:
+                return entry.payload
+        return None
+
+    async def __call(self, command, default):
+        """runs a command, returning default instead of failing when the cache is unavailable or rejects the command"""
+        if not self.isAvailable():
+            return default
+        try:
+            return await command()
+        except (valkey.exceptions.ConnectionError, valkey.exceptions.TimeoutError, asyncio.TimeoutError, OSError) as e:
+            logger.warning(f"Cache unavailable, skipping it for {self.__retryDelay} s: {e}")
+            self.__unavailableUntil = time.monotonic() + self.__retryDelay
+            return default
+        except valkey.exceptions.ValkeyError as e:
+            # the server is up but refused the command (OOM at maxmemory, READONLY replica, MISCONF...), the request
+            # still gets its payload and the next commands are tried again
+            logger.warning(f"Cache command failed, skipping it: {e}")
+            return default
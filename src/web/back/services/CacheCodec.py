@@ -0,0 +1,100 @@
+import gzip
+import orjson
+import pandas as pd
+import pyarrow as pa
+
+
+class CacheCodec:
+    """
+    Encodes a dataframe into the bytes stored in the cache, which are also the body of the response.
+
+    A cache hit is sent as is with the codec's media type (and content encoding), so the payload is only serialised
+    when it's computed and never parsed back by the backend.
+    """
+
+    name = None
+    media_type = None
+    content_encoding = None
+
+    def encode(self, df: pd.DataFrame) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, data: bytes) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def decompress(self, data: bytes) -> bytes:
+        """returns the body without its content encoding, for the clients that don't accept it"""
+        return data
+
+
+class JsonCodec(CacheCodec):
+    """{"columns": [...], "data": [{column: value}, ...]}, the row oriented JSON the frontend reads"""
+
+    name = "json"
+    media_type = "application/json"
+
+    def encode(self, df: pd.DataFrame) -> bytes:
+        columns = df.columns.tolist()
+        values = []
+        for column in columns:
+            if pd.api.types.is_datetime64_any_dtype(df[column]):
+                values.append(df[column].dt.strftime("%Y-%m-%dT%H:%M:%S").tolist())
+            else:
+                values.append(df[column].tolist())
+        data = [dict(zip(columns, row)) for row in zip(*values)]
+        return orjson.dumps({"columns": columns, "data": data}, option=orjson.OPT_SERIALIZE_NUMPY)
+
+    def decode(self, data: bytes) -> pd.DataFrame:
+        payload = orjson.loads(self.decompress(data))
+        return pd.DataFrame(payload["data"], columns=payload["columns"])
+
+
+class GzipJsonCodec(JsonCodec):
+    """the JSON payload compressed with gzip, sent with Content-Encoding: gzip which every http client decodes"""
+
+    name = "json-gzip"
+    content_encoding = "gzip"
+
+    def __init__(self, level: int = 6):
+        self.level = level
+
+    def encode(self, df: pd.DataFrame) -> bytes:
+        return gzip.compress(super().encode(df), compresslevel=self.level, mtime=0)
+
+    def decompress(self, data: bytes) -> bytes:
+        return gzip.decompress(data)
+
+
+class ArrowCodec(CacheCodec):
+    """columnar Arrow IPC stream with compressed buffers (zstd or lz4), read with pyarrow.ipc.open_stream"""
+
+    media_type = "application/vnd.apache.arrow.stream"
+
+    def __init__(self, compression: str = "zstd"):
+        self.name = f"arrow-{compression}"
+        self.compression = compression
+
+    def encode(self, df: pd.DataFrame) -> bytes:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema, options=pa.ipc.IpcWriteOptions(compression=self.compression)) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    def decode(self, data: bytes) -> pd.DataFrame:
+        return pa.ipc.open_stream(data).read_pandas()
+
+
+CACHE_CODECS = {
+    "json": JsonCodec,
+    "json-gzip": GzipJsonCodec,
+    "arrow-zstd": lambda: ArrowCodec("zstd"),
+    "arrow-lz4": lambda: ArrowCodec("lz4"),
+}
+
+
+def get_cache_codec(name: str) -> CacheCodec:
+    """returns the codec with the given name (one of CACHE_CODECS)"""
+    if name not in CACHE_CODECS:
+        raise ValueError(f"Unknown cache codec {name}, expected one of {', '.join(CACHE_CODECS)}")
+    return CACHE_CODECS[name]()
@@ -1,6 +1,9 @@
 import valkey
 import valkey.exceptions
 
+from src.metrics import record_cache_lookup
+from .CacheCodec import CacheCodec, JsonCodec
+
 
 # The CacheService must be a singleton because the valkey client isn't :(
 class CacheService:
@@ -8,18 +11,19 @@ class CacheService:
     __shared_instance = None
 
     @staticmethod
-    def getInstance(connectionString: str, isCacheDisabled: bool, expirationTime: int):
+    def getInstance(connectionString: str, isCacheDisabled: bool, expirationTime: int, codec: CacheCodec = None):
         """Static Access Method"""
         if isCacheDisabled:
             return None
         if CacheService.__shared_instance == None:
-            cacheService = CacheService(connectionString, expirationTime)
+            cacheService = CacheService(connectionString, expirationTime, codec)
             CacheService.__shared_instance = cacheService
             return cacheService
         return CacheService.__shared_instance
 
-    def __init__(self, connectionString: str, expirationTime: int):
-        """virtual private constructor"""
+    def __init__(self, connectionString: str, expirationTime: int, codec: CacheCodec = None):
+        """virtual private constructor, the codec encodes the dataframes stored with set_payload (JSON by default)"""
+        self.codec = codec if codec != None else JsonCodec()
         try:
             valkey_client = valkey.from_url(connectionString)
             valkey_client.ping() ## Test if the connectionString works, throws an exception if the connection failed
@@ -39,9 +43,21 @@ class CacheService:
         """set a key-val pair with an expiration date"""
         self.__client.setex(key, self.__expirationTime, val)
 
+    def get_payload(self, key: str) -> bytes | None:
+        """gets a payload encoded by the codec as is, None if the key doesn't exist"""
+        val = self.__client.get(key)
+        record_cache_lookup("backend", val != None)
+        return val
+
+    def set_payload(self, key: str, data: bytes):
+        """set a key-payload pair with an expiration date, data being the output of codec.encode"""
+        self.__client.setex(key, self.__expirationTime, data)
+
     def exist(self, key: str) -> bool:
-        """checks if a key exists"""
-        return self.__client.exists(key) == 1
+        """checks if a key exists, it's how the backend looks a key up so it's counted as a hit or a miss"""
+        exists = self.__client.exists(key) == 1
+        record_cache_lookup("backend", exists)
+        return exists
     
     def getExpirationTime(self) -> str:
         """returns the expiration time in a readable date format"""
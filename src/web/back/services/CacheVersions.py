@@ -0,0 +1,108 @@
+"""
+Versions of the artifacts the backend's cached payloads are computed from.
+
+The scripts writing new artifacts publish their versions to valkey with publish_stock_versions: train_model.py the
+last trained date of every model it saved and process_data.py the content hash of every stock's data it updated.
+The backend reads a stock's versions with its cached payload (AsyncCacheService.get_or_compute) and computes the
+payload again as soon as one of them changed, so the cache's TTL can be long without ever serving an old forecast.
+
+The scripts storing new documents in the RAG's vector store (store_stock_data.py and news_scraper.py) publish their
+sources with publish_document_sources, the answers cached from the previous documents are then dropped.
+"""
+import json
+import logging
+import os
+import valkey
+
+logger = logging.getLogger(__name__)
+
+MODEL_VERSION = "model"
+DATA_VERSION = "data"
+DOCUMENTS_VERSION = "documents"
+# the stocks whose versions changed are also published on this channel, for the caches that don't read the versions
+CACHE_INVALIDATION_CHANNEL = "cache-invalidation"
+
+
+def get_stock_version_keys(stock: str) -> list[str]:
+    """returns the keys of the versions a stock's payloads depend on"""
+    return [f"version/stock/{stock}/{part}" for part in (MODEL_VERSION, DATA_VERSION)]
+
+
+def get_version(values: list) -> str:
+    """combines the values of version keys into a single version, a missing one counting as empty"""
+    return "|".join(value.decode('utf-8') if isinstance(value, bytes) else (value or "") for value in values)
+
+
+def publish_stock_versions(part: str, versions: dict[str, str], connectionString: str = None, timeout: float = 5) -> bool:
+    """
+    Sets the new versions of the stocks' model or data, invalidating the payloads cached for the previous ones.
+
+    This is the invalidation hook of the scripts, it's best effort: a failure is logged but doesn't fail the script,
+    the payloads then expire with their TTL.
+
+    Args:
+        part: MODEL_VERSION or DATA_VERSION.
+        versions: dict of stock symbol to its new version.
+        connectionString: the valkey url, read from BACKEND_CACHE_CONNECTION_STRING if not given. Nothing is published
+            without one or if DISABLE_BACKEND_CACHE is true.
+        timeout: timeout in seconds to connect and of each command.
+
+    Returns:
+        bool: whether the versions were published.
+    """
+    if part not in (MODEL_VERSION, DATA_VERSION):
+        raise ValueError(f"Unknown version {part}, expected {MODEL_VERSION} or {DATA_VERSION}")
+    connectionString = _get_connection_string(connectionString)
+    if not connectionString or not versions:
+        return False
+
+    try:
+        client = valkey.from_url(connectionString, socket_timeout=timeout, socket_connect_timeout=timeout)
+        try:
+            # all the versions are set in a single round trip
+            pipe = client.pipeline(transaction=False)
+            for stock, version in versions.items():
+                key = get_stock_version_keys(stock)[0 if part == MODEL_VERSION else 1]
+                pipe.set(key, str(version))
+            pipe.publish(CACHE_INVALIDATION_CHANNEL, json.dumps({"part": part, "stocks": list(versions)}))
+            pipe.execute()
+        finally:
+            client.close()
+    except Exception as e:
+        logger.warning(f"Failed to publish the {part} versions of {len(versions)} stocks, their cached payloads will expire with their TTL: {e}")
+        return False
+    logger.info(f"Published the {part} versions of {len(versions)} stocks")
+    return True
+
+
+def publish_document_sources(sources: list[str], connectionString: str = None, timeout: float = 5) -> bool:
+    """
+    Publishes the sources ('news', 'stocks') of the documents just stored in the vector store, the backend drops the
+    RAG answers generated from the previous ones. Like publish_stock_versions it's best effort.
+
+    Returns:
+        bool: whether the sources were published.
+    """
+    connectionString = _get_connection_string(connectionString)
+    if not connectionString or not sources:
+        return False
+
+    try:
+        client = valkey.from_url(connectionString, socket_timeout=timeout, socket_connect_timeout=timeout)
+        try:
+            client.publish(CACHE_INVALIDATION_CHANNEL, json.dumps({"part": DOCUMENTS_VERSION, "sources": list(sources)}))
+        finally:
+            client.close()
+    except Exception as e:
+        logger.warning(f"Failed to publish the new {', '.join(sources)} documents, the cached answers will expire with their TTL: {e}")
+        return False
+    logger.info(f"Published the new {', '.join(sources)} documents")
+    return True
+
+def _get_connection_string(connectionString: str | None) -> str | None:
+    """returns the valkey url the scripts publish to, None if DISABLE_BACKEND_CACHE is true"""
+    if connectionString == None:
+        if os.environ.get("DISABLE_BACKEND_CACHE", "true").lower() == "true":
+            return None
+        connectionString = os.environ.get("BACKEND_CACHE_CONNECTION_STRING")
+    return connectionString
@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+
+from src.metrics import record_cache_lookup
+
+
+class _Entry:
+    def __init__(self, value, version, expiresAt: float):
+        self.value = value
+        self.version = version
+        self.expiresAt = expiresAt
+
+
+class LocalCache:
+    """
+    In-process LRU of ready to send values with a time to live, the L1 tier in front of valkey.
+
+    It needs no valkey so it's also the backend's only cache when DISABLE_BACKEND_CACHE is true (single node deployments).
+    An entry can be stored with a version, it's a miss when looked up with another one (e.g. the artifacts changed).
+    Its lookups are counted under the cache label "l1", valkey's under "backend".
+    """
+
+    def __init__(self, maxEntries: int, ttl: float):
+        """
+        Args:
+            maxEntries: maximum number of entries, the least recently used one is evicted beyond it. 0 disables the cache.
+            ttl: seconds after which an entry expires, it bounds how long a missed invalidation can serve an old value.
+        """
+        self.__maxEntries = maxEntries
+        self.__ttl = ttl
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key: str, version=None):
+        """returns the value of a key, None if it's missing, expired or stored with another version"""
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry != None and (entry.expiresAt <= time.monotonic() or entry.version != version):
+                del self.__entries[key]
+                entry = None
+            if entry != None:
+                self.__entries.move_to_end(key)
+        record_cache_lookup("l1", entry != None)
+        return entry.value if entry != None else None
+
+    def set(self, key: str, value, version=None):
+        if self.__maxEntries <= 0:
+            return
+        with self.__lock:
+            self.__entries[key] = _Entry(value, version, time.monotonic() + self.__ttl)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__maxEntries:
+                self.__entries.popitem(last=False)
+
+    def invalidate(self, key: str):
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+    def invalidate_prefix(self, prefix: str):
+        """removes the entries whose key starts with prefix (e.g. all the formats of a stock)"""
+        with self.__lock:
+            for key in [key for key in self.__entries if key.startswith(prefix)]:
+                del self.__entries[key]
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
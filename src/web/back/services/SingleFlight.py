@@ -0,0 +1,24 @@
+import asyncio
+from typing import Awaitable, Callable
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent computations of the same key within the process: the first caller starts the computation
+    and the callers arriving while it runs await its result (or its exception) instead of starting their own.
+    """
+
+    def __init__(self):
+        self.__inflight = {}
+
+    def is_running(self, key: str) -> bool:
+        return key in self.__inflight
+
+    async def run(self, key: str, compute: Callable[[], Awaitable]):
+        task = self.__inflight.get(key)
+        if task == None:
+            task = asyncio.ensure_future(compute())
+            self.__inflight[key] = task
+            task.add_done_callback(lambda done: self.__inflight.pop(key) if self.__inflight.get(key) is done else None)
+        # shielded so that a caller going away (e.g. a client disconnecting) doesn't cancel the computation of the others
+        return await asyncio.shield(task)
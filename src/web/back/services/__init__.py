@@ -1 +1,10 @@
-from .CacheService import CacheService
\ No newline at end of file
+from src.lazy_imports import lazy_exports
+
+lazy_exports(__name__, {
+    ".CacheCodec": ["CacheCodec", "JsonCodec", "GzipJsonCodec", "ArrowCodec", "get_cache_codec"],
+    ".CacheService": ["CacheService"],
+    ".AsyncCacheService": ["AsyncCacheService"],
+    ".SingleFlight": ["SingleFlight"],
+    ".CacheVersions": ["get_stock_version_keys", "publish_stock_versions", "publish_document_sources", "MODEL_VERSION", "DATA_VERSION", "DOCUMENTS_VERSION"],
+    ".LocalCache": ["LocalCache"],
+})
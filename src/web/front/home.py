@@ -3,6 +3,7 @@ from dotenv import load_dotenv
 import streamlit as st
 from requests_cache import CachedSession
 import pandas as pd
+import pyarrow as pa
 import plotly.express as px
 
 # Load environment variables
@@ -111,7 +112,10 @@ with st.spinner(f"Loading {current_page}..."):
         if company:
             with st.spinner("Fetching data..."):
                 res = cache_session.get(f"{BACKEND_URL}/stock/{company}")
-                df = pd.DataFrame(res.json()["data"])
+                if res.headers.get("Content-Type", "").startswith("application/vnd.apache.arrow.stream"):
+                    df = pa.ipc.open_stream(res.content).read_pandas()
+                else:
+                    df = pd.DataFrame(res.json()["data"])
                 df["date"] = pd.to_datetime(df["date"])
                 df.set_index("date", inplace=True)
                 df_pred = df.tail(WINDOW_SIZE).copy()
@@ -1,9 +1,8 @@
 import streamlit as st
-import time
-import asyncio
 import gc
 import torch
 import os
+import json
 import requests
 
 from dotenv import load_dotenv
@@ -13,14 +12,32 @@ BACKEND_URL = os.environ.get("BACKEND_URL")
 
 torch.classes.__path__ = []
 
-async def get_response(prompt):
-    res = requests.post(
-            f"{BACKEND_URL}/rag",
-            headers={"Content-Type": "text/plain"},
+# what the assistant is doing while the answer hasn't started, per node of the RAG graph
+NODE_STATUS = {
+    "analyze_question": "Searching the knowledge base...",
+    "classify_question": "Searching the knowledge base...",
+    "retrieve": "Writing the answer...",
+    "transform_query": "Rephrasing the question...",
+}
+
+def stream_response(prompt):
+    """
+    Posts the question to the streaming RAG endpoint and yields its server-sent events as (event, data) tuples.
+    """
+    with requests.post(
+            f"{BACKEND_URL}/rag/stream",
+            headers={"Content-Type": "text/plain", "Accept": "text/event-stream"},
             data=prompt,
             stream=True,
-    )
-    return res.json()
+    ) as res:
+        res.raise_for_status()
+        event = None
+        for line in res.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: ") and event != None:
+                yield event, json.loads(line[len("data: "):])
+                event = None
 
 def reset_chat():
     st.session_state.active_chat = None
@@ -97,22 +114,32 @@ if prompt := st.chat_input("Ask me"):
 
     # Display assistant response in chat message container
     with st.chat_message("assistant"):
-        full_response = "" 
+        full_response = ""
+        status_placeholder = st.empty()
         message_placeholder = st.empty()
-        with st.spinner("Thinking...", show_time=True):
-            res = asyncio.run(get_response(prompt))
-
-        response = res['response']['generation']
-        result = res['response']['generation'].split(' ')
-        for i, word in enumerate(result):
-            full_response += word
-            if i < len(result) - 1: 
-                full_response += ' '
-
-            message_placeholder.markdown(full_response + "▌")
-            time.sleep(0.1)
-
+        status_placeholder.caption("Thinking...")
+        try:
+            # the answer is shown token by token as the backend generates it
+            for event, data in stream_response(prompt):
+                if event == "token":
+                    status_placeholder.empty()
+                    full_response += data["text"]
+                    message_placeholder.markdown(full_response + "▌")
+                elif event == "reset":
+                    # the answer was graded as not useful, a new one is generated
+                    full_response = ""
+                    message_placeholder.empty()
+                elif event == "node" and not full_response and data["node"] in NODE_STATUS:
+                    status_placeholder.caption(NODE_STATUS[data["node"]])
+                elif event == "done":
+                    full_response = data["response"].get("generation", full_response)
+                elif event == "error":
+                    full_response = f"Sorry, something went wrong: {data['detail']}"
+        except requests.RequestException as e:
+            full_response = f"Sorry, the assistant is unavailable: {e}"
+        status_placeholder.empty()
         message_placeholder.markdown(full_response)
+        response = full_response
 
     # Add assistant response to chat history
     st.session_state.messages.append({"role": "assistant", "content": response})
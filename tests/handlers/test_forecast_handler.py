@@ -0,0 +1,57 @@
+import pytest
+import numpy as np
+import pandas as pd
+from unittest.mock import patch, MagicMock
+
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.handlers import forecast_handler
+from src.handlers.forecast_handler import get_forecast, _write_forecast
+
+@pytest.fixture
+def azure(tmp_path, monkeypatch):
+    """an Azure ML client whose latest forecast asset is the one written in its registry directory"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(forecast_handler, "FORECAST_LOCAL_PATH", tmp_path / "store")
+    monkeypatch.setattr(forecast_handler, "_azureMisses", {})
+    registry = tmp_path / "registry"
+    registry.mkdir()
+    client = MagicMock()
+    client.models.get.return_value.version = "1"
+    def download(name, version, download_path):
+        target = os.path.join(download_path, name)
+        os.makedirs(target, exist_ok=True)
+        with open(registry / "forecast.npz", "rb") as src, open(os.path.join(target, "forecast.npz"), "wb") as dst:
+            dst.write(src.read())
+    client.models.download.side_effect = download
+    with patch.object(forecast_handler, "_get_ml_client", return_value=client):
+        yield client, registry
+
+def test_azure_forecast_is_downloaded_once(azure):
+    client, registry = azure
+    _write_forecast(str(registry / "forecast.npz"), [101, 102], pd.to_datetime("2020-01-01"))
+
+    first = get_forecast("AB", pd.to_datetime("2020-01-01"), 2, "AZURE")
+    second = get_forecast("AB", pd.to_datetime("2020-01-01"), 1, "AZURE")
+
+    assert first.tolist() == [101, 102]
+    assert second.tolist() == [101]
+    # the second lookup is served by the local store
+    client.models.download.assert_called_once()
+    client.models.get.assert_called_once()
+
+def test_azure_stale_forecast_is_checked_again_after_the_recheck_delay(azure):
+    client, registry = azure
+    _write_forecast(str(registry / "forecast.npz"), [101], pd.to_datetime("2020-01-01"))
+
+    # the data moved past the model's last trained date
+    assert get_forecast("AB", pd.to_datetime("2020-01-02"), 1, "AZURE") is None
+    assert get_forecast("AB", pd.to_datetime("2020-01-02"), 1, "AZURE") is None
+    assert client.models.get.call_count == 1
+
+    # a retrained model registered a new version
+    _write_forecast(str(registry / "forecast.npz"), [103], pd.to_datetime("2020-01-02"))
+    client.models.get.return_value.version = "2"
+    with patch.object(forecast_handler, "AZURE_RECHECK_SECONDS", 0):
+        assert get_forecast("AB", pd.to_datetime("2020-01-02"), 1, "AZURE").tolist() == [103]
+    assert client.models.download.call_count == 2
@@ -0,0 +1,110 @@
+import threading
+import time
+import pytest
+import numpy as np
+from datetime import datetime
+
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src import ModelRegistry
+
+class FakeModel:
+    def __init__(self, size):
+        # the registry estimates the size of the pair from the arrays it holds
+        self.weights = np.zeros(size, dtype=np.uint8)
+
+    def get_last_trained_date(self):
+        return datetime(2024, 1, 1)
+
+def make_loader(sizes=None, delay=0):
+    calls = []
+    def load(stock):
+        calls.append(stock)
+        time.sleep(delay)
+        return FakeModel((sizes or {}).get(stock, 10)), "scaler"
+    return load, calls
+
+def test_get_caches_pairs():
+    load, calls = make_loader()
+    registry = ModelRegistry(10_000, load)
+
+    first = registry.get("AB")
+    second = registry.get("AB")
+
+    assert first[0] is second[0]
+    assert calls == ["AB"]
+
+def test_unavailable_pairs_are_not_cached():
+    calls = []
+    def load(stock):
+        calls.append(stock)
+        return None, None
+    registry = ModelRegistry(10_000, load)
+
+    assert registry.get("AB") == (None, None)
+    registry.get("AB")
+
+    assert calls == ["AB", "AB"]
+
+def test_memory_budget_evicts_least_recently_used():
+    load, calls = make_loader(sizes={"AB": 4000, "AL": 4000, "BT": 4000})
+    registry = ModelRegistry(10_000, load)
+
+    registry.get("AB")
+    registry.get("AL")
+    registry.get("AB")
+    registry.get("BT")
+
+    assert registry.contains("AB")
+    assert registry.contains("BT")
+    assert not registry.contains("AL")
+    assert registry.get_size() <= 10_000
+
+def test_version_change_invalidates_entry():
+    load, calls = make_loader()
+    version = {"AB": (1, 1)}
+    registry = ModelRegistry(10_000, load, lambda stock: version[stock])
+
+    registry.get("AB")
+    registry.get("AB")
+    version["AB"] = (2, 1)
+    registry.get("AB")
+
+    assert calls == ["AB", "AB"]
+
+def test_last_trained_date_change_invalidates_entry_without_version():
+    load, calls = make_loader()
+    registry = ModelRegistry(10_000, load)
+
+    registry.get("AB", datetime(2024, 1, 1))
+    registry.get("AB", datetime(2024, 1, 2))
+
+    assert calls == ["AB", "AB"]
+
+def test_concurrent_loads_are_coalesced():
+    load, calls = make_loader(delay=0.1)
+    registry = ModelRegistry(10_000, load)
+
+    threads = [threading.Thread(target=registry.get, args=("AB",)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ["AB"]
+
+def test_warm_up_with_most_requested(tmp_path):
+    load, calls = make_loader()
+    registry = ModelRegistry(10_000, load)
+    registry.get("AL")
+    registry.get("AB")
+    registry.get("AB")
+    path = tmp_path / "requests.json"
+    registry.save_request_counts(path)
+
+    assert ModelRegistry.get_most_requested(1, path) == ["AB"]
+
+    new_registry = ModelRegistry(10_000, load)
+    new_registry.warm_up(ModelRegistry.get_most_requested(1, path))
+    assert new_registry.contains("AB")
+    assert not new_registry.contains("AL")
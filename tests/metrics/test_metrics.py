@@ -0,0 +1,75 @@
+import pytest
+import time
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from src.metrics import Counter, Histogram, MetricsRegistry
+
+def test_counter_per_label_set():
+    counter = Counter("requests", "Requests", ("cache", "result"))
+    counter.inc(cache="backend", result="hit")
+    counter.inc(2, cache="backend", result="hit")
+    counter.inc(cache="backend", result="miss")
+
+    assert counter.get(cache="backend", result="hit") == 3
+    assert counter.get(cache="backend", result="miss") == 1
+    assert counter.get(cache="other", result="hit") == 0
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency", "Latency", ("node",), buckets=(0.1, 1.0))
+    for value in [0.05, 0.5, 0.7, 3]:
+        histogram.observe(value, node="retrieve")
+
+    lines = histogram.render()
+
+    assert 'latency_bucket{node="retrieve",le="0.1"} 1' in lines
+    assert 'latency_bucket{node="retrieve",le="1.0"} 3' in lines
+    assert 'latency_bucket{node="retrieve",le="+Inf"} 4' in lines
+    assert 'latency_count{node="retrieve"} 4' in lines
+    assert histogram.get_sum(node="retrieve") == pytest.approx(4.25)
+
+def test_histogram_timer_as_context_manager_and_decorator():
+    histogram = Histogram("duration", "Duration", ("name",))
+
+    with histogram.time(name="block"):
+        time.sleep(0.01)
+
+    @histogram.time(name="function")
+    def function():
+        return 42
+
+    assert function() == 42
+    assert function.__name__ == "function"
+    assert histogram.get_count(name="block") == 1
+    assert histogram.get_sum(name="block") >= 0.01
+    assert histogram.get_count(name="function") == 1
+
+def test_timer_records_failed_calls():
+    histogram = Histogram("duration", "Duration")
+
+    with pytest.raises(ValueError):
+        with histogram.time():
+            raise ValueError()
+
+    assert histogram.get_count() == 1
+
+def test_registry_returns_existing_metric_and_renders_them():
+    registry = MetricsRegistry()
+    counter = registry.counter("lookups", "Lookups", ("result",))
+    assert registry.counter("lookups", "Lookups", ("result",)) is counter
+    counter.inc(result="hit")
+    registry.histogram("load_seconds", "Load time").observe(0.2)
+
+    text = registry.render()
+
+    assert "# TYPE lookups counter" in text
+    assert 'lookups_total{result="hit"} 1' in text
+    assert "# TYPE load_seconds histogram" in text
+    assert "load_seconds_count 1" in text
+
+    registry.clear()
+    assert counter.get(result="hit") == 0
+
+def test_registry_singleton():
+    assert MetricsRegistry.getInstance() is MetricsRegistry.getInstance()
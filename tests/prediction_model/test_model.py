@@ -0,0 +1,17 @@
+import numpy as np
+import pytest
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from src import LSTMModel, GRUModel
+
+@pytest.mark.parametrize("model_class", [LSTMModel, GRUModel])
+def test_predict_step_matches_predict(model_class):
+    model = model_class("AB")
+    windows = np.random.rand(3, 5, 1)
+
+    direct = model.predict_step(windows)
+
+    assert direct.shape == (3,)
+    assert direct == pytest.approx(np.asarray(model.predict(windows)).reshape(-1), abs=1e-5)
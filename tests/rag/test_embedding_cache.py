@@ -0,0 +1,82 @@
+import os
+import sys
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.rag import EmbeddingCache, CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    """embeds a text as its length and its number of words, counting the texts it embedded"""
+    def __init__(self, model="models/test", task_type=None):
+        self.model = model
+        self.task_type = task_type
+        self.documents = []
+        self.queries = []
+
+    def embed_documents(self, texts):
+        self.documents.extend(texts)
+        return [[float(len(text)), float(len(text.split())), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [float(len(text)), float(len(text.split())), -1.0]
+
+def test_documents_are_embedded_once(tmp_path):
+    model = CountingEmbeddings()
+    embeddings = CachedEmbeddings(model, tmp_path, 100)
+
+    first = embeddings.embed_documents(["biat stock price", "economy news"])
+    second = embeddings.embed_documents(["economy news", "new article", "biat stock price"])
+
+    assert model.documents == ["biat stock price", "economy news", "new article"]
+    assert second == [first[1], [11.0, 2.0, 1.0], first[0]]
+
+def test_queries_and_documents_are_cached_apart(tmp_path):
+    model = CountingEmbeddings()
+    embeddings = CachedEmbeddings(model, tmp_path, 100)
+
+    embeddings.embed_documents(["latest news?"])
+    query = embeddings.embed_query("latest news?")
+
+    assert query == [12.0, 2.0, -1.0]
+    assert embeddings.embed_query("latest news?") == query
+    assert model.queries == ["latest news?"]
+
+def test_cache_is_persisted(tmp_path):
+    CachedEmbeddings(CountingEmbeddings(), tmp_path, 100).embed_documents(["biat stock price"])
+
+    model = CountingEmbeddings()
+    assert CachedEmbeddings(model, tmp_path, 100).embed_documents(["biat stock price"]) == [[16.0, 3.0, 1.0]]
+    assert model.documents == []
+    # another model or task type embeds the text again
+    other = CountingEmbeddings(task_type="SEMANTIC_SIMILARITY")
+    CachedEmbeddings(other, tmp_path, 100).embed_documents(["biat stock price"])
+    assert other.documents == ["biat stock price"]
+
+def test_least_recently_used_embedding_is_evicted(tmp_path):
+    keys = [EmbeddingCache.get_key("models/test", None, text) for text in ["a", "b", "c"]]
+    cache = EmbeddingCache(tmp_path, 2)
+    cache.put_many(keys[:2], [[1.0, 0.0], [0.0, 1.0]])
+    cache.get_many([keys[0]])
+
+    cache.put_many([keys[2]], [[1.0, 1.0]])
+
+    assert len(cache) == 2
+    assert cache.get_many(keys)[1] is None
+    reopened = EmbeddingCache(tmp_path, 2)
+    assert np.array_equal(reopened.get_many([keys[0]])[0], [1.0, 0.0])
+    assert np.array_equal(reopened.get_many([keys[2]])[0], [1.0, 1.0])
+
+def test_overwritten_row_is_a_miss(tmp_path):
+    cache = EmbeddingCache(tmp_path, 10)
+    key = EmbeddingCache.get_key("models/test", None, "biat stock price")
+    cache.put_many([key], [[1.0, 2.0]])
+
+    # another process reused the row for another text
+    keys = np.load(tmp_path / "keys.npy", mmap_mode="r+")
+    keys[0] = EmbeddingCache.get_key("models/test", None, "economy news")
+    keys.flush()
+
+    assert cache.get_many([key]) == [None]
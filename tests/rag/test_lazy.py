@@ -0,0 +1,35 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+import sys, os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.rag import Lazy, get_llm
+from src.rag.agents.generator_agents import NewsAgent, StockAgent
+
+
+def test_lazy_creates_the_object_once_on_first_use():
+    calls = []
+    def create():
+        calls.append(1)
+        time.sleep(0.1)
+        return "value"
+    lazy = Lazy(create)
+
+    assert lazy.created is False
+    assert calls == []
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        values = list(executor.map(lambda _: lazy.upper(), range(8)))
+
+    assert values == ["VALUE"] * 8
+    assert calls == [1]
+    assert lazy.created is True
+    assert lazy.get() == "value"
+
+def test_agents_share_their_llm():
+    news, stocks = NewsAgent(), StockAgent()
+
+    assert news.decision_chain.created is False
+    assert news.get_decision_chain() is news.get_decision_chain()
+    assert news.generative_llm is stocks.generative_llm
+    assert get_llm("model", 0) is get_llm("model", 0)
+    assert get_llm("model", 0) is not get_llm("model", 0, "another key")
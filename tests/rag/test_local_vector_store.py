@@ -0,0 +1,90 @@
+import os
+import sys
+import time
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.rag import LocalVectorStore
+
+WORDS = ["biat", "bank", "news", "economy", "stock", "price", "weather"]
+
+
+class WordEmbeddings(Embeddings):
+    """embeds a text as the counts of a few words, similar texts share words"""
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        words = text.lower().replace("?", "").split()
+        return [float(words.count(word)) for word in WORDS] + [0.1]
+
+
+def make_store(path):
+    store = LocalVectorStore(path, WordEmbeddings())
+    store.add_documents([
+        Document(page_content="biat stock price", metadata={"source": "stocks", "title": "BIAT"}),
+        Document(page_content="bank stock price", metadata={"source": "stocks", "title": "BT"}),
+        Document(page_content="biat bank news", metadata={"source": "news", "title": "BIAT results"}),
+        Document(page_content="economy news", metadata={"source": "news", "title": "economy"}),
+    ], ids=["stock#BIAT#1", "stock#BT#1", "news#1", "news#2"])
+    return store
+
+def test_similarity_search(tmp_path):
+    store = make_store(tmp_path / "index")
+
+    results = store.similarity_search_with_score("biat stock price", k=2)
+
+    assert [document.id for document, _ in results] == ["stock#BIAT#1", "stock#BT#1"]
+    assert results[0][1] > results[1][1]
+    assert results[0][0].metadata == {"source": "stocks", "title": "BIAT"}
+
+def test_retriever_filters_on_source(tmp_path):
+    store = make_store(tmp_path / "index")
+    retriever = store.as_retriever(search_type="similarity", search_kwargs={"k": 7, "filter": {"source": "news"}})
+
+    documents = retriever.invoke(input="biat stock price")
+
+    assert [document.id for document in documents] == ["news#1", "news#2"]
+    assert store.similarity_search("biat", k=7, filter={"source": "news", "title": "economy"})[0].id == "news#2"
+
+def test_persisted_and_reloaded(tmp_path):
+    make_store(tmp_path / "index")
+
+    store = LocalVectorStore(tmp_path / "index", WordEmbeddings())
+
+    assert len(store) == 4
+    assert store.similarity_search("economy news", k=1)[0].page_content == "economy news"
+
+def test_add_replaces_and_delete(tmp_path):
+    store = make_store(tmp_path / "index")
+
+    store.add_documents([Document(page_content="weather", metadata={"source": "stocks"})], ids=["stock#BIAT#1"])
+    assert len(store) == 4
+    assert store.get_by_ids(["stock#BIAT#1"])[0].page_content == "weather"
+
+    store.delete(ids=store.list_ids(prefix="stock#"))
+    assert store.list_ids() == ["news#1", "news#2"]
+    assert store.similarity_search("stock price", k=7, filter={"source": "stocks"}) == []
+
+def test_reads_the_documents_written_by_another_store(tmp_path):
+    # e.g. the backend's store after store_stock_data.py ran
+    reader = LocalVectorStore(tmp_path / "index", WordEmbeddings())
+    assert reader.similarity_search("biat", k=1) == []
+
+    make_store(tmp_path / "index")
+
+    assert reader.similarity_search("biat stock price", k=1)[0].id == "stock#BIAT#1"
+
+def test_search_is_fast(tmp_path):
+    store = LocalVectorStore(tmp_path / "index", WordEmbeddings())
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(5000, len(WORDS) + 1)).tolist()
+    store.embeddings.embed_documents = lambda texts: vectors
+    store.add_texts([f"document {i}" for i in range(5000)], [{"source": "news" if i % 2 else "stocks"} for i in range(5000)])
+
+    start = time.perf_counter()
+    for _ in range(100):
+        store.similarity_search_by_vector(vectors[0], k=7, filter={"source": "news"})
+    assert (time.perf_counter() - start) / 100 < 0.01
@@ -0,0 +1,204 @@
+import time
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+from langchain_core.documents import Document
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
+import sys, os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.rag import rag_system
+from src.rag.rag_system import create_agents_graph, filter_documents, stream_answer, RETRIEVAL_K
+from src.metrics import RAG_ANSWER_PATHS
+from src.rag.agents.generator_agents.IGenerator import ANSWER_TAG
+
+
+class SlowChain:
+    """stands for an LLM chain or a retriever, answering after a delay"""
+    def __init__(self, result, delay=0.0):
+        self.result = result
+        self.delay = delay
+        self.calls = []
+
+    def invoke(self, *args, **kwargs):
+        self.calls.append(kwargs.get("input", args[0] if args else None))
+        time.sleep(self.delay)
+        return self.result
+
+
+class StubVectorStore:
+    def __init__(self, documents, delay=0.0):
+        self.documents = documents
+        self.delay = delay
+        self.searches = []
+
+    def as_retriever(self, search_type, search_kwargs):
+        self.searches.append(search_kwargs)
+        filter = search_kwargs.get("filter")
+        documents = [document for document in self.documents if filter == None or document.metadata["source"] == filter["source"]]
+        return SlowChain(documents[:search_kwargs["k"]], self.delay)
+
+
+def make_documents(sources):
+    return [Document(page_content=f"document {i}", metadata={"source": source}) for i, source in enumerate(sources)]
+
+@pytest.fixture
+def agents():
+    """the graph's LLMs replaced by stubs answering a relevant news question"""
+    generator = SimpleNamespace(get_decision_chain=lambda: SlowChain("generated answer"))
+    with patch.multiple(rag_system,
+                        topic_checker=SlowChain(SimpleNamespace(datasource="rag"), 0.2),
+                        input_classifer=SlowChain(SimpleNamespace(topic="news"), 0.2),
+                        answer_grader_agent=SlowChain(SimpleNamespace(binary_score="yes")),
+                        off_topic_responder=SlowChain("off topic answer"),
+                        n_agent=generator, s_agent=generator, r_agent=generator):
+        yield rag_system
+
+def test_filter_documents():
+    documents = make_documents(["stocks", "news"] * 10)
+
+    news = filter_documents(documents, "news")
+    assert len(news) == RETRIEVAL_K
+    assert all(document.metadata["source"] == "news" for document in news)
+    assert news[0] is documents[1]
+    # recommendations use all the documents
+    assert filter_documents(documents, "recommendation") == documents[:RETRIEVAL_K]
+
+def test_parallel_graph_filters_the_speculative_documents(agents):
+    vectorStore = StubVectorStore(make_documents(["stocks", "news"] * 15), 0.2)
+
+    with patch.object(agents, "vector_store", vectorStore):
+        start = time.perf_counter()
+        response = create_agents_graph(parallel=True).invoke({"question": "latest news?"})
+        elapsed = time.perf_counter() - start
+
+    assert response["generation"] == "generated answer"
+    assert response["topic"] == "news"
+    assert len(response["documents"]) == RETRIEVAL_K
+    assert all(document.metadata["source"] == "news" for document in response["documents"])
+    # a single unfiltered retrieval, run alongside the topic check and the classification
+    assert vectorStore.searches == [{"k": rag_system.SPECULATIVE_RETRIEVAL_K}]
+    assert elapsed < 0.5
+
+def test_parallel_graph_retrieves_again_when_too_few_documents_match(agents):
+    vectorStore = StubVectorStore(make_documents(["stocks"] * 30 + ["news"] * 10))
+
+    with patch.object(agents, "vector_store", vectorStore):
+        response = create_agents_graph(parallel=True).invoke({"question": "latest news?"})
+
+    assert len(vectorStore.searches) == 2
+    assert vectorStore.searches[1] == {"k": RETRIEVAL_K, "filter": {"source": "news"}}
+    assert [document.metadata["source"] for document in response["documents"]] == ["news"] * RETRIEVAL_K
+
+def test_parallel_graph_off_topic_doesnt_wait_for_the_others(agents):
+    agents.input_classifer.delay = 2
+    vectorStore = StubVectorStore(make_documents(["news"] * 10), 2)
+
+    with patch.object(agents, "vector_store", vectorStore), \
+         patch.object(agents, "topic_checker", SlowChain(SimpleNamespace(datasource="off_topic"), 0.1)):
+        start = time.perf_counter()
+        response = create_agents_graph(parallel=True).invoke({"question": "what's the weather like?"})
+        elapsed = time.perf_counter() - start
+
+    assert response["generation"] == "off topic answer"
+    assert elapsed < 1
+
+def test_sequential_graph(agents):
+    vectorStore = StubVectorStore(make_documents(["stocks", "news"] * 15))
+
+    with patch.object(agents, "vector_store", vectorStore):
+        response = create_agents_graph().invoke({"question": "latest news?"})
+
+    assert response["generation"] == "generated answer"
+    assert vectorStore.searches == [{"k": RETRIEVAL_K, "filter": {"source": "news"}}]
+
+def test_stream_answer_yields_the_answer_tokens(agents):
+    vectorStore = StubVectorStore(make_documents(["stocks", "news"] * 15))
+    # streaming stubs of the LLMs, only the generator's is tagged as the answer
+    prompt = RunnableLambda(lambda input: input["question"])
+    answer = lambda: prompt | GenericFakeChatModel(messages=iter([AIMessage("BIAT rose by 2%")])).with_config(tags=[ANSWER_TAG]) | StrOutputParser()
+    grader = prompt | GenericFakeChatModel(messages=iter([AIMessage("grade yes")])) | RunnableLambda(lambda message: SimpleNamespace(binary_score="yes"))
+    generator = SimpleNamespace(get_decision_chain=answer)
+
+    with patch.object(agents, "vector_store", vectorStore), \
+         patch.multiple(agents, n_agent=generator, answer_grader_agent=grader):
+        events = list(stream_answer(create_agents_graph(), "latest news?"))
+
+    tokens = [data["text"] for event, data in events if event == "token"]
+    assert "".join(tokens) == "BIAT rose by 2%"
+    assert len(tokens) > 1
+    nodes = [data["node"] for event, data in events if event == "node"]
+    assert nodes == ["start_budget", "classify_question", "retrieve", "generate_news", "grade_answer"]
+    # the first token comes before the generation is graded
+    assert events.index(("node", {"node": "generate_news"})) > events.index(("token", {"text": tokens[-1]}))
+    event, state = events[-1]
+    assert event == "done"
+    assert state["generation"] == "BIAT rose by 2%"
+    assert state["topic"] == "news"
+
+def test_rewrites_stop_at_the_budget(agents):
+    vectorStore = StubVectorStore(make_documents(["stocks", "news"] * 15))
+    generations = iter(["answer 1", "answer 2", "answer 3", "answer 4"])
+    generator = SimpleNamespace(get_decision_chain=lambda: SlowChain(next(generations)))
+    RAG_ANSWER_PATHS.clear()
+
+    with patch.object(agents, "vector_store", vectorStore), \
+         patch.multiple(agents, n_agent=generator, MAX_REWRITES=2,
+                        answer_grader_agent=SlowChain(SimpleNamespace(binary_score="no")),
+                        question_rewriter=SlowChain("rewritten question")):
+        response = create_agents_graph().invoke({"question": "latest news?"})
+
+    # the last answer is returned once the rewrites are spent
+    assert response["generation"] == "answer 3"
+    assert response["rewrites"] == 2
+    assert len(vectorStore.searches) == 3
+    assert RAG_ANSWER_PATHS.get(path="rewritten") == 2
+    assert RAG_ANSWER_PATHS.get(path="max_rewrites") == 1
+
+def test_no_rewrite_past_the_deadline(agents):
+    vectorStore = StubVectorStore(make_documents(["stocks", "news"] * 15))
+    generator = SimpleNamespace(get_decision_chain=lambda: SlowChain("slow answer", 0.3))
+    RAG_ANSWER_PATHS.clear()
+
+    # the first answer takes 0.7s, a rewrite wouldn't end before the deadline
+    with patch.object(agents, "vector_store", vectorStore), \
+         patch.multiple(agents, n_agent=generator, DEADLINE_SECONDS=1,
+                        answer_grader_agent=SlowChain(SimpleNamespace(binary_score="no")),
+                        question_rewriter=SlowChain("rewritten question")):
+        response = create_agents_graph().invoke({"question": "latest news?"})
+
+    assert response["generation"] == "slow answer"
+    assert response["rewrites"] == 0
+    assert RAG_ANSWER_PATHS.get(path="deadline") == 1
+
+def test_confident_answers_are_graded_by_default(agents):
+    vectorStore = StubVectorStore(make_documents(["stocks", "news"] * 15))
+    grader = SlowChain(SimpleNamespace(binary_score="yes"))
+    RAG_ANSWER_PATHS.clear()
+
+    with patch.object(agents, "vector_store", vectorStore), \
+         patch.multiple(agents, answer_grader_agent=grader,
+                        input_classifer=SlowChain(SimpleNamespace(topic="news", confidence=1.0))):
+        response = create_agents_graph(parallel=True).invoke({"question": "latest news?"})
+
+    assert response["grade"] == "yes"
+    assert len(grader.calls) == 1
+    assert RAG_ANSWER_PATHS.get(path="accepted") == 1
+
+def test_confident_classification_skips_the_grader(agents):
+    vectorStore = StubVectorStore(make_documents(["stocks", "news"] * 15))
+    grader = SlowChain(SimpleNamespace(binary_score="no"))
+    RAG_ANSWER_PATHS.clear()
+
+    with patch.object(agents, "vector_store", vectorStore), \
+         patch.multiple(agents, answer_grader_agent=grader, GRADER_SKIP_CONFIDENCE=0.9,
+                        input_classifer=SlowChain(SimpleNamespace(topic="news", confidence=0.95))):
+        response = create_agents_graph(parallel=True).invoke({"question": "latest news?"})
+
+    assert response["generation"] == "generated answer"
+    assert response["grade"] == "skipped"
+    assert grader.calls == []
+    assert RAG_ANSWER_PATHS.get(path="skipped") == 1
@@ -0,0 +1,77 @@
+import pytest
+from unittest.mock import patch
+import sys, os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.rag import SemanticCache, extract_entities
+from src.metrics import CACHE_REQUESTS
+
+
+def test_similar_questions_share_an_answer():
+    cache = SemanticCache(10, 3600, 0.95)
+    cache.set([1.0, 0.0, 0.1], "BIAT answer", "stocks", cache.get_version())
+
+    # scaled and slightly rotated: the same question phrased differently
+    assert cache.get([2.0, 0.05, 0.2]) == "BIAT answer"
+    assert cache.get([0.0, 1.0, 0.0]) is None
+    assert CACHE_REQUESTS.get(cache="rag", result="hit") >= 1
+
+def test_questions_about_other_entities_dont_share_an_answer():
+    cache = SemanticCache(10, 3600, 0.95)
+    biat = extract_entities("BIAT price this week", {"BIAT", "BNA"})
+    cache.set([1.0, 0.0, 0.1], "BIAT answer", "stocks", cache.get_version(), biat)
+
+    # near identical embeddings, only the ticker or the period differs
+    assert cache.get([1.0, 0.01, 0.1], extract_entities("BNA price this week", {"BIAT", "BNA"})) is None
+    assert cache.get([1.0, 0.01, 0.1], extract_entities("biat price last week", {"BIAT", "BNA"})) is None
+    assert cache.get([1.0, 0.01, 0.1], extract_entities("What's the price of biat this week?", {"BIAT", "BNA"})) == "BIAT answer"
+
+def test_extract_entities():
+    assert extract_entities("How did BIAT and sfbt do on 2024-03-01?", {"BIAT", "SFBT"}) == {"BIAT", "SFBT", "2024-03-01"}
+    assert extract_entities("What happened last month in the market?") == {"last", "month"}
+    assert extract_entities("I want the latest news") == frozenset()
+
+def test_invalidate_drops_the_answers_of_the_sources():
+    cache = SemanticCache(10, 3600, 0.99)
+    cache.set([1.0, 0.0, 0.0], "news answer", "news", cache.get_version())
+    cache.set([0.0, 1.0, 0.0], "stocks answer", "stocks", cache.get_version())
+    cache.set([0.0, 0.0, 1.0], "recommendation", "recommendation", cache.get_version())
+    cache.set([1.0, 1.0, 0.0], "off topic answer", None, cache.get_version())
+
+    cache.invalidate(["news"])
+
+    assert cache.get([1.0, 0.0, 0.0]) is None
+    assert cache.get([0.0, 0.0, 1.0]) is None # recommendations use the news too
+    assert cache.get([0.0, 1.0, 0.0]) == "stocks answer"
+    assert cache.get([1.0, 1.0, 0.0]) == "off topic answer"
+    cache.clear()
+    assert len(cache) == 0
+
+def test_answer_computed_before_an_invalidation_is_not_stored():
+    cache = SemanticCache(10, 3600, 0.95)
+    version = cache.get_version()
+
+    cache.invalidate(["stocks"])
+    cache.set([1.0, 0.0], "answer from the old documents", "stocks", version)
+
+    assert cache.get([1.0, 0.0]) is None
+
+def test_answers_expire_and_are_evicted():
+    cache = SemanticCache(2, 60, 0.99)
+    with patch("src.rag.semantic_cache.time.monotonic", return_value=1000):
+        for i, embedding in enumerate([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]):
+            cache.set(embedding, f"answer {i}", "news", cache.get_version())
+
+        # the oldest answer was replaced
+        assert cache.get([1.0, 0.0, 0.0]) is None
+        assert cache.get([0.0, 0.0, 1.0]) == "answer 2"
+        assert len(cache) == 2
+    with patch("src.rag.semantic_cache.time.monotonic", return_value=1061):
+        assert cache.get([0.0, 0.0, 1.0]) is None
+
+def test_disabled_cache():
+    cache = SemanticCache(0, 3600, 0.95)
+    cache.set([1.0, 0.0], "answer", "news", cache.get_version())
+
+    assert cache.enabled is False
+    assert cache.get([1.0, 0.0]) is None
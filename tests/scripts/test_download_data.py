@@ -6,7 +6,7 @@ from pathlib import Path
 import sys
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from scripts.download_data import get_dates, update_dates, download
+from scripts.download_data import get_dates, update_dates, download, append_csv_content
 
 # -------------- Fixtures ----------------
 @pytest.fixture
@@ -95,3 +95,19 @@ class TestDownloadData:
                 fileName="DUMMY.csv"
             )
 
+# -------------- Tests for append_csv_content ----------------
+class TestAppendCsvContent:
+
+    def test_append_single_write(self, tmp_path):
+        """Test that the rows of a window are appended in one write, with the headers only once."""
+        file_path = tmp_path / "raw" / "DUMMY.csv"
+        content = "symbole;date;ouverture;haut;bas;cloture;volume\r\nSYM1;01-01-2024;100;110;90;105;1000\r\nSYM1;02-01-2024;105;110;90;106;1000\r\n"
+
+        append_csv_content(file_path, content)
+        with mock.patch("builtins.open", mock.mock_open()) as mock_open_file, mock.patch("os.stat") as mock_stat:
+            mock_stat.return_value.st_size = 1
+            append_csv_content(file_path, content)
+            mock_open_file().write.assert_called_once()
+
+        lines = file_path.read_text().splitlines()
+        assert lines == ["symbole;date;ouverture;haut;bas;cloture;volume", "SYM1;01-01-2024;100;110;90;105;1000", "SYM1;02-01-2024;105;110;90;106;1000"]
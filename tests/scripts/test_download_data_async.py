@@ -0,0 +1,132 @@
+import asyncio
+import pytest
+import httpx
+from datetime import datetime, timedelta
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from scripts.download_data import get_dates, update_dates
+from scripts.download_data_async import download_all, download_symbol, DownloadCheckpoint, HostLimiter
+from scripts.download_fixture_server import FixtureServer, get_window_path
+from utils import HEADERS
+
+# -------------- Fixtures ----------------
+@pytest.fixture
+def start():
+    return (datetime.today().date() - timedelta(days=100)).strftime("%d-%m-%Y")
+
+@pytest.fixture
+def fixture_dir(tmp_path, start):
+    """Records two windows of data for SYM1 and SYM2, the period since the start spans two windows"""
+    fixture_dir = tmp_path / "fixtures"
+    for symbol in ["SYM1", "SYM2"]:
+        start_date, end_date = get_dates(start)
+        for i in range(2):
+            window_path = get_window_path(fixture_dir, symbol, start_date, end_date)
+            window_path.parent.mkdir(parents=True, exist_ok=True)
+            window_path.write_bytes(f"{HEADERS}\r\n{symbol};{start_date};100;110;90;10{i};1000\r\n".encode())
+            start_date, end_date = update_dates(end_date)
+    return fixture_dir
+
+def run_download(server, tmp_path, start, **kwargs):
+    return asyncio.run(download_all(start, symbols=["SYM1", "SYM2"], base_link=server.base_link, raw_dir=tmp_path / "raw",
+                                    checkpoint_path=tmp_path / "raw" / "checkpoint.json", backoff=0, **kwargs))
+
+# -------------- Tests for download_all ----------------
+class TestDownloadAll:
+
+    def test_download_all_symbols(self, tmp_path, fixture_dir, start):
+        """Test that every window of every symbol is appended in order."""
+        with FixtureServer(fixture_dir) as server:
+            results = run_download(server, tmp_path, start)
+            # one GET per symbol and one POST per window
+            assert server.request_count == 6
+
+        assert results == {"SYM1": 2, "SYM2": 2}
+        lines = (tmp_path / "raw" / "SYM1.csv").read_text().splitlines()
+        assert lines[0] == HEADERS
+        assert [line.split(';')[5] for line in lines[1:]] == ["100", "101"]
+
+    def test_download_resumes_from_checkpoint(self, tmp_path, fixture_dir, start):
+        """Test that a second run with the same start doesn't download the windows again."""
+        with FixtureServer(fixture_dir) as server:
+            run_download(server, tmp_path, start)
+            results = run_download(server, tmp_path, start)
+            assert server.request_count == 6
+
+        assert results == {"SYM1": 0, "SYM2": 0}
+        assert len((tmp_path / "raw" / "SYM1.csv").read_text().splitlines()) == 3
+
+    def test_download_records_responses(self, tmp_path, fixture_dir, start):
+        """Test that recorded responses can be replayed."""
+        with FixtureServer(fixture_dir) as server:
+            run_download(server, tmp_path, start, record_dir=tmp_path / "recorded")
+        with FixtureServer(tmp_path / "recorded") as server:
+            asyncio.run(download_all(start, symbols=["SYM1"], base_link=server.base_link, raw_dir=tmp_path / "replayed",
+                                     checkpoint_path=tmp_path / "replayed" / "checkpoint.json"))
+
+        assert (tmp_path / "replayed" / "SYM1.csv").read_text() == (tmp_path / "raw" / "SYM1.csv").read_text()
+
+    def test_download_reports_failed_symbols(self, tmp_path, fixture_dir, start):
+        """Test that a failing symbol doesn't stop the others."""
+        (fixture_dir / "SYM2" / "page.html").write_text("<html>no token</html>")
+        with FixtureServer(fixture_dir) as server:
+            results = run_download(server, tmp_path, start)
+
+        assert results["SYM1"] == 2
+        assert isinstance(results["SYM2"], Exception)
+
+# -------------- Tests for download_symbol ----------------
+class TestDownloadSymbol:
+
+    def test_retries_server_errors(self, tmp_path):
+        """Test that 503 responses are retried."""
+        today = datetime.today().date()
+        calls = []
+
+        def handler(request):
+            calls.append(request.method)
+            if request.method == "GET":
+                return httpx.Response(200, text='<input name="__RequestVerificationToken" value="token" />')
+            if len(calls) < 4:
+                return httpx.Response(503)
+            return httpx.Response(200, content=f"{HEADERS}\r\nSYM;{today};1;1;1;1;1\r\n".encode())
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                return await download_symbol(client, HostLimiter(1), "SYM", today.strftime("%d-%m-%Y"),
+                                             DownloadCheckpoint(tmp_path / "checkpoint.json", "start"),
+                                             base_link="http://fixture/", raw_dir=tmp_path, backoff=0)
+
+        assert asyncio.run(run()) == 1
+        assert calls == ["GET", "POST", "POST", "POST"]
+        assert len((tmp_path / "SYM.csv").read_text().splitlines()) == 2
+
+    def test_raises_after_retries(self, tmp_path):
+        """Test that a window still failing after the retries raises."""
+        def handler(request):
+            if request.method == "GET":
+                return httpx.Response(200, text='<input name="__RequestVerificationToken" value="token" />')
+            return httpx.Response(500)
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                return await download_symbol(client, HostLimiter(1), "SYM", datetime.today().strftime("%d-%m-%Y"),
+                                             DownloadCheckpoint(tmp_path / "checkpoint.json", "start"),
+                                             base_link="http://fixture/", raw_dir=tmp_path, retries=2, backoff=0)
+
+        with pytest.raises(Exception, match="Status code: 500"):
+            asyncio.run(run())
+
+# -------------- Tests for DownloadCheckpoint ----------------
+class TestDownloadCheckpoint:
+
+    def test_checkpoint_ignored_for_another_start(self, tmp_path):
+        """Test that a checkpoint only resumes the run it was written by."""
+        checkpoint = DownloadCheckpoint(tmp_path / "checkpoint.json", "01-01-2008")
+        checkpoint.update("SYM", datetime(2024, 1, 1).date())
+
+        assert DownloadCheckpoint(tmp_path / "checkpoint.json", "01-01-2008").get("SYM") == datetime(2024, 1, 1).date()
+        assert DownloadCheckpoint(tmp_path / "checkpoint.json", "02-01-2008").get("SYM") is None
@@ -9,7 +9,8 @@ from unittest.mock import patch
 
 # Add project root to Python path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
-from scripts import fill_missing_dates_interpolation, process_all_raw_files
+from scripts import fill_missing_dates_interpolation, append_new_rows_interpolation, process_all_raw_files
+from scripts.process_data import fill_missing_dates_interpolation_batch, process_batch
 
 # Test data for fill_missing_dates_interpolation
 @pytest.fixture
@@ -128,6 +129,81 @@ class TestFillMissingDatesInterpolation:
         with pytest.raises(ValueError):
             fill_missing_dates_interpolation(df)
 
+class TestAppendNewRowsInterpolation:
+    def test_matches_full_rebuild(self, sample_stock_data):
+        """Test that interpolating only the new tail gives the same result as a full rebuild"""
+        processed_df = fill_missing_dates_interpolation(sample_stock_data)
+        new_rows = pd.DataFrame({
+            'date': pd.to_datetime(['09/01/2023', '10/01/2023', '13/01/2023'], format='%d/%m/%Y'),
+            'ouverture': [108.0, 109.0, 112.0],
+            'haut': [109.0, 110.0, 113.0],
+            'bas': [107.0, 108.0, 111.0],
+            'cloture': [108.5, 109.5, 112.5],
+            'volume': [1600, 1700, 2000]
+        })
+
+        result = append_new_rows_interpolation(processed_df, new_rows)
+        expected = fill_missing_dates_interpolation(pd.concat([processed_df, new_rows], ignore_index=True))
+
+        assert len(result) == 13
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+    def test_anchors_on_last_known_value(self, sample_stock_data):
+        """Test that a missing value at the end of the history is interpolated from the last known one"""
+        processed_df = fill_missing_dates_interpolation(sample_stock_data)
+        processed_df.loc[len(processed_df) - 1, 'cloture'] = None
+        new_rows = pd.DataFrame({
+            'date': pd.to_datetime(['09/01/2023'], format='%d/%m/%Y'),
+            'ouverture': [108.0], 'haut': [109.0], 'bas': [107.0], 'cloture': [108.5], 'volume': [1600]
+        })
+
+        result = append_new_rows_interpolation(processed_df, new_rows)
+        expected = fill_missing_dates_interpolation(pd.concat([processed_df, new_rows], ignore_index=True))
+
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+class TestFillMissingDatesInterpolationBatch:
+    def test_matches_per_stock(self, sample_stock_data, sample_stock_data_with_commas, sample_stock_data_missing_columns):
+        """Test that every stock of the batch gets the same frame as fill_missing_dates_interpolation"""
+        shifted = sample_stock_data.assign(date=['20/12/2022', '24/12/2022', '25/12/2022', '29/12/2022'])
+        shifted.loc[2, 'cloture'] = None
+        stock_dfs = {
+            'A': sample_stock_data,
+            'B': sample_stock_data_with_commas,
+            'C': sample_stock_data_missing_columns,
+            'D': shifted
+        }
+
+        results = fill_missing_dates_interpolation_batch(stock_dfs)
+
+        assert list(results) == ['A', 'B', 'C', 'D']
+        for stock, df in stock_dfs.items():
+            pd.testing.assert_frame_equal(results[stock], fill_missing_dates_interpolation(df), check_dtype=False, check_exact=True)
+
+    def test_duplicate_dates(self, sample_stock_data):
+        """Test that duplicate dates raise like in fill_missing_dates_interpolation"""
+        duplicated = pd.concat([sample_stock_data, sample_stock_data.iloc[:1]], ignore_index=True)
+
+        with pytest.raises(ValueError):
+            fill_missing_dates_interpolation_batch({'A': sample_stock_data, 'B': duplicated})
+
+    def test_missing_date_column(self, sample_stock_data):
+        """Test that a missing date column raises"""
+        with pytest.raises(ValueError, match="Required column 'date' not found"):
+            fill_missing_dates_interpolation_batch({'A': sample_stock_data.drop(columns=['date'])})
+
+    def test_process_batch_with_workers(self, temp_data_dirs, sample_stock_data):
+        """Test that the batch is split over the workers"""
+        _, processed_dir = temp_data_dirs
+        stock_dfs = {f'S{i}': sample_stock_data for i in range(3)}
+
+        with patch('scripts.process_data.BATCH_PARALLEL_MIN_ROWS', 0):
+            saved = process_batch(stock_dfs, processed_dir, workers=2)
+
+        assert sorted(saved) == ['S0', 'S1', 'S2']
+        result = pd.read_csv(processed_dir / 'S2.csv', sep=';')
+        assert len(result) == 6
+
 class TestProcessAllRawFiles:
     def test_process_new_file(self, temp_data_dirs, sample_csv_file):
         """Test processing a new file (no existing processed file)"""
@@ -188,7 +264,60 @@ class TestProcessAllRawFiles:
         # Verify file was updated (now has 3 rows - original 1 + new 1 + interpolated 1)
         result = pd.read_csv(output_file, sep=';')
         assert len(result) == 3
+        assert result.loc[1, 'cloture'] == pytest.approx(101.5)
+
+    def test_process_with_new_data_full_rebuild(self, temp_data_dirs, sample_csv_file):
+        """Test that the full rebuild mode gives the same processed file as the incremental one"""
+        raw_dir, processed_dir = temp_data_dirs
+
+        output_file = processed_dir / 'test_stock.csv'
+        test_data = """date;ouverture;haut;bas;cloture;volume
+2023-01-01;100.0;101.0;99.0;100.5;1000"""
+
+        with open(output_file, 'w') as f:
+            f.write(test_data)
+
+        with patch('scripts.process_data.PROJECT_ROOT', Path(temp_data_dirs[0]).parent.parent):
+            process_all_raw_files(incremental=False)
+
+        result = pd.read_csv(output_file, sep=';')
+        assert len(result) == 3
+        assert result.loc[1, 'cloture'] == pytest.approx(101.5)
     
+    def test_process_new_files_batch(self, temp_data_dirs, sample_csv_file):
+        """Test that the batch mode saves the same files as the per file mode"""
+        raw_dir, processed_dir = temp_data_dirs
+        (raw_dir / 'other_stock.csv').write_text("""date;ouverture;haut;bas;cloture;volume;symbole
+30/12/2022;90,0;91,0;89,0;90,5;900;OTHER
+03/01/2023;92,0;93,0;91,0;92,5;1100;OTHER""")
+
+        with patch('scripts.process_data.PROJECT_ROOT', Path(temp_data_dirs[0]).parent.parent):
+            process_all_raw_files()
+            expected = {stock: (processed_dir / f'{stock}.csv').read_text() for stock in ['test_stock', 'other_stock']}
+            shutil.rmtree(processed_dir)
+            process_all_raw_files(batch=True)
+
+        for stock, content in expected.items():
+            assert (processed_dir / f'{stock}.csv').read_text() == content
+        assert len(pd.read_csv(processed_dir / 'other_stock.csv', sep=';')) == 5
+
+    def test_publishes_the_updated_data_versions(self, temp_data_dirs, sample_csv_file):
+        """Test that the data versions of the updated stocks are published, the same in the batch mode"""
+        raw_dir, processed_dir = temp_data_dirs
+
+        with patch('scripts.process_data.PROJECT_ROOT', Path(temp_data_dirs[0]).parent.parent), \
+             patch('scripts.process_data.publish_stock_versions') as mock_publish:
+            process_all_raw_files()
+            process_all_raw_files()
+            shutil.rmtree(processed_dir)
+            process_all_raw_files(batch=True)
+
+        (part, versions), (_, unchanged_versions), (_, batch_versions) = [call.args for call in mock_publish.call_args_list]
+        assert part == 'data'
+        assert list(versions) == ['test_stock'] and len(versions['test_stock']) == 16
+        assert unchanged_versions == {}
+        assert batch_versions == versions
+
     def test_no_raw_files(self, temp_data_dirs):
         """Test when no raw files exist"""
         raw_dir, processed_dir = temp_data_dirs
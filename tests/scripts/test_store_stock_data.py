@@ -0,0 +1,106 @@
+import pytest
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import sys
+from unittest.mock import patch
+from langchain_core.embeddings import Embeddings
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from scripts.store_stock_data import process_stock_data, sync_stock_data, get_stock_texts, main
+from src import LocalVectorStore
+
+
+class LengthEmbeddings(Embeddings):
+    def __init__(self):
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+def make_stock_df(stock, days, start="2024-01-01"):
+    return pd.DataFrame({
+        "date": pd.date_range(start, periods=days, freq="D").strftime("%Y-%m-%d"),
+        "ouverture": np.linspace(10, 20, days),
+        "cloture": np.linspace(11, 21, days),
+        "volume": np.full(days, 12345.678),
+        "stock": stock,
+    })
+
+@pytest.fixture
+def vector_store(tmp_path):
+    store = LocalVectorStore(tmp_path / "index", LengthEmbeddings())
+    with patch("scripts.store_stock_data.get_vector_store", return_value=store):
+        yield store
+
+def test_get_stock_texts():
+    texts = get_stock_texts(make_stock_df("AB", 2))
+
+    assert texts[0] == "Stock AB on date 2024-01-01, opening price 10.00, closing price 11.00, volume 12,345.68."
+    assert texts[1] == "Stock AB on date 2024-01-02, opening price 20.00, closing price 21.00, volume 12,345.68."
+
+def test_process_stock_data_chunks_long_histories():
+    docs, ids = process_stock_data([make_stock_df("AB", 10), make_stock_df("BIAT", 730)])
+
+    assert ids == ["stock#AB#1", "stock#BIAT#1", "stock#BIAT#2", "stock#BIAT#3"]
+    assert all(len(doc.page_content) <= 40000 for doc in docs)
+    # each chunk is dated by its last day
+    assert docs[0].metadata["date"] == "2024-01-10"
+    assert docs[-1].metadata["date"] == "2025-12-30"
+    assert docs[1].metadata["date"] < docs[2].metadata["date"]
+    assert len({doc.metadata["fingerprint"] for doc in docs}) == 4
+
+def test_sync_only_upserts_the_changed_documents(vector_store):
+    docs, ids = process_stock_data([make_stock_df("AB", 10), make_stock_df("AL", 10), make_stock_df("BT", 10)])
+    assert sync_stock_data(docs, ids) == (3, 0, 0)
+    embedded = len(vector_store.embeddings.texts)
+
+    # a new day for AL and BT was delisted
+    docs, ids = process_stock_data([make_stock_df("AB", 10), make_stock_df("AL", 11)])
+    assert sync_stock_data(docs, ids) == (1, 1, 0)
+    assert len(vector_store.embeddings.texts) == embedded + 1
+    assert vector_store.list_ids() == ["stock#AB#1", "stock#AL#1"]
+    assert vector_store.get_by_ids(["stock#AL#1"])[0].metadata["date"] == "2024-01-11"
+
+    assert sync_stock_data(docs, ids) == (0, 0, 0)
+
+def test_sync_counts_the_failed_batches(vector_store):
+    docs, ids = process_stock_data([make_stock_df("AB", 10), make_stock_df("AL", 10), make_stock_df("BT", 10)])
+    add_documents = vector_store.add_documents
+    def fail_for_al(documents, ids):
+        if "stock#AL#1" in ids:
+            raise ConnectionError("upsert failed")
+        return add_documents(documents, ids=ids)
+
+    with patch.object(vector_store, "add_documents", side_effect=fail_for_al):
+        assert sync_stock_data(docs, ids, batch_size=1) == (2, 0, 1)
+    # the failed document wasn't stored, the next sync upserts it
+    assert sync_stock_data(docs, ids, batch_size=1) == (1, 0, 0)
+
+@patch("scripts.store_stock_data.publish_document_sources")
+@patch("scripts.store_stock_data.sync_stock_data", return_value=(2, 0, 1))
+@patch("scripts.store_stock_data.fetch_stock_data")
+def test_main_reports_the_failed_documents(mock_fetch_stock_data, mock_sync_stock_data, mock_publish, capsys):
+    today = pd.Timestamp.today().normalize()
+    mock_fetch_stock_data.return_value = [make_stock_df(stock, 10, start=(today - pd.Timedelta(days=9)).strftime("%Y-%m-%d")) for stock in ("AB", "AL", "BT", "BH")]
+
+    assert main() == 1
+
+    assert "Upserted 2 and deleted 0 stock documents, 1 failed and 1 were unchanged." in capsys.readouterr().out
+    mock_publish.assert_called_once_with(["stocks"])
+
+@patch("scripts.store_stock_data.publish_document_sources")
+@patch("scripts.store_stock_data.fetch_stock_data")
+def test_main_publishes_only_changes(mock_fetch_stock_data, mock_publish, vector_store):
+    today = pd.Timestamp.today().normalize()
+    mock_fetch_stock_data.return_value = [make_stock_df("AB", 10, start=(today - pd.Timedelta(days=9)).strftime("%Y-%m-%d"))]
+
+    main()
+    main()
+
+    mock_publish.assert_called_once_with(["stocks"])
+    assert vector_store.list_ids() == ["stock#AB#1"]
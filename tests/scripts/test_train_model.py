@@ -57,3 +57,97 @@ def test_train_function(
     mock_train_model.assert_called_once()
     mock_save_model.assert_called_once()
     mock_save_scaler.assert_called_once()
+
+@patch("scripts.train_model.publish_stock_versions")
+@patch("scripts.train_model.send_email")
+@patch("scripts.train_model.train_stock")
+@patch("os.listdir")
+@patch("dotenv.load_dotenv")
+@patch.dict(os.environ, {"WINDOW_SIZE": "5", "MODEL_NAME": "LSTM", "MODEL_LOCATION": "LOCAL", "MODEL_EVAL_THRESHHOLD": "10", "EMAIL_RECIPIENT": "ops@example.com"})
+def test_train_isolates_failures_and_alerts(mock_dotenv, mock_listdir, mock_train_stock, mock_send_email, mock_publish_stock_versions):
+    from scripts.train_model import train
+
+    mock_listdir.return_value = ["AB.csv.dvc", "AL.csv.dvc", "BT.csv.dvc"]
+    def train_stock(stock, *args):
+        if stock == "AL":
+            raise RuntimeError("corrupted csv")
+        return {"stock": stock, "last_trained_date": pd.to_datetime("2020-01-10"), "new_last_trained_date": pd.to_datetime("2020-01-20"), "evaluation": 50 if stock == "BT" else 1}
+    mock_train_stock.side_effect = train_stock
+
+    evaluations = train(workers=1)
+
+    assert evaluations == {"AB": 1, "BT": 50}
+    assert mock_train_stock.call_count == 3
+    mock_send_email.assert_called_once()
+    assert "BT" in mock_send_email.call_args[0][1]
+    # only the retrained models invalidate the backend's cached payloads
+    mock_publish_stock_versions.assert_called_once_with("model", {"AB": pd.to_datetime("2020-01-20"), "BT": pd.to_datetime("2020-01-20")})
+
+@patch("scripts.train_model.ProcessPoolExecutor")
+@patch("scripts.train_model.train_stock")
+@patch("os.listdir")
+@patch("dotenv.load_dotenv")
+@patch.dict(os.environ, {"WINDOW_SIZE": "5", "MODEL_NAME": "LSTM", "MODEL_LOCATION": "LOCAL", "MODEL_EVAL_THRESHHOLD": "10"})
+def test_train_parallel_collects_results(mock_dotenv, mock_listdir, mock_train_stock, mock_pool):
+    from concurrent.futures import ThreadPoolExecutor
+    from scripts.train_model import train
+
+    # the mocks can't cross process boundaries so the pool is replaced by a thread pool
+    mock_pool.side_effect = lambda max_workers, **kwargs: ThreadPoolExecutor(max_workers=max_workers)
+    mock_listdir.return_value = ["AB.csv.dvc", "AL.csv.dvc"]
+    mock_train_stock.side_effect = lambda stock, *args: None if stock == "AL" else {"stock": stock, "last_trained_date": None, "new_last_trained_date": pd.to_datetime("2020-01-20"), "evaluation": 2}
+
+    evaluations = train(workers=2)
+
+    assert evaluations == {"AB": 2}
+    assert mock_pool.call_args.kwargs["max_workers"] == 2
+    assert mock_pool.call_args.kwargs["initargs"][0] >= 1
+
+@patch("scripts.train_model.save_forecast")
+@patch("scripts.train_model.forecast")
+def test_materialize_forecast_writes_store(mock_forecast, mock_save_forecast):
+    from scripts.train_model import materialize_forecast
+
+    df = pd.DataFrame({"date": pd.date_range(start="2020-01-01", periods=20), "cloture": np.arange(20.0)})
+    mock_forecast.return_value = [np.array([20.0, 21.0])]
+    model, scaler = MagicMock(), MagicMock()
+
+    materialize_forecast("AB", model, scaler, df, 2, "LOCAL", df["date"].max())
+
+    assert mock_forecast.call_args[0][0] == [model]
+    assert mock_forecast.call_args[0][1][0].shape == (20, 1)
+    mock_save_forecast.assert_called_once()
+    assert mock_save_forecast.call_args[0][1:] == ("LOCAL", "AB", df["date"].max())
+
+@patch("scripts.train_model.save_forecast")
+@patch("scripts.train_model.forecast", side_effect=RuntimeError("boom"))
+def test_materialize_forecast_failure_doesnt_raise(mock_forecast, mock_save_forecast):
+    from scripts.train_model import materialize_forecast
+
+    df = pd.DataFrame({"date": pd.date_range(start="2020-01-01", periods=5), "cloture": np.arange(5.0)})
+    materialize_forecast("AB", MagicMock(), MagicMock(), df, 2, "LOCAL", df["date"].max())
+
+    mock_save_forecast.assert_not_called()
+
+@patch("threadpoolctl.threadpool_limits")
+def test_init_worker_limits_the_worker_threads(mock_threadpool_limits):
+    from scripts.train_model import _init_worker, THREAD_ENV_VARIABLES
+
+    with patch.dict(os.environ, {}, clear=True), patch("torch.set_num_threads") as mock_set_num_threads:
+        _init_worker(2)
+        assert all(os.environ[env_variable] == "2" for env_variable in THREAD_ENV_VARIABLES)
+
+    mock_threadpool_limits.assert_called_once_with(2)
+    mock_set_num_threads.assert_called_once_with(2)
+
+@patch("threadpoolctl.threadpool_limits")
+def test_init_worker_keeps_explicit_thread_counts(mock_threadpool_limits):
+    from scripts.train_model import _init_worker
+
+    with patch.dict(os.environ, {"OMP_NUM_THREADS": "8"}, clear=True), patch("torch.set_num_threads"):
+        _init_worker(2)
+        assert os.environ["OMP_NUM_THREADS"] == "8"
+        assert os.environ["MKL_NUM_THREADS"] == "2"
+
+    mock_threadpool_limits.assert_not_called()
+
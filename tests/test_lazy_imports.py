@@ -0,0 +1,58 @@
+import subprocess
+import pytest
+import sys, os
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+import src
+from src.prediction_model import models
+
+# libraries taking seconds to import, only the code using them may import them
+HEAVY_PACKAGES = ("keras", "tensorflow", "torch", "pinecone", "langchain_core", "langchain_google_genai", "matplotlib", "azure")
+
+
+def get_imported_modules(code: str) -> dict[str, int]:
+    """
+    runs code in a new isolated interpreter (no PYTHON* environment variables or user site) with -X importtime and
+    returns the cumulative import time of each module, in µs
+    """
+    code = f"import sys; sys.path.insert(0, {ROOT!r}); {code}"
+    result = subprocess.run([sys.executable, "-I", "-X", "importtime", "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+@pytest.mark.parametrize("code", [
+    "import src",
+    "import utils",
+    "import scripts.process_data",
+    # serving an ARIMA model
+    "from src import create_model, get_model, ModelRegistry; from utils import forecast; create_model('BIAT', 'ARIMA')",
+])
+def test_light_imports_dont_load_the_heavy_packages(code):
+    modules = get_imported_modules(code)
+
+    assert "src" in modules
+    heavy = sorted({name.split(".")[0] for name in modules if name.split(".")[0] in HEAVY_PACKAGES})
+    assert heavy == []
+
+def test_package_import_time():
+    modules = get_imported_modules("import src, utils")
+
+    # the packages only import the lazy loader, a few milliseconds at most
+    assert modules["src"] < 100_000
+    assert modules["utils"] < 100_000
+
+def test_lazy_exports():
+    from src.prediction_model.models.ARIMAModel import ARIMAModel
+
+    # the submodule of the same name doesn't hide the class
+    assert models.ARIMAModel is ARIMAModel
+    assert src.ARIMAModel is ARIMAModel
+    assert "LSTMModel" in dir(models)
+    with pytest.raises(AttributeError):
+        models.MissingModel
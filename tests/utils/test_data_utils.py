@@ -0,0 +1,74 @@
+import pytest
+import pandas as pd
+import numpy as np
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from utils.data_utils import write_stock_data, read_stock_data, read_all_stock_data, has_stock_data, get_partition_path, get_stock_data_version
+
+@pytest.fixture
+def processed_df():
+    return pd.DataFrame({
+        'date': pd.date_range("2023-01-01", periods=10),
+        'ouverture': np.arange(10.0),
+        'haut': np.arange(10.0) + 1,
+        'bas': np.arange(10.0) - 1,
+        'cloture': np.arange(10.0) + 0.5,
+        'volume': np.arange(10.0) * 100
+    })
+
+def test_write_and_read_round_trip(tmp_path, processed_df):
+    write_stock_data(processed_df, "AB", tmp_path)
+
+    assert has_stock_data("AB", tmp_path)
+    assert get_partition_path("AB", tmp_path).is_file()
+    result = read_stock_data("AB", tmp_path)
+    assert list(result.columns) == ['date', 'ouverture', 'haut', 'bas', 'cloture', 'volume']
+    assert pd.api.types.is_datetime64_any_dtype(result['date'])
+    assert (result['cloture'].values == processed_df['cloture'].values).all()
+
+def test_write_exports_csv(tmp_path, processed_df):
+    write_stock_data(processed_df, "AB", tmp_path)
+
+    exported = pd.read_csv(tmp_path / "AB.csv", sep=";")
+    assert exported['date'].iloc[0] == "2023-01-01"
+    assert len(exported) == 10
+
+def test_read_column_pruning_and_date_range(tmp_path, processed_df):
+    write_stock_data(processed_df, "AB", tmp_path)
+
+    result = read_stock_data("AB", tmp_path, columns=["cloture"], start_date="2023-01-03", end_date="2023-01-05")
+
+    assert list(result.columns) == ['date', 'cloture']
+    assert list(result['cloture']) == [2.5, 3.5, 4.5]
+
+def test_read_falls_back_to_csv(tmp_path, processed_df):
+    processed_df.to_csv(tmp_path / "AB.csv", index=False, sep=";")
+
+    result = read_stock_data("AB", tmp_path, columns=["date", "cloture"], start_date="2023-01-09")
+
+    assert not has_stock_data("AB", tmp_path)
+    assert pd.api.types.is_datetime64_any_dtype(result['date'])
+    assert list(result['cloture']) == [8.5, 9.5]
+
+def test_read_all_stock_data(tmp_path, processed_df):
+    write_stock_data(processed_df, "AB", tmp_path, export_csv=False)
+    write_stock_data(processed_df.assign(cloture=processed_df['cloture'] * 2), "AL", tmp_path, export_csv=False)
+
+    result = read_all_stock_data(tmp_path, columns=["cloture"], start_date="2023-01-10")
+
+    assert list(result.columns) == ['symbol', 'date', 'cloture']
+    assert list(result['symbol']) == ["AB", "AL"]
+    assert list(result['cloture']) == [9.5, 19.0]
+    assert list(read_all_stock_data(tmp_path, stocks=["AL"])['symbol'].unique()) == ["AL"]
+
+def test_write_returns_the_data_version(tmp_path, processed_df):
+    version = write_stock_data(processed_df, "AB", tmp_path)
+
+    assert version == get_stock_data_version(processed_df)
+    assert write_stock_data(processed_df.copy(), "AB", tmp_path) == version
+    changed = processed_df.copy()
+    changed.loc[9, 'cloture'] += 1
+    assert write_stock_data(changed, "AB", tmp_path) != version
+    assert write_stock_data(processed_df.head(9), "AB", tmp_path) != version
@@ -11,8 +11,8 @@ from datetime import datetime
 import sys,os
 from pathlib import Path
 sys.path.insert(0, str(Path(os.getcwd()) / '..' / '..'))
-from src import IModel
-from utils import split_dataset, get_features_target_from_dataset, plot_stock_graph, train, evaluate, plot_evaluation_result, train_model, predict
+from src import IModel, ARIMAModel
+from utils import split_dataset, get_features_target_from_dataset, plot_stock_graph, train, evaluate, plot_evaluation_result, train_model, predict, forecast
 from enums import ValidationMetricEnum
 
 def test_split_dataset():
@@ -29,6 +29,32 @@ def test_get_features_target_from_dataset_regular_case():
     assert X.shape[1:] == (10, 1)
     assert Y.shape[0] == 90
 
+def test_get_features_target_from_dataset_matches_sliced_windows():
+    arr = np.arange(60, dtype=float).reshape(20, 3)
+    X, Y = get_features_target_from_dataset(arr, True, closeColIdx=1, isArimaContext=False, window=4)
+    assert X.shape == (16, 4, 3)
+    for i in range(4, 20):
+        assert (X[i-4] == arr[i-4:i]).all()
+    assert (Y == arr[4:, 1]).all()
+
+def test_get_features_target_from_dataset_returns_read_only_views():
+    arr = np.array([[i] for i in range(100)], dtype=float)
+    X, _ = get_features_target_from_dataset(arr, False, closeColIdx=0, isArimaContext=False, window=10)
+    assert np.shares_memory(X, arr)
+    assert not X.flags.writeable
+
+def test_get_features_target_from_dataset_float32():
+    arr = np.array([[i] for i in range(100)], dtype=float)
+    X, Y = get_features_target_from_dataset(arr, False, closeColIdx=0, isArimaContext=False, window=10, use_float32=True)
+    assert X.dtype == np.float32
+    assert Y.dtype == np.float32
+
+def test_get_features_target_from_dataset_shorter_than_window():
+    arr = np.array([[i] for i in range(5)], dtype=float)
+    X, Y = get_features_target_from_dataset(arr, False, closeColIdx=0, isArimaContext=False, window=10)
+    assert X.shape == (0, 10, 1)
+    assert Y.shape[0] == 0
+
 def test_get_features_target_from_dataset_arima_context():
     arr = np.array([[i] for i in range(10)])
     X, Y = get_features_target_from_dataset(arr, False, closeColIdx=0, isArimaContext=True)
@@ -89,8 +115,7 @@ def test_plot_evaluation_result_calls_plotting():
         mock_show.assert_called_once()
 
 
-@patch("matplotlib.pyplot")
-def test_plot_stock_graph_calls_plotting(mock_plt):
+def test_plot_stock_graph_calls_plotting():
     dates = np.array([1, 2, 3])
     y_test = np.array([10, 20, 30])
     y_predict = np.array([12, 18, 33])
@@ -126,6 +151,44 @@ def test_predict_sequence_generation():
     assert predictions.shape[0] == 3
     assert mock_model.predict.call_count == 3
 
+def test_predict_rolls_predictions_into_the_window():
+    mock_model = Mock(spec=IModel)
+    # the model predicts the mean of the window
+    mock_model.predict.side_effect = lambda x: np.array([[x.mean()]])
+    dataset = np.array([[i] for i in range(10)], dtype=float)
+    scaler = MinMaxScaler().fit(dataset)
+
+    predictions = predict(mock_model, dataset, scaler, num_days=2, window_size=2)
+
+    assert predictions[0] == pytest.approx(8.5)
+    assert predictions[1] == pytest.approx(8.75)
+
+def test_forecast_batches_series_sharing_a_model():
+    mock_model = Mock(spec=IModel)
+    mock_model.predict_step.side_effect = lambda windows: windows.mean(axis=(1, 2))
+    first = np.array([[i] for i in range(10)], dtype=float)
+    second = np.array([[10 - i] for i in range(10)], dtype=float)
+    scalers = [MinMaxScaler().fit(first), MinMaxScaler().fit(second)]
+
+    forecasts = forecast([mock_model, mock_model], [first, second], scalers, num_days=3, window_size=2)
+
+    # one batched call per step for both series
+    assert mock_model.predict_step.call_count == 3
+    assert mock_model.predict_step.call_args_list[0][0][0].shape == (2, 2, 1)
+    assert forecasts[0] == pytest.approx([8.5, 8.75, 8.625])
+    assert forecasts[1] == pytest.approx([1.5, 1.25, 1.375])
+
+def test_forecast_arima_single_call():
+    mock_model = Mock(spec=ARIMAModel)
+    mock_model.forecast.return_value = np.array([0.5, 1.0])
+    dataset = np.array([[i] for i in range(10)], dtype=float)
+    scaler = MinMaxScaler().fit(dataset)
+
+    forecasts = forecast([mock_model], [dataset], [scaler], num_days=2, window_size=5)
+
+    mock_model.forecast.assert_called_once_with(2)
+    assert forecasts[0] == pytest.approx([4.5, 9.0])
+
 @patch("utils.train_test_utils.train")
 def test_train_model_trains_and_returns_scaler(mock_train_func):
     mock_model = Mock(spec=IModel)
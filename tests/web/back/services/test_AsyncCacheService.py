@@ -0,0 +1,429 @@
+import asyncio
+import pytest
+import pandas as pd
+from unittest.mock import patch
+import valkey.exceptions
+import sys, os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..')))
+from src import AsyncCacheService, ArrowCodec, get_stock_version_keys
+from src.metrics import CACHE_REQUESTS
+
+
+class FakeValkey:
+    """in-memory stand-in of the valkey asyncio client, counting the round trips"""
+
+    def __init__(self):
+        self.store = {}
+        self.expirations = {}
+        self.round_trips = 0
+        self.closed = False
+
+    async def ping(self):
+        self.round_trips += 1
+        return True
+
+    async def get(self, key):
+        self.round_trips += 1
+        return self.store.get(key)
+
+    async def setex(self, key, expiration, val):
+        self.round_trips += 1
+        self._setex(key, expiration, val)
+
+    async def mget(self, keys):
+        self.round_trips += 1
+        return [self.store.get(key) for key in keys]
+
+    async def set(self, key, val, nx=False, px=None):
+        self.round_trips += 1
+        if nx and key in self.store:
+            return None
+        self._setex(key, px / 1000 if px != None else None, val)
+        return True
+
+    async def eval(self, script, numkeys, key, token):
+        # only the lock release script is used
+        self.round_trips += 1
+        if self.store.get(key) == token.encode('utf-8'):
+            del self.store[key]
+            return 1
+        return 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def aclose(self):
+        self.closed = True
+
+    def _setex(self, key, expiration, val):
+        self.store[key] = val.encode('utf-8') if isinstance(val, str) else val
+        self.expirations[key] = expiration
+
+
+class FakePipeline:
+    def __init__(self, client: FakeValkey):
+        self.client = client
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    def setex(self, key, expiration, val):
+        self.commands.append((key, expiration, val))
+        return self
+
+    async def execute(self):
+        self.client.round_trips += 1
+        for command in self.commands:
+            self.client._setex(*command)
+        return [True] * len(self.commands)
+
+
+class DeadValkey:
+    """a client whose every command fails like an unreachable valkey"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __getattr__(self, name):
+        async def command(*args, **kwargs):
+            self.calls += 1
+            raise valkey.exceptions.ConnectionError("Connection refused")
+        return command
+
+    def pipeline(self, transaction=True):
+        raise valkey.exceptions.ConnectionError("Connection refused")
+
+
+@pytest.fixture(autouse=True)
+def reset_singleton():
+    # Reset the singleton before each test
+    AsyncCacheService._AsyncCacheService__shared_instance = None
+    CACHE_REQUESTS.clear()
+    yield
+    AsyncCacheService._AsyncCacheService__shared_instance = None
+
+
+def test_get_instance_cache_disabled():
+    assert AsyncCacheService.getInstance("redis://localhost", isCacheDisabled=True, expirationTime=3600) is None
+
+@patch('valkey.asyncio.BlockingConnectionPool.from_url')
+def test_get_instance_builds_a_bounded_pool(mock_from_url):
+    first_service = AsyncCacheService.getInstance("redis://localhost", False, 3600, maxConnections=4, socketTimeout=0.2)
+    second_service = AsyncCacheService.getInstance("redis://another", False, 9999)
+
+    assert first_service is second_service
+    mock_from_url.assert_called_once_with("redis://localhost", max_connections=4, timeout=0.2, socket_timeout=0.2, socket_connect_timeout=0.2)
+
+def test_get_or_none_is_a_single_round_trip():
+    client = FakeValkey()
+    service = AsyncCacheService("", 3600, client=client)
+
+    async def scenario():
+        miss = await service.get_or_none('my_key')
+        await service.set('my_key', 'cached_value')
+        hit = await service.get_or_none('my_key')
+        return miss, hit
+
+    miss, hit = asyncio.run(scenario())
+
+    assert miss is None
+    assert hit == 'cached_value'
+    assert client.round_trips == 3
+    assert client.expirations['my_key'] == 3600
+    assert CACHE_REQUESTS.get(cache="backend", result="hit") == 1
+    assert CACHE_REQUESTS.get(cache="backend", result="miss") == 1
+
+def test_mset_and_mget_are_pipelined():
+    client = FakeValkey()
+    service = AsyncCacheService("", 60, client=client)
+
+    async def scenario():
+        await service.mset({'a': '1', 'b': '2', 'c': '3'})
+        return await service.mget(['a', 'missing', 'c'])
+
+    values = asyncio.run(scenario())
+
+    assert values == ['1', None, '3']
+    assert client.round_trips == 2
+    assert client.expirations == {'a': 60, 'b': 60, 'c': 60}
+    assert asyncio.run(service.mget([])) == []
+
+def test_dead_cache_degrades_to_a_miss():
+    client = DeadValkey()
+    service = AsyncCacheService("", 3600, retryDelay=30, client=client)
+
+    async def scenario():
+        await service.set('my_key', 'value')
+        return await service.get_or_none('my_key'), await service.mget(['a', 'b']), await service.ping()
+
+    value, values, alive = asyncio.run(scenario())
+
+    assert value is None
+    assert values == [None, None]
+    assert alive is False
+    # the cache is skipped after the first failure instead of costing a timeout per request
+    assert client.calls == 1
+    assert service.isAvailable() is False
+    assert CACHE_REQUESTS.get(cache="backend", result="miss") == 3
+
+def test_dead_cache_is_retried_after_the_delay():
+    client = DeadValkey()
+    service = AsyncCacheService("", 3600, retryDelay=0, client=client)
+
+    asyncio.run(service.get_or_none('a'))
+    asyncio.run(service.mset({'a': '1'}))
+    asyncio.run(service.get_or_none('a'))
+
+    assert client.calls == 2
+    assert service.isAvailable() is True
+
+def test_payloads_are_stored_as_is():
+    client = FakeValkey()
+    service = AsyncCacheService("", 3600, codec=ArrowCodec("zstd"), client=client)
+    payload = service.codec.encode(pd.DataFrame({"date": pd.date_range("2020-01-01", periods=3), "cloture": [1.0, 2.0, 3.0]}))
+
+    async def scenario():
+        await service.set_payload('stock/AB', payload)
+        return await service.get_payload('stock/AB'), await service.get_payload('stock/AL')
+
+    hit, miss = asyncio.run(scenario())
+
+    assert hit == payload
+    assert miss is None
+    assert service.codec.decode(hit)["cloture"].tolist() == [1.0, 2.0, 3.0]
+
+def test_concurrent_misses_are_computed_once():
+    client = FakeValkey()
+    service = AsyncCacheService("", 3600, client=client)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return b'payload'
+
+    async def scenario():
+        return await asyncio.gather(*[service.get_or_compute('stock/AB', compute) for _ in range(10)])
+
+    payloads = asyncio.run(scenario())
+
+    assert payloads == [b'payload'] * 10
+    assert len(calls) == 1
+    assert 'lock:stock/AB' not in client.store # released
+    # a fresh hit doesn't compute anything
+    assert asyncio.run(service.get_or_compute('stock/AB', compute)) == b'payload'
+    assert len(calls) == 1
+
+def test_concurrent_misses_across_instances_are_computed_once():
+    client = FakeValkey()
+    # two backend instances sharing the same valkey
+    first_service = AsyncCacheService("", 3600, client=client)
+    second_service = AsyncCacheService("", 3600, client=client)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.2)
+        return b'payload'
+
+    async def scenario():
+        return await asyncio.gather(first_service.get_or_compute('stock/AB', compute), second_service.get_or_compute('stock/AB', compute))
+
+    assert asyncio.run(scenario()) == [b'payload', b'payload']
+    assert len(calls) == 1
+
+def test_expired_lock_holder_is_not_waited_for_forever():
+    client = FakeValkey()
+    service = AsyncCacheService("", 3600, lockTimeout=0.2, client=client)
+    # taken by an instance that died while computing
+    client.store['lock:stock/AB'] = b'other-token'
+
+    async def compute():
+        return b'payload'
+
+    assert asyncio.run(service.get_or_compute('stock/AB', compute)) == b'payload'
+    assert client.store['lock:stock/AB'] == b'other-token' # not ours, left to expire
+
+def test_stale_payload_is_served_while_refreshed_once():
+    client = FakeValkey()
+    service = AsyncCacheService("", 3600, softExpirationTime=0, client=client)
+    versions = []
+
+    async def compute():
+        versions.append(1)
+        await asyncio.sleep(0.05)
+        return f'v{len(versions)}'.encode()
+
+    async def scenario():
+        first = await service.get_or_compute('stock/AB', compute)
+        # stale right away, every caller gets the previous payload without waiting and a single refresh starts
+        stale = await asyncio.gather(*[service.get_or_compute('stock/AB', compute) for _ in range(5)])
+        await asyncio.sleep(0.1)
+        return first, stale, await service.get_or_compute('stock/AB', compute)
+
+    first, stale, refreshed = asyncio.run(scenario())
+
+    assert first == b'v1'
+    assert stale == [b'v1'] * 5
+    assert refreshed == b'v2'
+    assert client.expirations['stock/AB'] == 3600
+
+def test_payload_is_computed_again_when_its_version_changes():
+    client = FakeValkey()
+    service = AsyncCacheService("", 3600, client=client)
+    versionKeys = get_stock_version_keys('AB')
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return f'v{len(calls)}'.encode()
+
+    async def scenario():
+        first = await service.get_or_compute('stock/AB', compute, versionKeys)
+        hit = await service.get_or_compute('stock/AB', compute, versionKeys)
+        # published by the training script
+        client.store['version/stock/AB/model'] = b'2020-01-02 00:00:00'
+        retrained = await service.get_or_compute('stock/AB', compute, versionKeys)
+        return first, hit, retrained, await service.get_or_compute('stock/AB', compute, versionKeys)
+
+    first, hit, retrained, retrained_hit = asyncio.run(scenario())
+
+    assert (first, hit) == (b'v1', b'v1')
+    assert (retrained, retrained_hit) == (b'v2', b'v2')
+    assert len(calls) == 2
+    # the payload and its versions are read in a single round trip
+    assert CACHE_REQUESTS.get(cache="backend", result="hit") == 2
+
+def test_compute_errors_are_raised_to_every_caller():
+    client = FakeValkey()
+    service = AsyncCacheService("", 3600, client=client)
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        raise ValueError("Company not found")
+
+    async def scenario():
+        return await asyncio.gather(*[service.get_or_compute('stock/AB', compute) for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(scenario())
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert client.store == {} # nothing cached and the lock is released
+
+def test_get_or_compute_with_a_dead_cache():
+    client = DeadValkey()
+    service = AsyncCacheService("", 3600, client=client)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return b'payload'
+
+    async def scenario():
+        return await asyncio.gather(*[service.get_or_compute('stock/AB', compute) for _ in range(3)])
+
+    assert asyncio.run(scenario()) == [b'payload'] * 3
+    assert len(calls) == 1
+
+class FullValkey(FakeValkey):
+    """a valkey at maxmemory with the noeviction policy: the reads work, the writes are rejected"""
+
+    async def setex(self, key, expiration, val):
+        self.round_trips += 1
+        raise valkey.exceptions.ResponseError("OOM command not allowed when used memory > 'maxmemory'.")
+
+def test_rejected_writes_dont_fail_the_request():
+    client = FullValkey()
+    service = AsyncCacheService("", 3600, client=client)
+
+    async def compute():
+        return b'payload'
+
+    async def scenario():
+        await service.set('my_key', 'value')
+        first = await service.get_or_compute('stock/AB', compute)
+        second = await service.get_or_compute('stock/AB', compute)
+        return first, second
+
+    assert asyncio.run(scenario()) == (b'payload', b'payload')
+    # unlike a dead cache, a rejected command doesn't skip the cache
+    assert service.isAvailable() is True
+    assert client.store == {}
+
+class FakePubSub:
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.channels = []
+        self.closed = False
+
+    async def subscribe(self, channel):
+        self.channels.append(channel)
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=None):
+        if not self.messages:
+            raise valkey.exceptions.ConnectionError("Connection closed by server")
+        return self.messages.pop(0)
+
+    async def aclose(self):
+        self.closed = True
+
+def test_listen_invalidations():
+    client = FakeValkey()
+    pubsub = FakePubSub([
+        {"type": "message", "data": b'{"part": "model", "stocks": ["AB", "AL"]}'},
+        None,
+        {"type": "message", "data": b'not json'},
+        {"type": "message", "data": b'{"part": "data", "stocks": ["BT"]}'},
+    ])
+    client.pubsub = lambda: pubsub
+    service = AsyncCacheService("", 3600, retryDelay=10, client=client)
+    received = []
+
+    async def scenario():
+        listener = asyncio.ensure_future(service.listen_invalidations(received.append))
+        # the fake connection drops after the messages, the listener then waits before subscribing again
+        await asyncio.sleep(0.05)
+        listener.cancel()
+
+    asyncio.run(scenario())
+
+    assert pubsub.channels == ["cache-invalidation"]
+    # None when subscribed: what was published before is unknown
+    assert received == [None, {"part": "model", "stocks": ["AB", "AL"]}, {"part": "data", "stocks": ["BT"]}]
+    assert pubsub.closed is True
+
+def test_close():
+    client = FakeValkey()
+    service = AsyncCacheService("", 3600, client=client)
+
+    asyncio.run(service.close())
+
+    assert client.closed is True
+
+def test_entries_are_read_and_written_in_a_single_round_trip():
+    client = FakeValkey()
+    service = AsyncCacheService("", 3600, client=client)
+    keys = ['forecast/AB', 'forecast/CD', 'forecast/EF']
+    versionKeys = [get_stock_version_keys(stock) for stock in ('AB', 'CD', 'EF')]
+
+    async def scenario():
+        misses = await service.mget_entries(keys, versionKeys)
+        await service.mset_entries({'forecast/AB': (b'ab', misses[0][1]), 'forecast/CD': (b'cd', misses[1][1])})
+        client.store['version/stock/CD/data'] = b'2020-01-02'
+        return misses, await service.mget_entries(keys, versionKeys)
+
+    misses, entries = asyncio.run(scenario())
+
+    assert [payload for payload, _ in misses] == [None, None, None]
+    # CD's data changed since its payload was computed
+    assert [payload for payload, _ in entries] == [b'ab', None, None]
+    assert entries[1][1] != misses[1][1]
+    assert client.round_trips == 3
+    # the entries can be read by get_or_compute
+    assert asyncio.run(service.get_or_compute('forecast/AB', None, versionKeys[0])) == b'ab'
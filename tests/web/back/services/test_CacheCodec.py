@@ -0,0 +1,58 @@
+import gzip
+import json
+import pytest
+import numpy as np
+import pandas as pd
+import sys, os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..')))
+from src import JsonCodec, GzipJsonCodec, ArrowCodec, get_cache_codec
+
+
+@pytest.fixture
+def stock_df():
+    return pd.DataFrame({
+        "date": pd.date_range("2020-01-01", periods=5, freq="D"),
+        "ouverture": [100.5, 101.25, np.float32(102.0), 103.0, 104.0],
+        "haut": [101.0, 102.0, 103.0, 104.0, 105.0],
+        "bas": [99.0, 100.0, 101.0, 102.0, 103.0],
+        "cloture": [100.0, 101.0, 102.0, 103.0, 104.123456789012],
+        "volume": [10.0, 20.0, 30.0, 40.0, 0.0],
+    })
+
+def test_json_codec_matches_the_records_payload(stock_df):
+    data = JsonCodec().encode(stock_df)
+
+    payload = json.loads(data)
+    assert payload["columns"] == ["date", "ouverture", "haut", "bas", "cloture", "volume"]
+    assert payload["data"][0] == {"date": "2020-01-01T00:00:00", "ouverture": 100.5, "haut": 101.0, "bas": 99.0, "cloture": 100.0, "volume": 10.0}
+    assert payload["data"][4]["cloture"] == 104.123456789012
+
+def test_gzip_json_codec(stock_df):
+    codec = GzipJsonCodec()
+    data = codec.encode(stock_df)
+
+    assert codec.content_encoding == "gzip"
+    assert gzip.decompress(data) == JsonCodec().encode(stock_df)
+    assert codec.decompress(data) == JsonCodec().encode(stock_df)
+    # no timestamp in the gzip header, the same dataframe always gives the same payload
+    assert codec.encode(stock_df) == data
+
+@pytest.mark.parametrize("name", ["json", "json-gzip", "arrow-zstd", "arrow-lz4"])
+def test_codecs_round_trip(stock_df, name):
+    codec = get_cache_codec(name)
+    decoded = codec.decode(codec.encode(stock_df))
+
+    assert codec.name == name
+    assert decoded.columns.tolist() == stock_df.columns.tolist()
+    assert np.allclose(decoded["cloture"].to_numpy(), stock_df["cloture"].to_numpy(), rtol=0, atol=0)
+    assert (pd.to_datetime(decoded["date"]) == stock_df["date"]).all()
+
+def test_arrow_codec_compresses(stock_df):
+    df = pd.concat([stock_df] * 1000, ignore_index=True)
+
+    assert len(ArrowCodec("zstd").encode(df)) < len(JsonCodec().encode(df)) / 4
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        get_cache_codec("pickle")
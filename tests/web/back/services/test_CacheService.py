@@ -4,7 +4,7 @@ import valkey.exceptions
 import sys, os
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..')))
-from src import CacheService
+from src import CacheService, GzipJsonCodec
 
 @pytest.fixture(autouse=True)
 def reset_singleton():
@@ -119,3 +119,17 @@ def test_get_expiration_time_formatting(mock_from_url):
     output = service.getExpirationTime()
 
     assert output == "1 d 2 h 3 mn 4 s"
+
+@patch('valkey.from_url')
+def test_payload_methods(mock_from_url):
+    mock_client = MagicMock()
+    mock_client.get.return_value = b'\x1f\x8b payload'
+    mock_from_url.return_value = mock_client
+
+    service = CacheService.getInstance("redis://localhost", isCacheDisabled=False, expirationTime=3600, codec=GzipJsonCodec())
+    service.set_payload('stock/AB', b'\x1f\x8b payload')
+    payload = service.get_payload('stock/AB')
+
+    assert payload == b'\x1f\x8b payload' # returned as is, not decoded
+    assert isinstance(service.codec, GzipJsonCodec)
+    mock_client.setex.assert_called_once_with('stock/AB', 3600, b'\x1f\x8b payload')
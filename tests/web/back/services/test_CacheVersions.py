@@ -0,0 +1,57 @@
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+import os, sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..')))
+from src import get_stock_version_keys, publish_stock_versions, publish_document_sources, MODEL_VERSION, DATA_VERSION
+from src.web.back.services.CacheVersions import get_version, CACHE_INVALIDATION_CHANNEL
+
+
+def test_get_version():
+    assert get_stock_version_keys("AB") == ["version/stock/AB/model", "version/stock/AB/data"]
+    assert get_version([b"2020-01-01 00:00:00", None]) == "2020-01-01 00:00:00|"
+
+@patch('valkey.from_url')
+def test_publish_stock_versions(mock_from_url):
+    mock_client = MagicMock()
+    mock_from_url.return_value = mock_client
+    pipe = mock_client.pipeline.return_value
+
+    published = publish_stock_versions(DATA_VERSION, {"AB": "abc", "AL": "def"}, "redis://localhost")
+
+    assert published is True
+    pipe.set.assert_any_call("version/stock/AB/data", "abc")
+    pipe.set.assert_any_call("version/stock/AL/data", "def")
+    assert pipe.publish.call_args.args[0] == CACHE_INVALIDATION_CHANNEL
+    assert json.loads(pipe.publish.call_args.args[1]) == {"part": "data", "stocks": ["AB", "AL"]}
+    pipe.execute.assert_called_once()
+    mock_client.close.assert_called_once()
+
+@patch('valkey.from_url')
+@patch.dict(os.environ, {"DISABLE_BACKEND_CACHE": "true", "BACKEND_CACHE_CONNECTION_STRING": "redis://localhost"})
+def test_publish_stock_versions_cache_disabled(mock_from_url):
+    assert publish_stock_versions(MODEL_VERSION, {"AB": "2020-01-01"}) is False
+    mock_from_url.assert_not_called()
+
+@patch('valkey.from_url')
+def test_publish_stock_versions_does_not_fail_the_scripts(mock_from_url):
+    mock_from_url.return_value.pipeline.return_value.execute.side_effect = ConnectionError("Connection refused")
+
+    assert publish_stock_versions(MODEL_VERSION, {"AB": "2020-01-01"}, "redis://localhost") is False
+    with pytest.raises(ValueError):
+        publish_stock_versions("forecast", {"AB": "2020-01-01"}, "redis://localhost")
+
+@patch('valkey.from_url')
+def test_publish_document_sources(mock_from_url):
+    mock_client = MagicMock()
+    mock_from_url.return_value = mock_client
+
+    assert publish_document_sources(["news"], "redis://localhost") is True
+    channel, message = mock_client.publish.call_args.args
+    assert channel == CACHE_INVALIDATION_CHANNEL
+    assert json.loads(message) == {"part": "documents", "sources": ["news"]}
+    mock_client.close.assert_called_once()
+
+    mock_client.publish.side_effect = ConnectionError("Connection refused")
+    assert publish_document_sources(["news"], "redis://localhost") is False
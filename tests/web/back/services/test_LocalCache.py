@@ -0,0 +1,58 @@
+import time
+import sys, os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..')))
+from src import LocalCache
+from src.metrics import CACHE_REQUESTS
+
+
+def test_lru_eviction():
+    cache = LocalCache(2, 60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a") # b becomes the least recently used
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+def test_ttl():
+    cache = LocalCache(10, 0.05)
+    cache.set("a", b"payload")
+
+    assert cache.get("a") == b"payload"
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+def test_version():
+    cache = LocalCache(10, 60)
+    cache.set("stock/AB", b"v1", version=(1, 1))
+
+    assert cache.get("stock/AB", version=(1, 1)) == b"v1"
+    assert cache.get("stock/AB", version=(2, 1)) is None
+    # the outdated entry was removed
+    assert cache.get("stock/AB", version=(1, 1)) is None
+
+def test_invalidate_and_hit_counters():
+    CACHE_REQUESTS.clear()
+    cache = LocalCache(10, 60)
+    cache.set("stock/AB/json", 1)
+    cache.set("stock/AB/arrow-zstd", 2)
+    cache.set("stock/AL/json", 3)
+    cache.set("companies", 4)
+
+    cache.invalidate("companies")
+    cache.invalidate_prefix("stock/AB/")
+
+    assert [cache.get(key) for key in ["stock/AB/json", "stock/AB/arrow-zstd", "stock/AL/json", "companies"]] == [None, None, 3, None]
+    assert CACHE_REQUESTS.get(cache="l1", result="hit") == 1
+    assert CACHE_REQUESTS.get(cache="l1", result="miss") == 3
+
+def test_disabled():
+    cache = LocalCache(0, 60)
+    cache.set("a", 1)
+
+    assert cache.get("a") is None
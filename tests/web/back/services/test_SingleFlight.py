@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+import sys, os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..')))
+from src import SingleFlight
+
+
+def test_concurrent_calls_share_one_computation():
+    singleFlight = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    async def scenario():
+        results = await asyncio.gather(*[singleFlight.run('AB', compute) for _ in range(5)], singleFlight.run('AL', compute))
+        return results, singleFlight.is_running('AB')
+
+    results, running = asyncio.run(scenario())
+
+    assert len(calls) == 2 # one per key
+    assert len(set(results[:5])) == 1
+    assert running is False
+    # once done, the next call computes again
+    asyncio.run(singleFlight.run('AB', compute))
+    assert len(calls) == 3
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    singleFlight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.1)
+        return 'done'
+
+    async def scenario():
+        first = asyncio.ensure_future(singleFlight.run('AB', compute))
+        second = asyncio.ensure_future(singleFlight.run('AB', compute))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(scenario()) == 'done'
+
+def test_errors_are_raised_to_every_caller():
+    singleFlight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise ValueError("failed")
+
+    async def scenario():
+        return await asyncio.gather(singleFlight.run('AB', compute), singleFlight.run('AB', compute), return_exceptions=True)
+
+    assert [type(result) for result in asyncio.run(scenario())] == [ValueError, ValueError]
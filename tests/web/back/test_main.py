@@ -1,13 +1,29 @@
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from fastapi.testclient import TestClient
-from src.web.back.main import app
+from src.web.back.main import app, modelRegistry, localCache, ragCache
 from sklearn.preprocessing import MinMaxScaler
 import os, sys
 from pathlib import Path
 sys.path.insert(0, str(Path(os.path.dirname(__file__)) / '..' / '..' / '..'))
 import pandas as pd
-from src import LSTMModel
+import time
+import json
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from src import LSTMModel, ARIMAModel, AsyncCacheService, GzipJsonCodec, ArrowCodec
+from src.metrics import metricsRegistry, MODEL_LOAD_SECONDS, CACHE_REQUESTS, RAG_TIME_TO_FIRST_TOKEN_SECONDS
+
+
+@pytest.fixture(autouse=True)
+def clear_model_registry():
+    modelRegistry.clear()
+    localCache.clear()
+    ragCache.clear()
+    yield
+    modelRegistry.clear()
+    localCache.clear()
+    ragCache.clear()
 
 
 @patch("src.web.back.main.os.listdir")
@@ -22,22 +38,51 @@ def test_get_companies(mock_dotenv, mock_listdir):
     assert response.status_code == 200
     assert response.json() == ["AB", "AL"]
 
+
+@patch("src.web.back.main.os.listdir")
+@patch("dotenv.load_dotenv")
+@patch.dict(os.environ, {"WINDOW_SIZE": "1", "MODEL_NAME": "LSTM", "MODEL_LOCATION": "LOCAL", "DISABLE_BACKEND_CACHE": "true"})
+def test_get_companies_dead_cache(mock_dotenv, mock_listdir):
+    mock_listdir.return_value = ["AB.csv.dvc"]
+    # nothing listens on port 1, the cache can't be reached
+    deadCache = AsyncCacheService("valkey://127.0.0.1:1", 60, socketTimeout=0.2)
+
+    with patch("src.web.back.main.DISABLE_BACKEND_CACHE", False), patch("src.web.back.main.cacheService", deadCache):
+        with TestClient(app) as client:
+            response = client.get("/companies")
+
+    assert response.status_code == 200
+    assert response.json() == ["AB"]
+    assert deadCache.isAvailable() is False
+
+
+def test_empty_hard_ttl_falls_back_to_the_former_variable():
+    # e.g. an image with an empty placeholder, deployed with the former variable
+    env = {**os.environ, "BACKEND_CACHE_HARD_TTL": "", "BACKEND_CACHE_SOFT_TTL": "", "BACKEND_CACHE_EXPIRATION_TIME": "3600"}
+    code = "import src.web.back.main as main; print(main.BACKEND_CACHE_HARD_TTL, main.BACKEND_CACHE_SOFT_TTL)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).parent.parent.parent.parent, env=env, capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split()[-2:] == ["3600", "3600"]
+
+
+@patch("src.web.back.main.get_forecast", return_value=None)
 @patch("src.web.back.main.get_model")
 @patch("src.web.back.main.get_scaler")
-@patch("src.web.back.main.predict")
+@patch("src.web.back.main.forecast")
 @patch("src.web.back.main.os.path.exists")
 @patch("src.web.back.main.pd.read_csv")
 @patch("src.web.back.main.subprocess.run")
 @patch("dotenv.load_dotenv")
 @patch.dict(os.environ, {"WINDOW_SIZE": "1", "MODEL_NAME": "LSTM", "MODEL_LOCATION": "LOCAL", "DISABLE_BACKEND_CACHE": "true"})
-def test_get_stock_valid(mock_dotenv, mock_subprocess, mock_read_csv, mock_exists, mock_predict, mock_get_scaler, mock_get_model):
+def test_get_stock_valid(mock_dotenv, mock_subprocess, mock_read_csv, mock_exists, mock_forecast, mock_get_scaler, mock_get_model, mock_get_forecast):
     # Access mocks to avoid unused argument warnings
     _ = mock_dotenv
     _ = mock_subprocess
     mock_exists.return_value = True
     mock_df = pd.DataFrame({"date": ["2020-01-01"], "ouverture": [100], "haut": [100], "bas": [100], "cloture": [100], "volume": [0]})
     mock_read_csv.return_value = mock_df
-    mock_predict.return_value = [100]
+    mock_forecast.return_value = [[100]]
     mock_get_scaler.return_value = MinMaxScaler()
     model = LSTMModel("AB")
     model.last_trained_date = max(pd.to_datetime(mock_df["date"], format='%Y-%m-%d', dayfirst=True))
@@ -52,6 +97,27 @@ def test_get_stock_valid(mock_dotenv, mock_subprocess, mock_read_csv, mock_exist
     assert "data" in data
     assert data["columns"] == ["date", "ouverture", "haut", "bas", "cloture", "volume"]
     assert data["data"][0]["cloture"] == 100
+    assert MODEL_LOAD_SECONDS.get_count(location="LOCAL") >= 1
+    assert CACHE_REQUESTS.get(cache="forecast_store", result="miss") >= 1
+
+
+@patch("src.web.back.main.os.listdir")
+@patch("dotenv.load_dotenv")
+@patch.dict(os.environ, {"WINDOW_SIZE": "1", "MODEL_NAME": "LSTM", "MODEL_LOCATION": "LOCAL", "DISABLE_BACKEND_CACHE": "true"})
+def test_metrics(mock_dotenv, mock_listdir):
+    mock_listdir.return_value = ["AB.csv.dvc"]
+    metricsRegistry.clear()
+
+    with TestClient(app) as client:
+        client.get("/companies")
+        client.get("/companies")
+        response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_request_seconds_count{method="GET",route="/companies",status="200"} 2' in response.text
+    assert "# TYPE inference_seconds histogram" in response.text
+
 
 @patch("src.web.back.main.os.path.exists")
 @patch("dotenv.load_dotenv")
@@ -62,4 +128,347 @@ def test_get_stock_not_found(mock_dotenv, mock_exists):
     with TestClient(app) as client:
         response = client.get("/stock/UNKNOWN")
     
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+
+@patch("src.web.back.main.get_model")
+@patch("src.web.back.main.os.path.exists")
+@patch("src.web.back.main.pd.read_csv")
+@patch("dotenv.load_dotenv")
+@patch.dict(os.environ, {"WINDOW_SIZE": "2", "MODEL_NAME": "LSTM", "MODEL_LOCATION": "LOCAL", "DISABLE_BACKEND_CACHE": "true"})
+def test_get_stock_served_from_forecast_store(mock_dotenv, mock_read_csv, mock_exists, mock_get_model, tmp_path):
+    from src.handlers.forecast_handler import save_forecast
+    mock_exists.return_value = True
+    mock_read_csv.return_value = pd.DataFrame({"date": ["2020-01-01"], "ouverture": [100], "haut": [100], "bas": [100], "cloture": [100], "volume": [0]})
+
+    with patch("src.handlers.forecast_handler.FORECAST_LOCAL_PATH", tmp_path):
+        save_forecast([101, 102, 103], "LOCAL", "AB", pd.to_datetime("2020-01-01"))
+        with TestClient(app) as client:
+            response = client.get("/stock/AB")
+
+    assert response.status_code == 200
+    mock_get_model.assert_not_called()
+    assert [row["cloture"] for row in response.json()["data"]] == [100, 101, 102]
+
+
+@patch("src.web.back.main.get_model")
+@patch("src.web.back.main.get_scaler")
+@patch("src.web.back.main.forecast")
+@patch("src.web.back.main.os.path.exists")
+@patch("src.web.back.main.pd.read_csv")
+@patch("dotenv.load_dotenv")
+@patch.dict(os.environ, {"WINDOW_SIZE": "1", "MODEL_NAME": "LSTM", "MODEL_LOCATION": "LOCAL", "DISABLE_BACKEND_CACHE": "true"})
+def test_get_stock_stale_forecast_falls_back_to_inference(mock_dotenv, mock_read_csv, mock_exists, mock_forecast, mock_get_scaler, mock_get_model, tmp_path):
+    from src.handlers.forecast_handler import save_forecast
+    mock_exists.return_value = True
+    mock_df = pd.DataFrame({"date": ["2020-01-02"], "ouverture": [100], "haut": [100], "bas": [100], "cloture": [100], "volume": [0]})
+    mock_read_csv.return_value = mock_df
+    mock_forecast.return_value = [[99]]
+    mock_get_scaler.return_value = MinMaxScaler()
+    model = MagicMock()
+    model.get_last_trained_date.return_value = pd.to_datetime("2020-01-02")
+    mock_get_model.return_value = model
+
+    with patch("src.handlers.forecast_handler.FORECAST_LOCAL_PATH", tmp_path):
+        # produced by a model trained up to the day before
+        save_forecast([101], "LOCAL", "AB", pd.to_datetime("2020-01-01"))
+        with TestClient(app) as client:
+            response = client.get("/stock/AB")
+
+    assert response.status_code == 200
+    mock_forecast.assert_called_once()
+    assert response.json()["data"][-1]["cloture"] == 99
+
+
+@patch("src.web.back.main.compute_stock")
+@patch("dotenv.load_dotenv")
+@patch.dict(os.environ, {"WINDOW_SIZE": "1", "MODEL_NAME": "LSTM", "MODEL_LOCATION": "LOCAL", "DISABLE_BACKEND_CACHE": "true"})
+def test_get_stock_cache_hit_sends_the_cached_payload(mock_dotenv, mock_compute_stock):
+    df = pd.DataFrame({"date": pd.to_datetime(["2020-01-01", "2020-01-02"]), "cloture": [100.0, 101.0]})
+    codec = GzipJsonCodec()
+    cache = AsyncMock()
+    cache.get_or_compute.return_value = codec.encode(df)
+
+    with patch("src.web.back.main.DISABLE_BACKEND_CACHE", False), patch("src.web.back.main.cacheService", cache), patch("src.web.back.main.cacheCodec", codec):
+        with TestClient(app) as client:
+            response = client.get("/stock/AB")
+            identity_response = client.get("/stock/AB", headers={"Accept-Encoding": "identity"})
+
+    mock_compute_stock.assert_not_called()
+    assert cache.get_or_compute.call_args.args[0] == "stock/AB/json-gzip"
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json()["data"] == [{"date": "2020-01-01T00:00:00", "cloture": 100.0}, {"date": "2020-01-02T00:00:00", "cloture": 101.0}]
+    # a client not accepting gzip gets the same JSON, decompressed
+    assert "content-encoding" not in identity_response.headers
+    assert identity_response.json() == response.json()
+
+
+@patch("src.web.back.main.compute_stock")
+@patch("dotenv.load_dotenv")
+@patch.dict(os.environ, {"WINDOW_SIZE": "1", "MODEL_NAME": "LSTM", "MODEL_LOCATION": "LOCAL", "DISABLE_BACKEND_CACHE": "true"})
+def test_get_stock_arrow_codec(mock_dotenv, mock_compute_stock):
+    mock_compute_stock.return_value = pd.DataFrame({"date": pd.to_datetime(["2020-01-01"]), "cloture": [100.0]})
+    codec = ArrowCodec("zstd")
+
+    with patch("src.web.back.main.cacheCodec", codec):
+        with TestClient(app) as client:
+            response = client.get("/stock/AB")
+            json_response = client.get("/stock/AB", headers={"Accept": "application/json"})
+
+    assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    assert codec.decode(response.content)["cloture"].tolist() == [100.0]
+    # a client only accepting JSON gets the payload converted
+    assert json_response.json()["data"] == [{"date": "2020-01-01T00:00:00", "cloture": 100.0}]
+
+
+@patch("src.web.back.main.compute_stock")
+@patch("dotenv.load_dotenv")
+@patch.dict(os.environ, {"WINDOW_SIZE": "1", "MODEL_NAME": "LSTM", "MODEL_LOCATION": "LOCAL", "DISABLE_BACKEND_CACHE": "true"})
+def test_get_stock_concurrent_requests_are_computed_once(mock_dotenv, mock_compute_stock):
+    def compute_stock(company):
+        time.sleep(0.2)
+        return pd.DataFrame({"date": pd.to_datetime(["2020-01-01"]), "cloture": [100.0]})
+    mock_compute_stock.side_effect = compute_stock
+
+    with TestClient(app) as client:
+        with ThreadPoolExecutor(4) as executor:
+            responses = list(executor.map(lambda _: client.get("/stock/AB"), range(4)))
+
+    assert [response.status_code for response in responses] == [200] * 4
+    mock_compute_stock.assert_called_once_with("AB")
+
+
+@patch("src.web.back.main.compute_stock")
+@patch("dotenv.load_dotenv")
+@patch.dict(os.environ, {"WINDOW_SIZE": "1", "MODEL_NAME": "LSTM", "MODEL_LOCATION": "LOCAL", "DISABLE_BACKEND_CACHE": "true"})
+def test_get_stock_l1_cache(mock_dotenv, mock_compute_stock):
+    mock_compute_stock.return_value = pd.DataFrame({"date": pd.to_datetime(["2020-01-01"]), "cloture": [100.0]})
+    CACHE_REQUESTS.clear()
+
+    with patch("src.web.back.main.get_local_stock_version", return_value=(1, 1)) as mock_version:
+        with TestClient(app) as client:
+            first = client.get("/stock/AB")
+            second = client.get("/stock/AB")
+            # e.g. the training script saved a new model
+            mock_version.return_value = (2, 1)
+            retrained = client.get("/stock/AB")
+
+    assert first.json() == second.json() == retrained.json()
+    assert mock_compute_stock.call_count == 2
+    assert CACHE_REQUESTS.get(cache="l1", result="hit") == 1
+    assert CACHE_REQUESTS.get(cache="l1", result="miss") == 2
+
+
+@patch("src.web.back.main.get_forecast", return_value=None)
+@patch("src.web.back.main.get_model")
+@patch("src.web.back.main.get_scaler")
+@patch("src.web.back.main.forecast")
+@patch("src.web.back.main.os.path.exists")
+@patch("src.web.back.main.pd.read_csv")
+@patch("dotenv.load_dotenv")
+@patch.dict(os.environ, {"WINDOW_SIZE": "2", "MODEL_NAME": "LSTM", "MODEL_LOCATION": "LOCAL", "DISABLE_BACKEND_CACHE": "true"})
+def test_get_stocks_forecast(mock_dotenv, mock_read_csv, mock_exists, mock_forecast, mock_get_scaler, mock_get_model, mock_get_forecast):
+    mock_exists.side_effect = lambda path: not str(path).endswith("UNKNOWN.csv.dvc")
+    mock_read_csv.side_effect = lambda *args, **kwargs: pd.DataFrame({"date": ["2020-01-01", "2020-01-02"], "cloture": [100.0, 101.0]})
+    mock_get_scaler.return_value = MinMaxScaler()
+    models = {"AB": LSTMModel("AB"), "AL": LSTMModel("AL"), "BH": ARIMAModel("BH")}
+    for model in models.values():
+        model.last_trained_date = pd.to_datetime("2020-01-02")
+    mock_get_model.side_effect = lambda stock, location: models[stock]
+    mock_forecast.side_effect = lambda models, datasets, scalers, num_days, window_size: [[102.0, 103.0, 104.0]] * len(models)
+
+    with TestClient(app) as client:
+        response = client.post("/stocks/forecast", json={"symbols": ["AB", "AL", "BH", "AB", "UNKNOWN"], "horizon": 3, "start_date": "2020-01-02"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["horizon"] == 3
+    assert list(data["stocks"]) == ["AB", "AL", "BH", "UNKNOWN"]
+    assert data["stocks"]["AB"] == {"last_date": "2020-01-02", "forecast": [102.0, 103.0, 104.0], "history": {"date": ["2020-01-02"], "cloture": [101.0]}}
+    assert data["stocks"]["UNKNOWN"] == {"status": 404, "error": "Company not found"}
+    # one model per stock
+    assert [call.args[0] for call in mock_forecast.call_args_list] == [[models["AB"]], [models["AL"]], [models["BH"]]]
+    assert all(call.args[3] == 3 and call.args[4] == 2 for call in mock_forecast.call_args_list)
+
+
+@patch("src.web.back.main.forecast_stocks")
+@patch("src.web.back.main.os.path.exists", return_value=True)
+@patch("dotenv.load_dotenv")
+@patch.dict(os.environ, {"WINDOW_SIZE": "1", "MODEL_NAME": "LSTM", "MODEL_LOCATION": "LOCAL", "DISABLE_BACKEND_CACHE": "true"})
+def test_get_stocks_forecast_cache(mock_dotenv, mock_exists, mock_forecast_stocks):
+    mock_forecast_stocks.side_effect = lambda companies, horizon: {company: {"last_date": "2020-01-01", "forecast": [1.0]} if company != "BH" else {"status": 403, "error": "Model unavailable, Try later"}
+                                                                  for company in companies}
+    cache = AsyncMock()
+    cache.mget_entries.side_effect = lambda keys, versionKeys: [(b'{"last_date": "2020-01-01", "forecast": [2.0]}', "v") if key == "stock/AB/forecast/1" else (None, "v") for key in keys]
+
+    with patch("src.web.back.main.DISABLE_BACKEND_CACHE", False), patch("src.web.back.main.cacheService", cache), patch("src.web.back.main.get_local_stock_version", return_value=(1, 1)):
+        with TestClient(app) as client:
+            first = client.post("/stocks/forecast", json={"symbols": ["AB", "AL", "BH"]})
+            second = client.post("/stocks/forecast", json={"symbols": ["AB", "AL", "BH"]})
+
+    assert first.json() == second.json()
+    assert first.json()["stocks"]["AB"]["forecast"] == [2.0]
+    # a single lookup for the three stocks, the second request is answered by the L1 cache except for the failed stock
+    assert cache.mget_entries.call_args_list[0].args[0] == ["stock/AB/forecast/1", "stock/AL/forecast/1", "stock/BH/forecast/1"]
+    assert cache.mget_entries.call_args_list[1].args[0] == ["stock/BH/forecast/1"]
+    assert mock_forecast_stocks.call_args_list[0].args == (["AL", "BH"], 1)
+    # the errors aren't cached
+    cache.mset_entries.assert_called_once_with({"stock/AL/forecast/1": (b'{"last_date": "2020-01-01", "forecast": [1.0]}', "v")})
+
+
+@pytest.mark.parametrize("body", [
+    {"symbols": []},
+    {"symbols": ["AB"], "horizon": 0},
+    {"symbols": ["AB"], "horizon": 1000},
+    {"symbols": ["AB"], "start_date": "2020-02-01", "end_date": "2020-01-01"},
+])
+@patch("dotenv.load_dotenv")
+@patch.dict(os.environ, {"WINDOW_SIZE": "1", "MODEL_NAME": "LSTM", "MODEL_LOCATION": "LOCAL", "DISABLE_BACKEND_CACHE": "true"})
+def test_get_stocks_forecast_invalid_request(mock_dotenv, body):
+    with TestClient(app) as client:
+        response = client.post("/stocks/forecast", json=body)
+
+    assert response.status_code == 422
+
+
+@patch("dotenv.load_dotenv")
+@patch.dict(os.environ, {"WINDOW_SIZE": "1", "MODEL_NAME": "LSTM", "MODEL_LOCATION": "LOCAL", "DISABLE_BACKEND_CACHE": "true"})
+def test_invalidate_local_stocks(mock_dotenv):
+    from src.web.back.main import invalidate_local_stocks
+    for key in ["stock/AB/json-gzip", "stock/AB/arrow-zstd", "stock/ABC/json-gzip", "companies"]:
+        localCache.set(key, b"payload")
+
+    invalidate_local_stocks(["AB"])
+
+    assert localCache.get("stock/AB/json-gzip") is None and localCache.get("stock/AB/arrow-zstd") is None
+    assert localCache.get("stock/ABC/json-gzip") == b"payload"
+    invalidate_local_stocks(None)
+    assert len(localCache) == 0
+
+
+@patch("dotenv.load_dotenv")
+@patch.dict(os.environ, {"WINDOW_SIZE": "1", "MODEL_NAME": "LSTM", "MODEL_LOCATION": "LOCAL", "DISABLE_BACKEND_CACHE": "true"})
+def test_handle_invalidation(mock_dotenv):
+    from src.web.back.main import handle_invalidation
+    localCache.set("stock/AB/json-gzip", b"payload")
+    ragCache.set([1.0, 0.0], {"generation": "news answer"}, "news", ragCache.get_version())
+
+    handle_invalidation({"part": "model", "stocks": ["AB"]})
+    assert localCache.get("stock/AB/json-gzip") is None
+    assert ragCache.get([1.0, 0.0]) == {"generation": "news answer"}
+    handle_invalidation({"part": "documents", "sources": ["news"]})
+    assert ragCache.get([1.0, 0.0]) is None
+
+
+@patch("src.web.back.main.agents")
+@patch("src.web.back.main.embed_question")
+@patch("dotenv.load_dotenv")
+@patch.dict(os.environ, {"WINDOW_SIZE": "1", "MODEL_NAME": "LSTM", "MODEL_LOCATION": "LOCAL", "DISABLE_BACKEND_CACHE": "true"})
+def test_rag_query_semantic_cache(mock_dotenv, mock_embed_question, mock_agents):
+    embeddings = {"how did BIAT do this week": [1.0, 0.0, 0.1], "How has BIAT done this week?": [1.0, 0.02, 0.1], "latest news?": [0.0, 1.0, 0.0]}
+    mock_embed_question.side_effect = lambda question: embeddings[question]
+    mock_agents.invoke.side_effect = lambda input, stream_mode: {"question": input["question"], "topic": "stocks", "generation": f"answer to {input['question']}"}
+
+    with TestClient(app) as client:
+        first = client.post("/rag", content="how did BIAT do this week", headers={"Content-Type": "text/plain"})
+        rephrased = client.post("/rag", content="How has BIAT done this week?", headers={"Content-Type": "text/plain"})
+        other = client.post("/rag", content="latest news?", headers={"Content-Type": "text/plain"})
+
+    assert first.json() == rephrased.json()
+    assert other.json()["response"]["generation"] == "answer to latest news?"
+    assert mock_agents.invoke.call_count == 2
+
+
+@patch("src.web.back.main.agents")
+@patch("src.web.back.main.embed_question")
+@patch("dotenv.load_dotenv")
+@patch.dict(os.environ, {"WINDOW_SIZE": "1", "MODEL_NAME": "LSTM", "MODEL_LOCATION": "LOCAL", "DISABLE_BACKEND_CACHE": "true"})
+def test_rag_query_semantic_cache_is_scoped_to_the_stocks(mock_dotenv, mock_embed_question, mock_agents):
+    # the embeddings of questions differing only by the ticker are nearly identical
+    embeddings = {"BIAT price this week": [1.0, 0.0, 0.1], "BNA price this week": [1.0, 0.01, 0.1]}
+    mock_embed_question.side_effect = lambda question: embeddings[question]
+    mock_agents.invoke.side_effect = lambda input, stream_mode: {"question": input["question"], "topic": "stocks", "generation": f"answer to {input['question']}"}
+
+    with TestClient(app) as client:
+        client.post("/rag", content="BIAT price this week", headers={"Content-Type": "text/plain"})
+        other = client.post("/rag", content="BNA price this week", headers={"Content-Type": "text/plain"})
+
+    assert other.json()["response"]["generation"] == "answer to BNA price this week"
+    assert mock_agents.invoke.call_count == 2
+
+
+@patch("src.web.back.main.agents")
+@patch("src.web.back.main.embed_question")
+@patch("dotenv.load_dotenv")
+@patch.dict(os.environ, {"WINDOW_SIZE": "1", "MODEL_NAME": "LSTM", "MODEL_LOCATION": "LOCAL", "DISABLE_BACKEND_CACHE": "true"})
+def test_rag_query_embedding_failure(mock_dotenv, mock_embed_question, mock_agents):
+    mock_embed_question.side_effect = Exception("quota exceeded")
+    mock_agents.invoke.return_value = {"question": "latest news?", "generation": "answer"}
+
+    with TestClient(app) as client:
+        response = client.post("/rag", content="latest news?", headers={"Content-Type": "text/plain"})
+
+    assert response.status_code == 200
+    assert response.json()["response"]["generation"] == "answer"
+
+
+def read_events(response):
+    """parses a server-sent events body into (event, data) tuples"""
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@patch("src.web.back.main.stream_answer")
+@patch("src.web.back.main.agents")
+@patch("src.web.back.main.embed_question")
+@patch("dotenv.load_dotenv")
+@patch.dict(os.environ, {"WINDOW_SIZE": "1", "MODEL_NAME": "LSTM", "MODEL_LOCATION": "LOCAL", "DISABLE_BACKEND_CACHE": "true"})
+def test_rag_stream(mock_dotenv, mock_embed_question, mock_agents, mock_stream_answer):
+    mock_embed_question.return_value = [1.0, 0.0]
+    def stream_answer(agents, question):
+        yield "node", {"node": "classify_question"}
+        for token in ["BIAT ", "rose"]:
+            yield "token", {"text": token}
+        yield "done", {"question": question, "topic": "stocks", "generation": "BIAT rose"}
+    mock_stream_answer.side_effect = stream_answer
+    RAG_TIME_TO_FIRST_TOKEN_SECONDS.clear()
+
+    with TestClient(app) as client:
+        first = client.post("/rag/stream", content="how did BIAT do?", headers={"Content-Type": "text/plain"})
+        cached = client.post("/rag/stream", content="how did BIAT do?", headers={"Content-Type": "text/plain"})
+
+    assert first.headers["content-type"].startswith("text/event-stream")
+    assert read_events(first) == [
+        ("node", {"node": "classify_question"}),
+        ("token", {"text": "BIAT "}),
+        ("token", {"text": "rose"}),
+        ("done", {"response": {"question": "how did BIAT do?", "topic": "stocks", "generation": "BIAT rose"}}),
+    ]
+    # the answer was cached, it's sent at once
+    assert read_events(cached) == [("token", {"text": "BIAT rose"}), read_events(first)[-1]]
+    assert mock_stream_answer.call_count == 1
+    assert RAG_TIME_TO_FIRST_TOKEN_SECONDS.get_count(source="graph") == 1
+    assert RAG_TIME_TO_FIRST_TOKEN_SECONDS.get_count(source="cache") == 1
+
+
+@patch("src.web.back.main.stream_answer")
+@patch("src.web.back.main.agents")
+@patch("src.web.back.main.embed_question")
+@patch("dotenv.load_dotenv")
+@patch.dict(os.environ, {"WINDOW_SIZE": "1", "MODEL_NAME": "LSTM", "MODEL_LOCATION": "LOCAL", "DISABLE_BACKEND_CACHE": "true"})
+def test_rag_stream_error(mock_dotenv, mock_embed_question, mock_agents, mock_stream_answer):
+    mock_embed_question.return_value = [1.0, 0.0]
+    def stream_answer(agents, question):
+        yield "node", {"node": "classify_question"}
+        raise Exception("quota exceeded")
+    mock_stream_answer.side_effect = stream_answer
+
+    with TestClient(app) as client:
+        response = client.post("/rag/stream", content="latest news?", headers={"Content-Type": "text/plain"})
+
+    assert response.status_code == 200
+    assert read_events(response)[-1] == ("error", {"detail": "quota exceeded"})
+    assert len(ragCache) == 0
@@ -1,4 +1,7 @@
-from .constants import HEADERS, SYMBOLS, RAW_DATA_DOWNLOAD_BASELINK, STOCK_DATA_URL
-from .train_test_utils import split_dataset, get_features_target_from_dataset, train, evaluate, plot_evaluation_result, plot_stock_graph, train_model, predict
-from .email_utils import send_email
+from src.lazy_imports import lazy_exports
 
+lazy_exports(__name__, {
+    ".constants": ["HEADERS", "SYMBOLS", "RAW_DATA_DOWNLOAD_BASELINK", "STOCK_DATA_URL", "NEWS_BASE_URL", "PAGE_URL"],
+    ".train_test_utils": ["split_dataset", "get_features_target_from_dataset", "train", "evaluate", "plot_evaluation_result", "plot_stock_graph", "train_model", "predict", "forecast"],
+    ".email_utils": ["send_email"],
+})
@@ -0,0 +1,145 @@
+"""
+Storage of the processed stock data.
+
+The processed history of all the stocks is stored as a single Parquet dataset partitioned by symbol
+(data/processed/parquet/symbol=XXX/data.parquet) with typed columns, so that readers can ask for a subset of
+the columns or a date range without parsing the whole history.
+The semicolon separated CSV files are still written next to it as an export format and are used as a fallback
+when a stock has no Parquet partition yet (e.g. only its CSV was pulled with DVC).
+"""
+
+import os
+import hashlib
+from datetime import datetime
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.metrics import DATA_READ_SECONDS
+
+PARQUET_DIR_NAME = "parquet"
+# small row groups let the date range filters skip most of the file using the row group statistics
+ROW_GROUP_SIZE = 512
+
+STOCK_DATA_SCHEMA = pa.schema([
+    ("date", pa.timestamp("ms")),
+    ("ouverture", pa.float64()),
+    ("haut", pa.float64()),
+    ("bas", pa.float64()),
+    ("cloture", pa.float64()),
+    ("volume", pa.float64()),
+])
+
+def get_partition_path(stock: str, data_dir: str | Path) -> Path:
+    """returns the path of a stock's partition in the Parquet dataset"""
+    return Path(data_dir) / PARQUET_DIR_NAME / f"symbol={stock}" / "data.parquet"
+
+def has_stock_data(stock: str, data_dir: str | Path) -> bool:
+    """checks if a stock has a Parquet partition"""
+    return get_partition_path(stock, data_dir).is_file()
+
+def get_stock_data_version(df: pd.DataFrame) -> str:
+    """returns a hash of a stock's processed history, it changes whenever a value or a row does"""
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return hashlib.sha256(hashes.tobytes()).hexdigest()[:16]
+
+def write_stock_data(df: pd.DataFrame, stock: str, data_dir: str | Path, export_csv: bool = True) -> str:
+    """
+    Writes a stock's processed history to its Parquet partition and, if export_csv is set, to {stock}.csv.
+
+    Args:
+        df (pd.DataFrame): The processed history with a date column and the OHLC and volume columns.
+        stock (str): The stock's symbol.
+        data_dir (str | Path): The processed data directory.
+        export_csv (bool): Also write the semicolon separated CSV export.
+
+    Returns:
+        str: The version of the written data (see get_stock_data_version).
+    """
+    columns = [field.name for field in STOCK_DATA_SCHEMA if field.name in df.columns]
+    schema = pa.schema([STOCK_DATA_SCHEMA.field(column) for column in columns])
+    df = df[columns].copy()
+    if not pd.api.types.is_datetime64_any_dtype(df["date"]):
+        df["date"] = pd.to_datetime(df["date"])
+    table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    partition_path = get_partition_path(stock, data_dir)
+    partition_path.parent.mkdir(parents=True, exist_ok=True)
+    # written next to the partition then renamed so that a reader never sees a half written file
+    tmp_path = partition_path.with_suffix(".parquet.tmp")
+    pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_SIZE, compression="zstd")
+    os.replace(tmp_path, partition_path)
+    if export_csv:
+        df.to_csv(Path(data_dir) / f"{stock}.csv", index=False, sep=";", date_format="%Y-%m-%d")
+    return get_stock_data_version(df)
+
+def read_stock_data(stock: str, data_dir: str | Path, columns: list[str] = None, start_date: datetime = None, end_date: datetime = None) -> pd.DataFrame:
+    """
+    Reads a stock's processed history.
+
+    Args:
+        stock (str): The stock's symbol.
+        data_dir (str | Path): The processed data directory.
+        columns (list[str]): The columns to read, all of them if None. The date column is always read.
+        start_date (datetime): Only read the rows on or after this date.
+        end_date (datetime): Only read the rows on or before this date.
+
+    Returns:
+        pd.DataFrame: The history sorted by date, with a datetime64 date column.
+    """
+    if columns is not None and "date" not in columns:
+        columns = ["date"] + list(columns)
+    partition_path = get_partition_path(stock, data_dir)
+    if partition_path.is_file():
+        filters = _get_date_filters(start_date, end_date)
+        with DATA_READ_SECONDS.time(format="parquet"):
+            return pq.read_table(partition_path, columns=columns, filters=filters).to_pandas()
+
+    # no Parquet partition, fall back to the CSV export
+    with DATA_READ_SECONDS.time(format="csv"):
+        df = pd.read_csv(Path(data_dir) / f"{stock}.csv", sep=";", usecols=columns)
+        df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d")
+    if start_date is not None:
+        df = df[df["date"] >= pd.Timestamp(start_date)]
+    if end_date is not None:
+        df = df[df["date"] <= pd.Timestamp(end_date)]
+    return df.reset_index(drop=True)
+
+def read_all_stock_data(data_dir: str | Path, stocks: list[str] = None, columns: list[str] = None, start_date: datetime = None, end_date: datetime = None) -> pd.DataFrame:
+    """
+    Reads the processed history of several stocks from the Parquet dataset in a single scan.
+
+    Args:
+        data_dir (str | Path): The processed data directory.
+        stocks (list[str]): The symbols to read, all of them if None.
+        columns (list[str]): The columns to read, all of them if None. The date and symbol columns are always read.
+        start_date (datetime): Only read the rows on or after this date.
+        end_date (datetime): Only read the rows on or before this date.
+
+    Returns:
+        pd.DataFrame: The long format history with a symbol column.
+    """
+    dataset = ds.dataset(Path(data_dir) / PARQUET_DIR_NAME, format="parquet", partitioning="hive")
+    if columns is not None:
+        columns = ["symbol", "date"] + [column for column in columns if column not in ("symbol", "date")]
+    expression = None
+    if stocks is not None:
+        expression = ds.field("symbol").isin(stocks)
+    if start_date is not None:
+        condition = ds.field("date") >= pd.Timestamp(start_date)
+        expression = condition if expression is None else expression & condition
+    if end_date is not None:
+        condition = ds.field("date") <= pd.Timestamp(end_date)
+        expression = condition if expression is None else expression & condition
+    df = dataset.to_table(columns=columns, filter=expression).to_pandas()
+    df["symbol"] = df["symbol"].astype(str)
+    return df.sort_values(["symbol", "date"], ignore_index=True)
+
+def _get_date_filters(start_date: datetime, end_date: datetime) -> list | None:
+    filters = []
+    if start_date is not None:
+        filters.append(("date", ">=", pd.Timestamp(start_date)))
+    if end_date is not None:
+        filters.append(("date", "<=", pd.Timestamp(end_date)))
+    return filters if filters else None
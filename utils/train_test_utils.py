@@ -1,7 +1,7 @@
 from typing import Dict
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
+from numpy.lib.stride_tricks import sliding_window_view
 from sklearn.preprocessing import MinMaxScaler 
 from enums import ValidationMetricEnum
 from datetime import datetime
@@ -10,9 +10,17 @@ from datetime import datetime
 import sys,os
 from pathlib import Path
 sys.path.insert(0, str(Path(os.getcwd()) / '..'))
-from src import IModel, ARIMAModel
+from src import IModel
+from src.metrics import INFERENCE_SECONDS
 
 
+def is_arima_model(model: IModel) -> bool:
+    """
+    isinstance(model, ARIMAModel) without importing statsmodels: an ARIMA model can only exist once its module is imported.
+    """
+    arima = sys.modules.get("src.prediction_model.models.ARIMAModel")
+    return arima != None and isinstance(model, arima.ARIMAModel)
+
 def split_dataset(dataset: pd.DataFrame, test_size: float = 0.2) -> tuple [pd.DataFrame, pd.DataFrame] :
     """
     Splits the dataset into training and testing sets.
@@ -34,18 +42,35 @@ def split_dataset(dataset: pd.DataFrame, test_size: float = 0.2) -> tuple [pd.Da
 
     return train_set, test_set
 
-def get_features_target_from_dataset(dataset: np.ndarray, ShouldOnlyKeepCloseCol: bool, closeColIdx: int , isArimaContext: bool, window:int = 60, )-> tuple[np.ndarray, np.ndarray] :
-    X = []
-    Y = []
+def get_features_target_from_dataset(dataset: np.ndarray, ShouldOnlyKeepCloseCol: bool, closeColIdx: int , isArimaContext: bool, window:int = 60, use_float32: bool = False)-> tuple[np.ndarray, np.ndarray] :
+    """
+    Builds the sliding windows used as features and the value right after each window as target.
+
+    The windows are strided read-only views over `dataset`, so no (rows x window x features) matrix is materialised.
+
+    Args:
+        dataset (np.ndarray): The (scaled) dataset, one row per day.
+        ShouldOnlyKeepCloseCol (bool): Keep only the cloture column as target.
+        closeColIdx (int): Index of the cloture column.
+        isArimaContext (bool): ARIMA models don't use windows, the flattened dataset is returned instead.
+        window (int): Number of days in each window.
+        use_float32 (bool): Cast the dataset to float32 once before building the views (halves the memory used by the model input).
+
+    Returns:
+        tuple: The windows of shape (rows - window, window, features) and the targets.
+    """
+    if use_float32:
+        dataset = np.asarray(dataset, dtype=np.float32)
     if isArimaContext == True:
         return dataset.flatten(), dataset.flatten()
-    for i in range(window, dataset.shape[0]):
-        X.append(dataset[i-window:i])
-        y_to_append = dataset[i]
-        if (ShouldOnlyKeepCloseCol):
-            y_to_append = y_to_append[closeColIdx] ## index of the cloture column
-        Y.append(y_to_append)
-    return np.array(X), np.array(Y)
+    if dataset.shape[0] <= window:
+        return np.empty((0, window) + dataset.shape[1:], dtype=dataset.dtype), np.empty((0,) if ShouldOnlyKeepCloseCol else (0,) + dataset.shape[1:], dtype=dataset.dtype)
+    # the last window has no target so it's dropped, the window axis is moved right after the rows axis
+    X = np.moveaxis(sliding_window_view(dataset, window, axis=0)[:-1], -1, 1)
+    Y = dataset[window:]
+    if (ShouldOnlyKeepCloseCol):
+        Y = Y[:, closeColIdx] ## index of the cloture column
+    return X, Y
 
 def train_model(model: IModel, model_name: str, dataset: pd.DataFrame | np.ndarray, old_scaler: MinMaxScaler, window_size: int, last_trained_date: datetime) -> MinMaxScaler:
     model_dict = {model_name: (model, dataset, pd.DataFrame([]))} # we don't care about the test dataset
@@ -67,7 +92,7 @@ def train(models_dictionary: Dict[str, tuple[IModel, pd.DataFrame | np.ndarray,
         model = tuple[0]
         df = tuple[1]
         ShouldOnlyKeepCloseCol = df.shape[1] > 1 # if the dataframe has more than one column we need to keep cloture only as target
-        isArimaContext = isinstance(model, ARIMAModel)
+        isArimaContext = is_arima_model(model)
         if ShouldOnlyKeepCloseCol :
             df_copy = df.copy()
             cols_to_drop = df_copy.columns[df_copy.columns.str.match('date')]
@@ -83,17 +108,54 @@ def train(models_dictionary: Dict[str, tuple[IModel, pd.DataFrame | np.ndarray,
     return new_scaler_dict
 
 def predict(model: IModel, dataset: np.ndarray, scaler: MinMaxScaler, num_days: int, window_size: int) -> np.ndarray:
-    last_n_days = scaler.transform(dataset[-window_size: ]).flatten()
-    output = np.array([])
-    for i in range(num_days):
-        print(f'output: {output}, length: {output.__len__()}')
-        print(f'last {window_size} days: {last_n_days}, length: {last_n_days.__len__()}')
-        predicted_value = model.predict(last_n_days.reshape(1,-1))
-        transformed_predicted_value = scaler.inverse_transform(predicted_value)
-        last_n_days = np.delete(last_n_days, 0)
-        last_n_days = np.append(last_n_days, predicted_value)
-        output = np.append(output, transformed_predicted_value)
-    return output
+    # the window rolls forward in a preallocated buffer: the prediction of day i is written right after the window used to predict it
+    buffer = np.empty(window_size + num_days)
+    buffer[:window_size] = scaler.transform(dataset[-window_size: ]).flatten()
+    with INFERENCE_SECONDS.time(model=type(model).__name__):
+        for i in range(num_days):
+            predicted_value = model.predict(buffer[i:i + window_size].reshape(1,-1))
+            buffer[window_size + i] = np.asarray(predicted_value).reshape(-1)[0]
+    return scaler.inverse_transform(buffer[window_size:].reshape(-1,1)).flatten()
+
+def forecast(models: list[IModel], datasets: list[np.ndarray], scalers: list[MinMaxScaler], num_days: int, window_size: int) -> list[np.ndarray]:
+    """
+    Forecasts the next `num_days` values of several series at once.
+
+    Series sharing the same model instance are rolled forward together: each step is a single call to the model's
+    direct inference path (IModel.predict_step) on a (series, window, 1) batch taken from a preallocated buffer.
+    ARIMA models don't use the window, their whole horizon comes from a single forecast call.
+
+    Args:
+        models (list[IModel]): The model of each series.
+        datasets (list[np.ndarray]): The unscaled history of each series, shape (days, 1).
+        scalers (list[MinMaxScaler]): The scaler of each series.
+        num_days (int): The forecast horizon.
+        window_size (int): The window size the models were trained with.
+
+    Returns:
+        list[np.ndarray]: The unscaled forecast of each series, in the same order as the inputs.
+    """
+    scaled_forecasts = [None] * len(models)
+    groups = {}
+    for idx, model in enumerate(models):
+        groups.setdefault(id(model), []).append(idx)
+    for indices in groups.values():
+        model = models[indices[0]]
+        if is_arima_model(model):
+            with INFERENCE_SECONDS.time(model=type(model).__name__):
+                scaled_forecast = model.forecast(num_days)
+            for idx in indices:
+                scaled_forecasts[idx] = scaled_forecast
+            continue
+        buffer = np.empty((len(indices), window_size + num_days))
+        for row, idx in enumerate(indices):
+            buffer[row, :window_size] = scalers[idx].transform(datasets[idx][-window_size: ]).flatten()
+        with INFERENCE_SECONDS.time(model=type(model).__name__):
+            for i in range(num_days):
+                buffer[:, window_size + i] = model.predict_step(buffer[:, i:i + window_size, np.newaxis])
+        for row, idx in enumerate(indices):
+            scaled_forecasts[idx] = buffer[row, window_size:]
+    return [scalers[idx].inverse_transform(np.asarray(scaled_forecast).reshape(-1,1)).flatten() for idx, scaled_forecast in enumerate(scaled_forecasts)]
 
 def evaluate(models_dictionary: Dict[str, tuple[IModel, pd.DataFrame, pd.DataFrame, pd.DataFrame]], metric: ValidationMetricEnum, scaler_dict: Dict[str, MinMaxScaler]) -> Dict[str, float]:
     result = {}
@@ -105,7 +167,7 @@ def evaluate(models_dictionary: Dict[str, tuple[IModel, pd.DataFrame, pd.DataFra
         if scaler == None:
             raise KeyError(f"Scaler couldn't be found for model: {model_name}")
         ShouldOnlyKeepCloseCol = test_df.shape[1] > 1
-        isArimaContext = isinstance(model, ARIMAModel)
+        isArimaContext = is_arima_model(model)
         if ShouldOnlyKeepCloseCol :
             test_df_copy = test_df.copy()
             cols_to_drop = test_df_copy.columns[test_df_copy.columns.str.match('date')]
@@ -121,6 +183,7 @@ def evaluate(models_dictionary: Dict[str, tuple[IModel, pd.DataFrame, pd.DataFra
     return result
 
 def plot_evaluation_result(eval_result: Dict[str, float], metric: str):
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(12, 6))
     plt.bar(eval_result.keys(), eval_result.values(), color=['red', 'blue', 'green', 'purple', 'orange', 'cyan', 'brown', 'pink', 'gray', 'yellow'])
     plt.xlabel("Models")
@@ -130,6 +193,7 @@ def plot_evaluation_result(eval_result: Dict[str, float], metric: str):
     plt.show()
 
 def plot_stock_graph(dates: np.ndarray, y_test: np.ndarray, y_predict: np.ndarray, model_name: str):
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(12, 6))
     plt.plot(dates, y_test, label='Actual Prices')
     plt.plot(dates, y_predict, label='Predicted Prices')